@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: RecursiveChunker.chunk_text vs the previous fixed-window implementation
+on long synthetic pages.
+
+    python scripts/bench_chunker.py --sizes 10000 100000 500000 --repeat 3
+"""
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.preprocessing.chunker import RecursiveChunker  # noqa: E402
+
+
+def legacy_chunk_text(text: str, chunk_size: int, chunk_overlap: int) -> list:
+    """The original algorithm: fixed windows plus a prefix newline count per chunk."""
+    pieces = []
+    current_start = 0
+    while current_start < len(text):
+        end = min(current_start + chunk_size, len(text))
+        pieces.append(text[current_start:end])
+        if end == len(text):
+            break
+        current_start += chunk_size - chunk_overlap
+
+    chunks = []
+    current_char = 0
+    for piece in pieces:
+        approx_line = text[:current_char].count("\n") + 1
+        chunks.append({"text": piece, "line": approx_line})
+        current_char += len(piece)
+    return chunks
+
+
+def synthetic_page(n_chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["model", "attention", "layer", "dataset", "loss", "gradient", "token", "embedding",
+             "benchmark", "retrieval", "2302.13971", "ResNet-50", "Eq.", "(3)", "results"]
+    parts, size = [], 0
+    while size < n_chars:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 20))) + ". "
+        if rng.random() < 0.15:
+            sentence += "\n"
+        if rng.random() < 0.03:
+            sentence += "\n"
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:n_chars]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    chunker = RecursiveChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    meta = {"source": "bench.pdf", "page": 1}
+
+    print(f"{'chars':>10} {'legacy_ms':>10} {'new_ms':>10} {'speedup':>8} {'legacy_n':>9} {'new_n':>6}")
+    for size in args.sizes:
+        text = synthetic_page(size)
+        legacy_s = best_of(lambda: legacy_chunk_text(text, args.chunk_size, args.chunk_overlap), args.repeat)
+        new_s = best_of(lambda: chunker.chunk_text(text, meta), args.repeat)
+        print(
+            f"{size:>10} {legacy_s * 1000:>10.2f} {new_s * 1000:>10.2f} {legacy_s / new_s:>7.1f}x "
+            f"{len(legacy_chunk_text(text, args.chunk_size, args.chunk_overlap)):>9} "
+            f"{len(chunker.chunk_text(text, meta)):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Recall vs. memory for NumpyRetriever vector compression on a corpus.
+
+Embeds the chunks of a PDF directory (or synthetic chunks), takes word windows of
+random chunks as questions, and compares each compression spec and rescore factor
+against exact float32 search:
+
+    python scripts/bench_compression.py --pdf-dir data/raw_papers --queries 200
+    python scripts/bench_compression.py --specs int8 binary pca128,int8 pca192,binary --rescore 1 4 10
+
+Columns: bytes per vector and total size of the codes the first pass scans
+(the float32 matrix stays on disk for rescoring), overlap@k with the exact top-k,
+nn@k (exact nearest neighbour within the top k) and single-query latency.
+rescore 1 is the raw quantized ranking.
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.embeddings.embedder import Embedder  # noqa: E402
+from src.ingestion.pdf_loader import iter_pdf_batches_from_dir  # noqa: E402
+from src.preprocessing.chunker import RecursiveChunker  # noqa: E402
+from src.retrieval.numpy_index import NumpyRetriever  # noqa: E402
+from src.utils.evaluation import percentiles, recall_at_k  # noqa: E402
+
+WORDS = ["model", "attention", "layer", "dataset", "loss", "gradient", "token", "embedding",
+         "benchmark", "retrieval", "training", "inference", "results", "baseline", "ablation",
+         "transformer", "encoder", "decoder", "accuracy", "latency", "memory", "quantization"]
+
+
+def corpus_texts(args) -> list:
+    if args.pdf_dir:
+        chunker = RecursiveChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        texts = []
+        for pages in iter_pdf_batches_from_dir(args.pdf_dir):
+            texts.extend(chunker.chunk_batch(pages).texts())
+        return texts
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160))) for _ in range(args.synthetic)]
+
+
+def questions_for(texts: list, n: int, seed: int = 1) -> list:
+    """A 6-16 word window of a random chunk per question."""
+    rng = random.Random(seed)
+    questions = []
+    for text in rng.sample(texts, min(n, len(texts))):
+        words = text.split()
+        size = min(len(words), rng.randint(6, 16))
+        start = rng.randint(0, len(words) - size)
+        questions.append(" ".join(words[start:start + size]))
+    return questions
+
+
+def build(persist_dir: str, spec, vectors: np.ndarray, batch_size: int) -> tuple:
+    retriever = NumpyRetriever(persist_dir, collection_name="bench", compression=spec)
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        rows = range(start, min(start + batch_size, len(vectors)))
+        retriever.add_documents([f"c{i}" for i in rows], [""] * len(rows), [{}] * len(rows), vectors[start:rows.stop])
+    return retriever, time.perf_counter() - t0
+
+
+def search(retriever: NumpyRetriever, queries: np.ndarray, k: int) -> tuple:
+    ids, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        result = retriever.query(q[None, :], n_results=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        ids.append(result["ids"][0])
+    return ids, percentiles(latencies, (50, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", type=Path, default=None, help="corpus to embed (default: synthetic chunks)")
+    parser.add_argument("--synthetic", type=int, default=20000, help="synthetic chunks without --pdf-dir")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or int8")
+    parser.add_argument("--embedding-cache-dir", default=None)
+    parser.add_argument("--specs", nargs="+", default=["int8", "binary", "pca128,int8", "pca64,int8"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1024, help="vectors per upsert while building")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    args = parser.parse_args()
+
+    texts = corpus_texts(args)
+    questions = questions_for(texts, args.queries)
+    embedder = Embedder(args.embedding_model, cache_dir=args.embedding_cache_dir, backend=args.backend)
+    t0 = time.perf_counter()
+    vectors = embedder.embed_texts(texts)
+    queries = embedder.embed_queries(questions)
+    print(f"Embedded {len(texts)} chunks and {len(questions)} questions (dim {vectors.shape[1]}) "
+          f"in {time.perf_counter() - t0:.1f}s\n")
+
+    k = args.top_k
+    results = []
+    print(f"{'spec':>15} {'rescore':>7} {'B/vec':>6} {'codes_MB':>9} {'ratio':>6} {'overlap@k':>9} "
+          f"{'nn@k':>6} {'p50_ms':>7} {'p95_ms':>7} {'build_s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        exact, build_s = build(str(Path(tmp) / "exact"), None, vectors, args.batch_size)
+        truth, latency = search(exact, queries, k)
+        float_bytes = exact.memory_stats()["float_bytes"]
+        results.append({"spec": "float32", "rescore": None, "bytes_per_vector": vectors.shape[1] * 4,
+                        "index_bytes": float_bytes, "ratio": 1.0, "overlap_at_k": 1.0, "nn_at_k": 1.0,
+                        "latency_ms": latency, "build_s": build_s})
+        nearest = [{ids[0]} for ids in truth]
+
+        for spec in args.specs:
+            retriever, build_s = build(str(Path(tmp) / spec.replace(",", "_")), spec, vectors, args.batch_size)
+            stats = retriever.memory_stats()
+            if not stats["code_bytes"]:
+                print(f"{spec:>15} skipped: fewer vectors than the compression minimum")
+                continue
+            for factor in args.rescore:
+                retriever.rescore_factor = factor
+                found, latency = search(retriever, queries, k)
+                overlap = float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if t]))
+                results.append({
+                    "spec": spec, "rescore": factor,
+                    "bytes_per_vector": stats["code_bytes"] // stats["vectors"],
+                    "index_bytes": stats["code_bytes"], "ratio": float_bytes / stats["code_bytes"],
+                    "overlap_at_k": overlap, "nn_at_k": recall_at_k(found, nearest, k),
+                    "latency_ms": latency, "build_s": build_s,
+                })
+
+    for r in results:
+        rescore = "-" if r["rescore"] is None else r["rescore"]
+        print(
+            f"{r['spec']:>15} {rescore:>7} {r['bytes_per_vector']:>6} {r['index_bytes'] / 2**20:>9.2f} "
+            f"{r['ratio']:>5.1f}x {r['overlap_at_k']:>9.3f} {r['nn_at_k']:>6.3f} "
+            f"{r['latency_ms']['p50']:>7.2f} {r['latency_ms']['p95']:>7.2f} {r['build_s']:>8.1f}"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"params": {**vars(args), "pdf_dir": str(args.pdf_dir)},
+                                               "chunks": len(texts), "results": results}, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
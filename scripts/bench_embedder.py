@@ -0,0 +1,68 @@
+"""
+Embedding throughput per Embedder backend (texts/sec) on mixed-length synthetic chunks,
+plus agreement with the fp32 torch vectors (1 - cosine, per text).
+
+A backend passes when its worst-case 1 - cosine stays within
+src.embeddings.embedder.BACKEND_COSINE_TOLERANCE.
+
+    python scripts/bench_embedder.py --backends torch onnx int8 --n 2000 --threads 4
+"""
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.embeddings.embedder import BACKEND_COSINE_TOLERANCE, Embedder  # noqa: E402
+
+
+def synthetic_chunks(n: int, seed: int = 0) -> list:
+    """Chunk-like texts from 5 to 200 words, so batches mix short and long inputs."""
+    rng = random.Random(seed)
+    words = ["model", "attention", "layer", "dataset", "loss", "gradient", "token", "embedding",
+             "benchmark", "retrieval", "2302.13971", "ResNet-50", "Eq.", "(3)", "results", "the", "of"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 200))) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "int8"])
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.n)
+    reference = None
+    failed = False
+
+    print(f"{'backend':>8} {'texts/s':>9} {'speedup':>8} {'max_1-cos':>10} {'mean_1-cos':>11} {'ok':>3}")
+    baseline_rate = None
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        embedder = Embedder(args.model, device="cpu", backend=backend, num_threads=args.threads)
+        embedder.embed_texts(texts[:args.batch_size], batch_size=args.batch_size)  # warm-up
+        t0 = time.perf_counter()
+        vectors = embedder.embed_texts(texts, batch_size=args.batch_size)
+        rate = len(texts) / (time.perf_counter() - t0)
+
+        if reference is None:
+            reference, baseline_rate = vectors, rate
+        drift = 1.0 - np.sum(vectors * reference, axis=1)  # both sides are normalized
+        ok = float(drift.max()) <= BACKEND_COSINE_TOLERANCE[backend]
+        failed |= not ok
+        if backend in args.backends:
+            print(
+                f"{backend:>8} {rate:>9.1f} {rate / baseline_rate:>7.2f}x "
+                f"{drift.max():>10.2e} {drift.mean():>11.2e} {'yes' if ok else 'NO':>3}"
+            )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Offline performance benchmark and regression check for the whole pipeline.
+
+    python scripts/benchmark.py run --out bench/current.json
+    python scripts/benchmark.py run --out bench/current.json --compare-to bench/baseline.json
+    python scripts/benchmark.py compare bench/baseline.json bench/current.json --tolerance 0.15
+
+`run` builds a synthetic corpus (PDFs written with PyMuPDF, one planted fact per page),
+starts the stub LLM server (src/llm/stub_server.py) and measures:
+
+    pdf        pages/sec of load_pdf_pages
+    chunk      chunks/sec of RecursiveChunker.chunk_text
+    embed      texts/sec of Embedder.embed_texts (no embedding cache)
+    index      chunks/sec of RAGPipeline.index_chunks
+    retrieval  p50/p95/p99 query latency (embed + vector search) and recall@1 / recall@k
+               of the chunk holding the planted fact
+    answer     p50/p95/p99 end-to-end RAGPipeline.answer latency and answers/sec at each
+               --concurrency level (answer cache disabled)
+
+Every metric records whether higher or lower is better. `compare` flags a metric as a
+regression when it is worse than the baseline by more than its tolerance (relative for
+rates and latencies, absolute for ratios such as recall) and exits 1 if any regressed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.utils.evaluation import percentiles, recall_at_k  # noqa: E402
+
+FILLER = ["model", "attention", "layer", "dataset", "loss", "gradient", "token", "embedding",
+          "benchmark", "retrieval", "training", "inference", "results", "baseline", "ablation"]
+DATASETS = ["ImageNet", "SQuAD", "GLUE", "COCO", "MNIST", "WikiText", "LibriSpeech", "Kinetics"]
+RECALL_TOLERANCE = 0.02  # absolute
+
+
+def synthetic_corpus(n_docs: int, pages_per_doc: int, page_chars: int, seed: int = 0) -> list:
+    """
+    Returns [(file_name, [page_text, ...])]. Each page hides one fact about a unique project
+    code in filler text; benchmark questions ask for it, so the relevant chunk is known.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(n_docs):
+        pages = []
+        for p in range(pages_per_doc):
+            code = f"PRJ-{d:03d}{p:02d}"
+            fact = f"Project {code} was evaluated on the {rng.choice(DATASETS)} benchmark."
+            words = []
+            while sum(len(w) + 1 for w in words) < page_chars:
+                words.append(rng.choice(FILLER))
+            words.insert(rng.randint(0, len(words)), fact)
+            pages.append(" ".join(words))
+        corpus.append((f"paper_{d:03d}.pdf", pages))
+    return corpus
+
+
+def write_pdfs(corpus: list, out_dir: Path) -> list:
+    import fitz  # PyMuPDF
+
+    paths = []
+    for file_name, pages in corpus:
+        doc = fitz.open()
+        for text in pages:
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=8)
+        path = out_dir / file_name
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def questions_for(corpus: list) -> list:
+    """(question, project code) per page."""
+    return [
+        (f"Which benchmark was project PRJ-{d:03d}{p:02d} evaluated on?", f"PRJ-{d:03d}{p:02d}")
+        for d, (_, pages) in enumerate(corpus)
+        for p in range(len(pages))
+    ]
+
+
+def best_of(fn, repeat: int):
+    """(fastest wall time in seconds, result of the last call)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def metric(value: float, unit: str, better: str, tolerance: float = None) -> dict:
+    m = {"value": round(value, 4), "unit": unit, "better": better}
+    if tolerance is not None:
+        m["tolerance"] = tolerance
+    return m
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parents[1],
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> dict:
+    from src.embeddings.embedder import Embedder
+    from src.ingestion.pdf_loader import load_pdf_pages
+    from src.llm.stub_server import start_stub_server
+    from src.preprocessing.chunker import RecursiveChunker
+    from src.rag_pipeline.pipeline import RAGConfig, RAGPipeline
+
+    metrics = {}
+    corpus = synthetic_corpus(args.docs, args.pages_per_doc, args.page_chars)
+    questions = questions_for(corpus)[:args.queries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pdf_dir = tmp / "pdfs"
+        pdf_dir.mkdir()
+        paths = write_pdfs(corpus, pdf_dir)
+
+        # Ingestion
+        elapsed, pages = best_of(lambda: [p for path in paths for p in load_pdf_pages(path)], args.repeat)
+        metrics["pdf.pages_per_sec"] = metric(len(pages) / elapsed, "pages/s", "higher")
+        print(f"pdf        {len(pages)} pages, {len(pages) / elapsed:.1f} pages/s")
+
+        chunker = RecursiveChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        elapsed, chunks = best_of(lambda: [c for p in pages for c in chunker.chunk_text(p["text"], p)], args.repeat)
+        metrics["chunk.chunks_per_sec"] = metric(len(chunks) / elapsed, "chunks/s", "higher")
+        print(f"chunk      {len(chunks)} chunks, {len(chunks) / elapsed:.1f} chunks/s")
+
+        # Embedding throughput, without the on-disk cache
+        texts = [c["text"] for c in chunks]
+        embedder = Embedder(args.embedding_model, device="cpu", backend=args.backend)
+        embedder.embed_texts(texts[:32])  # model load + warm-up
+        elapsed, _ = best_of(lambda: embedder.embed_texts(texts), args.repeat)
+        metrics["embed.texts_per_sec"] = metric(len(texts) / elapsed, "texts/s", "higher")
+        print(f"embed      {len(texts) / elapsed:.1f} texts/s ({args.backend})")
+
+        server, base_url = start_stub_server(latency_ms=args.llm_latency_ms)
+        try:
+            pipeline = RAGPipeline(RAGConfig(
+                embedding_model=args.embedding_model,
+                llm_model="stub-model",
+                persist_dir=str(tmp / "store"),
+                top_k=args.top_k,
+                embedding_backend=args.backend,
+                index_backend=args.index_backend,
+                hybrid_retrieval=args.hybrid,
+                llm_base_url=base_url,
+                llm_max_concurrency=max(args.concurrency),
+                answer_cache_size=0,
+                tracing=False,
+            ))
+            pipeline.embedder = embedder
+
+            t0 = time.perf_counter()
+            pipeline.index_chunks(chunks)
+            elapsed = time.perf_counter() - t0
+            metrics["index.chunks_per_sec"] = metric(len(chunks) / elapsed, "chunks/s", "higher")
+            print(f"index      {len(chunks) / elapsed:.1f} chunks/s ({args.index_backend})")
+
+            # Retrieval: latency and recall of the chunk holding the planted fact
+            relevant = [
+                {str(c["chunk_id"]) for c in chunks if code in c["text"]} for _, code in questions
+            ]
+            retrieved, latencies = [], []
+            for question, _ in questions:
+                t0 = time.perf_counter()
+                q_emb = pipeline.embedder.embed_queries([question]).tolist()
+                result = pipeline.retriever.query(q_emb, n_results=args.top_k, query_text=question)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                retrieved.append(result["ids"][0])
+            for name, value in percentiles(latencies).items():
+                metrics[f"retrieval.latency_{name}_ms"] = metric(value, "ms", "lower")
+            recall_1 = recall_at_k(retrieved, relevant, 1)
+            recall_k = recall_at_k(retrieved, relevant, args.top_k)
+            metrics["retrieval.recall_at_1"] = metric(recall_1, "ratio", "higher", RECALL_TOLERANCE)
+            metrics[f"retrieval.recall_at_{args.top_k}"] = metric(recall_k, "ratio", "higher", RECALL_TOLERANCE)
+            p = percentiles(latencies)
+            print(
+                f"retrieval  p50 {p['p50']:.1f}ms p95 {p['p95']:.1f}ms p99 {p['p99']:.1f}ms | "
+                f"recall@1 {recall_1:.3f} recall@{args.top_k} {recall_k:.3f}"
+            )
+
+            # End-to-end answers under concurrent load
+            pipeline.answer(questions[0][0])  # LLM client + connection warm-up
+            for concurrency in args.concurrency:
+                load = [questions[i % len(questions)][0] for i in range(args.answer_requests)]
+
+                def _timed(question):
+                    t0 = time.perf_counter()
+                    result = pipeline.answer(question)
+                    return (time.perf_counter() - t0) * 1000, result.get("status") == "success"
+
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    outcomes = list(pool.map(_timed, load))
+                wall = time.perf_counter() - t0
+                p = percentiles([ms for ms, _ in outcomes])
+                errors = sum(1 for _, ok in outcomes if not ok)
+                for name, value in p.items():
+                    metrics[f"answer.c{concurrency}.latency_{name}_ms"] = metric(value, "ms", "lower")
+                metrics[f"answer.c{concurrency}.answers_per_sec"] = metric(len(load) / wall, "answers/s", "higher")
+                metrics[f"answer.c{concurrency}.error_rate"] = metric(errors / len(load), "ratio", "lower", 0.0)
+                print(
+                    f"answer c={concurrency:<3} p50 {p['p50']:.1f}ms p95 {p['p95']:.1f}ms p99 {p['p99']:.1f}ms | "
+                    f"{len(load) / wall:.1f} answers/s, {errors} errors"
+                )
+        finally:
+            server.shutdown()
+
+    return {
+        "info": {
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {k: v for k, v in vars(args).items() if k not in ("func", "out", "compare_to")},
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> int:
+    """Prints a metric-by-metric comparison; returns the number of regressions."""
+    regressions = 0
+    print(f"{'metric':<36} {'baseline':>11} {'current':>11} {'change':>8}  status")
+    for name, base in sorted(baseline["metrics"].items()):
+        cur = current["metrics"].get(name)
+        if cur is None:
+            print(f"{name:<36} {base['value']:>11.4g} {'-':>11} {'':>8}  missing")
+            continue
+        tol = base.get("tolerance", tolerance)
+        # Ratios (recall, error rate) are compared in absolute terms, rates and latencies relatively
+        if base["unit"] == "ratio":
+            delta = cur["value"] - base["value"]
+            change = f"{delta:+.3f}"
+        else:
+            delta = (cur["value"] - base["value"]) / base["value"] if base["value"] else 0.0
+            change = f"{delta:+.1%}"
+        worse = -delta if base["better"] == "higher" else delta
+        status = "REGRESSION" if worse > tol else ("improved" if worse < -tol else "ok")
+        regressions += status == "REGRESSION"
+        print(f"{name:<36} {base['value']:>11.4g} {cur['value']:>11.4g} {change:>8}  {status}")
+    print(f"\n{regressions} regression(s) (tolerance {tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="run the benchmark and write a JSON report")
+    run_p.add_argument("--out", default="bench/current.json")
+    run_p.add_argument("--compare-to", default=None, help="baseline JSON to compare the new report against")
+    run_p.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    run_p.add_argument("--docs", type=int, default=20)
+    run_p.add_argument("--pages-per-doc", type=int, default=5)
+    run_p.add_argument("--page-chars", type=int, default=3000)
+    run_p.add_argument("--chunk-size", type=int, default=800)
+    run_p.add_argument("--chunk-overlap", type=int, default=150)
+    run_p.add_argument("--queries", type=int, default=100)
+    run_p.add_argument("--top-k", type=int, default=5)
+    run_p.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    run_p.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or int8")
+    run_p.add_argument("--index-backend", default="numpy")
+    run_p.add_argument("--hybrid", action="store_true", help="enable BM25 + dense retrieval")
+    run_p.add_argument("--llm-latency-ms", type=float, default=50.0, help="stub LLM response delay")
+    run_p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    run_p.add_argument("--answer-requests", type=int, default=64, help="answers per concurrency level")
+    run_p.add_argument("--repeat", type=int, default=3, help="best-of repeats for throughput stages")
+
+    cmp_p = sub.add_parser("compare", help="compare a report against a baseline")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+        sys.exit(1 if compare(baseline, current, args.tolerance) else 0)
+
+    report = run(args)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\nWrote {out}")
+    if args.compare_to:
+        print()
+        sys.exit(1 if compare(json.loads(Path(args.compare_to).read_text()), report, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
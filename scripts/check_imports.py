@@ -1,11 +1,27 @@
-import sys
+"""
+Import health and startup-time check.
+
+    python scripts/check_imports.py                  # every package imports cleanly
+    python scripts/check_imports.py --importtime     # cold import cost of the app's modules
+    python scripts/check_imports.py --importtime --json startup.json --budget-ms 500
+
+--importtime runs each target in a fresh interpreter with `python -X importtime`,
+reports its cumulative import time and heaviest dependencies, and fails if a
+module listed in HEAVY_MODULES is imported eagerly or the budget is exceeded.
+The JSON output is meant to be tracked across commits.
+"""
+from pathlib import Path
+import argparse
 import importlib
+import json
+import subprocess
+import sys
 import traceback
 
-# Add *src* to path
-sys.path.insert(0, r"C:\Users\lynda\Documents\AI Eng\projects\paper-llm-assistant\src")
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
 
-pkgs = [
+PACKAGES = [
     "embeddings",
     "ingestion",
     "llm",
@@ -16,19 +32,97 @@ pkgs = [
     "utils",
 ]
 
-failed = []
-for p in pkgs:
-    try:
-        importlib.import_module(p)
-        print("OK", p)
-    except Exception as e:
-        print("FAILED", p, e)
-        traceback.print_exc()
-        failed.append(p)
-
-if failed:
-    print("\nFAILED IMPORTS:", failed)
-    sys.exit(1)
-else:
+# What src/ui/app.py imports before it can render
+STARTUP_TARGETS = [
+    "src.rag_pipeline.pipeline",
+    "src.ingestion.pdf_loader",
+    "src.preprocessing.chunker",
+]
+
+# Must only be imported on first use (model load, first query, first LLM call)
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "chromadb", "openai", "httpx", "fitz"]
+
+
+def check_packages() -> int:
+    failed = []
+    for p in PACKAGES:
+        try:
+            importlib.import_module(f"src.{p}")
+            print("OK", p)
+        except Exception as e:
+            print("FAILED", p, e)
+            traceback.print_exc()
+            failed.append(p)
+
+    if failed:
+        print("\nFAILED IMPORTS:", failed)
+        return 1
     print("\nALL IMPORTS OK")
-    sys.exit(0)
+    return 0
+
+
+def measure_import(target: str) -> dict:
+    """Cold import of one module in a fresh interpreter, parsed from -X importtime output."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        # "import time:   self_us |   cumulative_us | <indent>module.name"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+
+    top_level = {name.split(".")[0] for name in modules}
+    heaviest = sorted(
+        ((name, m["self_us"]) for name, m in modules.items()), key=lambda kv: kv[1], reverse=True
+    )[:10]
+    return {
+        "target": target,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "total_ms": round(modules.get(target, {}).get("cumulative_us", 0) / 1000, 1),
+        "modules": len(modules),
+        "heavy_imported": sorted(m for m in HEAVY_MODULES if m in top_level),
+        "heaviest_self_ms": [(name, round(us / 1000, 1)) for name, us in heaviest],
+    }
+
+
+def check_startup(json_path: str = None, budget_ms: float = None) -> int:
+    results = [measure_import(t) for t in STARTUP_TARGETS]
+    failed = False
+    for r in results:
+        status = "OK" if r["ok"] else "FAILED"
+        print(f"{status:6} {r['target']:<32} {r['total_ms']:>8.1f} ms  {r['modules']:>4} modules")
+        if r["error"]:
+            print(f"       {r['error']}")
+        if r["heavy_imported"]:
+            print(f"       eager heavy imports: {', '.join(r['heavy_imported'])}")
+        print("       heaviest: " + ", ".join(f"{n} {ms}ms" for n, ms in r["heaviest_self_ms"][:5]))
+        failed |= not r["ok"] or bool(r["heavy_imported"])
+        if budget_ms is not None and r["total_ms"] > budget_ms:
+            print(f"       over budget ({budget_ms} ms)")
+            failed = True
+
+    if json_path:
+        Path(json_path).write_text(json.dumps({"python": sys.version.split()[0], "results": results}, indent=2))
+        print(f"\nWrote {json_path}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--importtime", action="store_true", help="measure cold import time of the app modules")
+    parser.add_argument("--json", default=None, help="write the --importtime report to this file")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if a target imports slower than this")
+    args = parser.parse_args()
+
+    if args.importtime:
+        sys.exit(check_startup(args.json, args.budget_ms))
+    sys.exit(check_packages())
+
+
+if __name__ == "__main__":
+    main()
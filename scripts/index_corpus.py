@@ -0,0 +1,66 @@
+"""
+Bulk-indexes a directory of PDFs with bounded memory: pages are extracted in a process
+pool, chunked, and embedded over an EmbeddingPool in upsert-sized batches.
+Safe to rerun after a crash: chunks already written are skipped.
+
+    python scripts/index_corpus.py data/raw --persist-dir data/vector_store --workers 8
+    python scripts/index_corpus.py data/project_x --corpus project-x --shards 4   # separate sharded corpus
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.ingestion.pdf_loader import IngestionStats, iter_pdf_batches_from_dir  # noqa: E402
+from src.preprocessing.chunker import RecursiveChunker  # noqa: E402
+from src.rag_pipeline.pipeline import RAGConfig, RAGPipeline  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir", type=Path)
+    parser.add_argument("--persist-dir", default="data/vector_store")
+    parser.add_argument("--embedding-cache-dir", default="data/embedding_cache")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or int8")
+    parser.add_argument("--index-backend", default="chroma")
+    parser.add_argument("--corpus", default="papers", help="target corpus (created on first use)")
+    parser.add_argument("--shards", type=int, default=1, help="shards of a new corpus")
+    parser.add_argument("--workers", type=int, default=4, help="embedding processes (0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per upsert batch")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    args = parser.parse_args()
+
+    pipeline = RAGPipeline(RAGConfig(
+        embedding_model=args.embedding_model,
+        llm_model="meta-llama-3-8b-instruct",
+        persist_dir=args.persist_dir,
+        embedding_cache_dir=args.embedding_cache_dir,
+        embedding_backend=args.backend,
+        index_backend=args.index_backend,
+        corpus=args.corpus,
+        corpus_shards=args.shards,
+    ))
+    chunker = RecursiveChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    ingestion = IngestionStats()
+
+    def chunks():
+        # One columnar ChunkBatch per PDF; chunk texts stay offsets into the page buffer
+        for pages in iter_pdf_batches_from_dir(args.pdf_dir, stats=ingestion):
+            yield chunker.chunk_batch(pages)
+
+    t0 = time.perf_counter()
+    stats = pipeline.index_chunk_stream(chunks(), upsert_batch_size=args.batch_size, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f"Ingestion: {ingestion.summary()}")
+    print(
+        f"Indexing: {stats['embedded']} embedded, {stats['skipped']} unchanged, {stats['deleted']} deleted "
+        f"in {elapsed:.1f}s ({stats['embedded'] / elapsed if elapsed else 0:.1f} chunks/sec)"
+    )
+
+
+if __name__ == "__main__":
+    main()
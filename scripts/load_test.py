@@ -0,0 +1,164 @@
+"""
+Load test: N simulated UI sessions sharing one RAGPipeline, as under Streamlit's
+@st.cache_resource, against the stub LLM server.
+
+    python scripts/load_test.py --sessions 1 2 4 8 16 --requests 20 --llm-latency-ms 200
+    python scripts/load_test.py --sessions 1 8 --writer          # queries during continuous upserts
+    python scripts/load_test.py --sessions 8 --no-micro-batch    # compare without query micro-batching
+
+Every session asks distinct questions back to back (answer cache disabled). For each
+session count the report shows answers/sec and its speedup over one session, end-to-end
+and retrieve-stage latency percentiles, the mean micro-batch size of query embeddings,
+and with --writer the number of upserts that completed during the run.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.llm.stub_server import start_stub_server  # noqa: E402
+from src.preprocessing.chunker import RecursiveChunker  # noqa: E402
+from src.rag_pipeline.pipeline import RAGConfig, RAGPipeline  # noqa: E402
+from src.utils.evaluation import percentiles  # noqa: E402
+
+WORDS = ["model", "attention", "layer", "dataset", "loss", "gradient", "token", "embedding",
+         "benchmark", "retrieval", "training", "inference", "results", "baseline", "ablation"]
+
+
+def synthetic_chunks(chunker: RecursiveChunker, n_docs: int, prefix: str = "paper", seed: int = 0) -> list:
+    rng = random.Random(seed)
+    chunks = []
+    for d in range(n_docs):
+        for page in range(1, 4):
+            text = " ".join(rng.choice(WORDS) for _ in range(400))
+            text += f" Project {prefix}-{d}-{page} reports results on a held-out split."
+            chunks.extend(chunker.chunk_text(text, {"source": f"{prefix}_{d:04d}.pdf", "page": page}))
+    return chunks
+
+
+def run_level(pipeline: RAGPipeline, sessions: int, requests: int, docs: int, writer_chunks=None) -> dict:
+    batcher = pipeline.query_batcher
+    if batcher is not None:
+        batcher.batches = batcher.items = 0
+
+    stop = threading.Event()
+    upserts = [0]
+
+    def _writer():
+        # Re-ingests documents one at a time (changed text each round) until the sessions finish
+        round_no = 0
+        while not stop.is_set():
+            round_no += 1
+            for doc in writer_chunks:
+                if stop.is_set():
+                    break
+                pipeline.index_chunks([dict(c, text=f"{c['text']} r{round_no}", chunk_id=f"{c['chunk_id']}-r{round_no}")
+                                       for c in doc])
+                upserts[0] += 1
+
+    def _session(s: int) -> list:
+        rng = random.Random(s)
+        timings = []
+        for r in range(requests):
+            question = (
+                f"What does project paper-{rng.randrange(docs)}-{rng.randint(1, 3)} report? "
+                f"(session {s}, request {r})"
+            )
+            t0 = time.perf_counter()
+            result = pipeline.answer(question)
+            retrieve_ms = sum(span["duration_ms"] for span in result.get("trace", []) if span["name"] == "retrieve")
+            timings.append(((time.perf_counter() - t0) * 1000, retrieve_ms, result.get("status") == "success"))
+        return timings
+
+    writer = threading.Thread(target=_writer, daemon=True) if writer_chunks else None
+    if writer is not None:
+        writer.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        timings = [t for session in pool.map(_session, range(sessions)) for t in session]
+    wall = time.perf_counter() - t0
+    stop.set()
+    if writer is not None:
+        writer.join()
+
+    return {
+        "sessions": sessions,
+        "answers": len(timings),
+        "errors": sum(1 for *_, ok in timings if not ok),
+        "answers_per_sec": len(timings) / wall,
+        "latency_ms": percentiles([t[0] for t in timings]),
+        "retrieve_ms": percentiles([t[1] for t in timings]),
+        "mean_embed_batch": batcher.mean_batch_size if batcher is not None else 1.0,
+        "upserts": upserts[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=20, help="questions per session")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="bounded LLM pool size")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or int8")
+    parser.add_argument("--index-backend", default="numpy")
+    parser.add_argument("--no-micro-batch", action="store_true", help="embed each question separately")
+    parser.add_argument("--writer", action="store_true", help="upsert documents continuously during the run")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency_ms=args.llm_latency_ms)
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = RAGPipeline(RAGConfig(
+            embedding_model=args.embedding_model,
+            llm_model="stub-model",
+            persist_dir=tmp,
+            embedding_backend=args.backend,
+            index_backend=args.index_backend,
+            llm_base_url=base_url,
+            llm_max_concurrency=args.llm_concurrency,
+            llm_max_connections=args.llm_concurrency,
+            embedding_micro_batch=1 if args.no_micro_batch else 32,
+            answer_cache_size=0,
+        ))
+        chunker = RecursiveChunker(chunk_size=800, chunk_overlap=150)
+        pipeline.index_chunks(synthetic_chunks(chunker, args.docs))
+        pipeline.warmup(background=False)
+
+        writer_chunks = None
+        if args.writer:
+            extra = synthetic_chunks(chunker, 20, prefix="update", seed=1)
+            by_doc = {}
+            for c in extra:
+                by_doc.setdefault(c["doc_id"], []).append(c)
+            writer_chunks = list(by_doc.values())
+
+        results = []
+        print(f"{'sessions':>8} {'answers/s':>10} {'speedup':>8} {'p50_ms':>8} {'p95_ms':>8} "
+              f"{'retr_p95':>9} {'embed_batch':>11} {'upserts':>8} {'errors':>7}")
+        for sessions in args.sessions:
+            r = run_level(pipeline, sessions, args.requests, args.docs, writer_chunks)
+            r["speedup"] = r["answers_per_sec"] / results[0]["answers_per_sec"] if results else 1.0
+            results.append(r)
+            print(
+                f"{sessions:>8} {r['answers_per_sec']:>10.1f} {r['speedup']:>7.1f}x "
+                f"{r['latency_ms']['p50']:>8.0f} {r['latency_ms']['p95']:>8.0f} {r['retrieve_ms']['p95']:>9.1f} "
+                f"{r['mean_embed_batch']:>11.2f} {r['upserts']:>8} {r['errors']:>7}"
+            )
+    server.shutdown()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"params": vars(args), "results": results}, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
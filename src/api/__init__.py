@@ -0,0 +1 @@
+"""Package initialization for the api package."""
@@ -0,0 +1,78 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import asyncio
+import time
+
+from src.utils.tracing import tracer
+
+
+class Overloaded(Exception):
+    """Raised when a request would exceed the admission queue; the API answers 429."""
+    def __init__(self, gate: str, retry_after_s: float):
+        super().__init__(f"{gate} is at capacity")
+        self.gate = gate
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a bounded wait queue, for one class of requests.
+
+    At most max_active requests run; up to max_queued more wait for a slot in
+    arrival order. A request arriving when the queue is full is rejected at once
+    with Overloaded instead of piling up latency for everyone behind it. Lives on
+    the event loop thread (no locking); the wait is recorded as
+    admission_wait_ms{gate=...}.
+    """
+    def __init__(self, name: str, max_active: int, max_queued: int, retry_after_s: float = 1.0):
+        self.name = name
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.retry_after_s = retry_after_s
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def check(self):
+        """Raises Overloaded if a request arriving now would be rejected; takes no slot."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_active)
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            self.rejected += 1
+            tracer.inc("admission_rejected_total", gate=self.name)
+            raise Overloaded(self.name, self.retry_after_s)
+
+    async def acquire(self):
+        """Waits for a slot, or raises Overloaded if the wait queue is full."""
+        self.check()
+
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        tracer.observe("admission_wait_ms", (time.perf_counter() - t0) * 1000, gate=self.name)
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+        }
@@ -0,0 +1,316 @@
+"""
+Async HTTP API (FastAPI/ASGI) over RAGPipeline, for other services and load tests.
+
+    python -m src.api.server --port 8000 --stub-llm            # fully offline, stub LLM
+    python -m src.api.server --llm-base-url http://127.0.0.1:1234/v1 --index-backend numpy
+
+Endpoints:
+    POST /query            {"question", "filter_dict"?, "corpus"?} -> packed context, no generation
+    POST /answer           same body -> RAGPipeline.answer result
+    POST /answer/stream    same body -> NDJSON events of RAGPipeline.answer_stream
+    POST /ingest?file_name=paper.pdf&corpus=...   raw PDF body -> 202 + ingestion job
+                           (creates the corpus; query/answer on an unknown corpus -> 404)
+    GET  /jobs, /jobs/{id}, /corpora, /healthz, /readyz, /metrics (Prometheus text)
+
+Concurrent requests are batched inside the pipeline: question embeddings and
+retrievals that arrive within batch_wait_ms share one encode call and one retriever
+query per filter (RAGConfig.embedding_/retrieval_batch_wait_ms). Queries and answers
+pass separate admission gates; a full wait queue answers 429 with Retry-After.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.api.admission import AdmissionGate, Overloaded
+from src.retrieval.sharded import validate_corpus_name
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ApiSettings:
+    max_active_queries: int = 32  # retrieval-only requests running at once
+    max_queued_queries: int = 128  # waiting beyond that; more -> 429
+    max_active_answers: int = 16  # answer/stream requests running at once (LLM pool is separate)
+    max_queued_answers: int = 64
+    max_pending_ingest: int = 32  # queued + running ingestion jobs before uploads get 429
+    max_upload_mb: float = 50.0
+    upload_dir: str = "data/raw_papers"
+    retry_after_s: float = 1.0
+
+
+class QuestionRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    filter_dict: Optional[Dict[str, Any]] = None  # Chroma-style where clause
+    corpus: Optional[str] = None  # default: the pipeline's corpus
+
+
+def create_app(pipeline: Any, job_queue: Any = None, settings: Optional[ApiSettings] = None) -> FastAPI:
+    """
+    Builds the ASGI app around a shared RAGPipeline (and optionally an
+    IngestionJobQueue for /ingest). Blocking pipeline calls run on a thread pool
+    sized to the admission gates, so the event loop only schedules and streams.
+    """
+    settings = settings or ApiSettings()
+    query_gate = AdmissionGate("query", settings.max_active_queries, settings.max_queued_queries,
+                               settings.retry_after_s)
+    answer_gate = AdmissionGate("answer", settings.max_active_answers, settings.max_queued_answers,
+                                settings.retry_after_s)
+    executor = ThreadPoolExecutor(
+        max_workers=query_gate.max_active + answer_gate.max_active, thread_name_prefix="api"
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        pipeline.warmup(background=True)
+        if job_queue is not None:
+            job_queue.start()
+        yield
+        if job_queue is not None:
+            job_queue.stop(timeout=5.0)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="Paper RAG API", lifespan=lifespan)
+    app.state.pipeline = pipeline
+    app.state.job_queue = job_queue
+    app.state.gates = {"query": query_gate, "answer": answer_gate}
+
+    @app.exception_handler(Overloaded)
+    async def _overloaded(request: Request, exc: Overloaded):
+        return JSONResponse(
+            {"detail": f"Server busy ({exc.gate} queue full); retry later."},
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(exc.retry_after_s))},
+        )
+
+    @app.middleware("http")
+    async def _record(request: Request, call_next):
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        tracer.observe(
+            "api_request_ms", (time.perf_counter() - t0) * 1000,
+            path=getattr(route, "path", "unmatched"), status=str(response.status_code),
+        )
+        return response
+
+    def _pipeline_for(corpus: Optional[str]) -> Any:
+        """Pipeline of an existing corpus; reads never create one (only ingestion does)."""
+        if not corpus:
+            return pipeline
+        if corpus not in pipeline.corpora():
+            raise HTTPException(status_code=404, detail=f"Unknown corpus {corpus}")
+        return pipeline.for_corpus(corpus)
+
+    async def _run(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args))
+
+    # ---- questions -------------------------------------------------------
+
+    @app.post("/query")
+    async def query(req: QuestionRequest) -> Dict[str, Any]:
+        target = _pipeline_for(req.corpus)
+        async with query_gate.slot():
+            return await _run(target.retrieve, req.question, req.filter_dict)
+
+    @app.post("/answer")
+    async def answer(req: QuestionRequest) -> Dict[str, Any]:
+        target = _pipeline_for(req.corpus)
+        async with answer_gate.slot():
+            return await _run(target.answer, req.question, req.filter_dict)
+
+    @app.post("/answer/stream")
+    async def answer_stream(req: QuestionRequest) -> StreamingResponse:
+        target = _pipeline_for(req.corpus)
+        # A full queue is still a plain 429. The slot itself is taken inside the body, so a
+        # client that disconnects before the body is iterated never holds one
+        answer_gate.check()
+        events = target.answer_stream(req.question, req.filter_dict)
+
+        async def _ndjson():
+            try:
+                await answer_gate.acquire()
+            except Overloaded as e:  # the queue filled up since the check
+                yield json.dumps({
+                    "type": "done", "status": "error",
+                    "answer": f"Server busy ({e.gate} queue full); retry later.",
+                }) + "\n"
+                return
+            try:
+                while True:
+                    event = await _run(next, events, None)
+                    if event is None:
+                        break
+                    yield json.dumps(event, default=str) + "\n"
+            finally:
+                # Client gone or stream done: close the generator so its LLM slot is freed
+                await _run(events.close)
+                answer_gate.release()
+
+        return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+    # ---- ingestion -------------------------------------------------------
+
+    def _require_queue() -> Any:
+        if job_queue is None:
+            raise HTTPException(status_code=404, detail="Ingestion is not enabled on this server.")
+        return job_queue
+
+    @app.post("/ingest", status_code=202)
+    async def ingest(request: Request, file_name: str, corpus: Optional[str] = None) -> Dict[str, Any]:
+        queue = _require_queue()
+        name = Path(file_name).name
+        if not name.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="file_name must end in .pdf")
+        if corpus:
+            try:
+                validate_corpus_name(corpus)  # the ingestion job creates the corpus
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        if queue.active_count() >= settings.max_pending_ingest:
+            tracer.inc("admission_rejected_total", gate="ingest")
+            raise Overloaded("ingest", settings.retry_after_s)
+
+        limit = int(settings.max_upload_mb * 1024 * 1024)
+        if int(request.headers.get("content-length") or 0) > limit:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {settings.max_upload_mb:g} MB")
+        body = await request.body()
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {settings.max_upload_mb:g} MB")
+        if not body.startswith(b"%PDF"):
+            raise HTTPException(status_code=400, detail="Body is not a PDF")
+
+        # Content-addressed folder keeps the original file name (it becomes the citation source)
+        dest = Path(settings.upload_dir) / hashlib.sha256(body).hexdigest()[:16] / name
+
+        def _save_and_submit():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_bytes(body)
+            return queue.submit(dest, corpus=corpus)
+
+        return await _run(_save_and_submit)
+
+    @app.get("/jobs")
+    async def list_jobs(limit: int = 20, status: Optional[str] = None):
+        return _require_queue().list_jobs(limit=limit, status=status)
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str) -> Dict[str, Any]:
+        job = _require_queue().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+        return job
+
+    # ---- operations ------------------------------------------------------
+
+    @app.get("/corpora")
+    async def corpora():
+        return pipeline.corpora()
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, str]:
+        """Liveness: the process serves requests."""
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    async def readyz():
+        """Readiness: models are loaded (warm-up finished); includes queue depths."""
+        body = {
+            "status": "ready" if pipeline.is_warm else "warming_up",
+            "gates": {name: gate.stats() for name, gate in app.state.gates.items()},
+        }
+        if job_queue is not None:
+            body["ingestion_active"] = job_queue.active_count()
+        return JSONResponse(body, status_code=200 if pipeline.is_warm else 503)
+
+    @app.get("/metrics")
+    async def metrics() -> PlainTextResponse:
+        return PlainTextResponse(pipeline.metrics_text(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    from src.ingestion.job_queue import IngestionJobQueue
+    from src.llm.stub_server import start_stub_server
+    from src.preprocessing.chunker import RecursiveChunker
+    from src.rag_pipeline.context_builder import DEFAULT_CONTEXT_TOKENIZER
+    from src.rag_pipeline.pipeline import RAGConfig, RAGPipeline
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="torch", help="embedding backend: torch, onnx or int8")
+    parser.add_argument("--index-backend", default="chroma")
+    parser.add_argument("--llm-model", default="meta-llama-3-8b-instruct")
+    parser.add_argument("--context-tokenizer", default=DEFAULT_CONTEXT_TOKENIZER,
+                        help="HF tokenizer (name or path) of the generation model for context packing")
+    parser.add_argument("--llm-base-url", default="http://127.0.0.1:1234/v1")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--stub-llm", action="store_true", help="serve answers from the in-process stub LLM")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0,
+                        help="window for merging concurrent embeddings/retrievals into one batch")
+    parser.add_argument("--max-active-answers", type=int, default=16)
+    parser.add_argument("--max-queued-answers", type=int, default=64)
+    parser.add_argument("--max-active-queries", type=int, default=32)
+    parser.add_argument("--max-queued-queries", type=int, default=128)
+    parser.add_argument("--ingest-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    llm_base_url, llm_model = args.llm_base_url, args.llm_model
+    if args.stub_llm:
+        _, llm_base_url = start_stub_server(latency_ms=args.stub_latency_ms)
+        llm_model = "stub-model"
+
+    data_dir = Path(args.data_dir)
+    pipeline = RAGPipeline(RAGConfig(
+        embedding_model=args.embedding_model,
+        llm_model=llm_model,
+        context_tokenizer=args.context_tokenizer,
+        persist_dir=str(data_dir / "vector_store"),
+        embedding_cache_dir=str(data_dir / "embedding_cache"),
+        embedding_backend=args.backend,
+        index_backend=args.index_backend,
+        embedding_batch_wait_ms=args.batch_wait_ms,
+        retrieval_batch_wait_ms=args.batch_wait_ms,
+        llm_base_url=llm_base_url,
+        llm_max_concurrency=args.llm_concurrency,
+    ))
+    job_queue = IngestionJobQueue(
+        str(data_dir / "ingestion_jobs.sqlite"),
+        pipeline,
+        RecursiveChunker(chunk_size=800, chunk_overlap=150),
+        workers=args.ingest_workers,
+    )
+    app = create_app(pipeline, job_queue, ApiSettings(
+        max_active_queries=args.max_active_queries,
+        max_queued_queries=args.max_queued_queries,
+        max_active_answers=args.max_active_answers,
+        max_queued_answers=args.max_queued_answers,
+        upload_dir=str(data_dir / "raw_papers"),
+    ))
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
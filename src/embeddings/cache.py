@@ -0,0 +1,266 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_model_key(model_name: str, backend: str = "torch") -> str:
+    """Cache namespace name; fp32 torch keeps the bare model name so existing caches stay valid."""
+    return model_name if backend == "torch" else f"{model_name}|{backend}"
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk embedding store keyed by (model name, normalize flag, text hash).
+
+    Layout of one namespace directory:
+        meta.json    model name, normalize flag, dim and dtype
+        keys.txt     one text hash per line; line number == row in vectors.bin
+        vectors.bin  raw row-major matrix, read back through np.memmap
+        write.lock   serializes appends across processes and cache instances
+
+    Several instances (or processes) may share a directory: appends take write.lock,
+    pick up rows other writers added, and place new rows at the end of the files.
+    """
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        normalize: bool = True,
+        dtype: str = "float32",
+    ):
+        namespace = text_hash(f"{model_name}|normalize={normalize}")[:16]
+        self.dir = Path(cache_dir) / namespace
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.normalize = normalize
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+
+        self._keys_path = self.dir / "keys.txt"
+        self._vectors_path = self.dir / "vectors.bin"
+        self._meta_path = self.dir / "meta.json"
+        self._lock_path = self.dir / "write.lock"
+        self._index: Dict[str, int] = {}
+        self._rows = 0  # lines of keys.txt read so far == rows of vectors.bin we can map
+        self._keys_offset = 0  # bytes of keys.txt read so far
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        if meta.get("dtype") != self.dtype.name:
+            logger.warning(
+                f"Embedding cache {self.dir} stores {meta.get('dtype')}; ignoring requested {self.dtype.name}"
+            )
+            self.dtype = np.dtype(meta["dtype"])
+        self.dim = meta["dim"]
+
+    def _load(self):
+        with self._lock, self._file_lock():
+            if not self._meta_path.exists():
+                return
+            self._read_meta()
+
+            data = self._keys_path.read_bytes() if self._keys_path.exists() else b""
+            # An unterminated last line is a key write cut short; it never committed
+            keys = data[:data.rfind(b"\n") + 1].decode("utf-8").splitlines()
+            row_bytes = self.dim * self.dtype.itemsize
+            stored_bytes = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            stored_rows = stored_bytes // row_bytes
+
+            # A crash between the two appends leaves the files out of step (or a partial last
+            # row); keep the common prefix so later appends stay row-aligned
+            rows = min(len(keys), stored_rows)
+            torn_key = bool(data) and not data.endswith(b"\n")
+            if torn_key or rows != len(keys) or rows * row_bytes != stored_bytes:
+                logger.warning(f"Repairing embedding cache {self.dir}: keeping {rows} consistent rows")
+                keys = keys[:rows]
+                self._keys_path.write_text("".join(k + "\n" for k in keys), encoding="utf-8")
+                # "ab" also covers a missing vectors.bin (rows is then 0)
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(rows * row_bytes)
+
+            self._sync()
+        logger.info(f"Embedding cache for '{self.model_name}' loaded with {self._rows} vectors")
+
+    def _sync(self):
+        """Index the keys other writers appended since we last read keys.txt."""
+        if not self._keys_path.exists() or self._keys_path.stat().st_size == self._keys_offset:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1]
+        for key in data.decode("utf-8").splitlines():
+            self._index.setdefault(key, self._rows)
+            self._rows += 1
+        self._keys_offset += len(data)
+        self._mmap = None  # reopen with the new shape on next read
+
+    def _matrix(self) -> np.memmap:
+        if self._mmap is None:
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=self.dtype, mode="r", shape=(self._rows, self.dim)
+            )
+        return self._mmap
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Returns ({position: vector} for cached texts, [positions of misses]).
+        """
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            if self.dim is not None:
+                # Keys are committed after their vectors, so any complete line is readable
+                self._sync()
+            rows = {i: self._index[h] for i, h in enumerate(hashes) if h in self._index}
+            found: Dict[int, np.ndarray] = {}
+            if rows:
+                matrix = self._matrix()
+                for i, row in rows.items():
+                    found[i] = np.asarray(matrix[row], dtype=np.float32)
+            misses = [i for i in range(len(texts)) if i not in found]
+            self.hits += len(found)
+            self.misses += len(misses)
+        return found, misses
+
+    def add(self, texts: List[str], vectors: np.ndarray):
+        if not texts:
+            return
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                if self._meta_path.exists():  # another writer created the namespace
+                    self._read_meta()
+                else:
+                    self.dim = int(vectors.shape[1])
+                    self._meta_path.write_text(json.dumps({
+                        "model_name": self.model_name,
+                        "normalize": self.normalize,
+                        "dim": self.dim,
+                        "dtype": self.dtype.name,
+                    }), encoding="utf-8")
+            self._sync()
+            vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+
+            new_keys, new_rows, seen = [], [], set()
+            for text, vec in zip(texts, vectors):
+                h = text_hash(text)
+                if h in self._index or h in seen:
+                    continue
+                seen.add(h)
+                new_keys.append(h)
+                new_rows.append(vec)
+            if not new_keys:
+                return
+
+            # Rows are positions in the files, not in our index: drop vectors a crashed
+            # writer left without keys so the next row lines up with the next key line
+            row_bytes = self.dim * self.dtype.itemsize
+            committed = self._rows * row_bytes
+            if self._vectors_path.exists() and self._vectors_path.stat().st_size != committed:
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(committed)
+
+            # Vectors first, keys second: keys.txt is the commit record
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack(new_rows).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            keys_blob = "".join(k + "\n" for k in new_keys).encode("utf-8")
+            with open(self._keys_path, "ab") as f:
+                f.write(keys_blob)
+
+            for h in new_keys:
+                self._index[h] = self._rows
+                self._rows += 1
+            self._keys_offset += len(keys_blob)
+            self._mmap = None  # reopen with the new shape on next read
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._index),
+        }
+
+
+class LRUCache:
+    """Small in-memory LRU map used for hot query embeddings and reranker scores."""
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: np.ndarray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._data),
+        }
@@ -1,35 +1,122 @@
-import torch
 import numpy as np
 import logging
-from typing import List, Union
-from sentence_transformers import SentenceTransformer
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from src.embeddings.cache import EmbeddingCache, LRUCache, cache_model_key
+from src.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+BACKENDS = ("torch", "onnx", "int8")
+
+# Max allowed 1 - cosine(backend vector, fp32 torch vector) per text, checked by
+# scripts/bench_embedder.py. ONNX Runtime runs the same fp32 graph; dynamic int8
+# quantization of the Linear layers costs a little accuracy.
+BACKEND_COSINE_TOLERANCE = {"torch": 1e-6, "onnx": 1e-4, "int8": 2e-2}
+
+
 class Embedder:
     """
     Optimized Embedder for industrial NLP use cases.
     Supports hardware acceleration and batching for scalability.
+    With cache_dir set, vectors are persisted per (model, backend, normalize, text hash)
+    and only cache misses reach the model.
+
+    backend selects the CPU inference path: "torch" (fp32), "onnx" (ONNX Runtime via
+    sentence-transformers, needs optimum/onnxruntime) or "int8" (torch dynamic
+    quantization). num_threads sets intra-op threads for whichever runtime is used.
+
+    torch and sentence-transformers are imported, and the model loaded, on first use
+    (or an explicit load()), so constructing an Embedder is cheap.
     """
-    def __init__(self, model_name: str, device: str = None):
-        # Auto-detect GPU for "Deep Learning" know-how
-        if device is None:
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        else:
-            self.device = device
-            
-        logger.info(f"Loading embedding model '{model_name}' on {self.device}")
-        self.model = SentenceTransformer(model_name, device=self.device)
+    def __init__(
+        self,
+        model_name: str,
+        device: str = None,
+        cache_dir: Optional[str] = None,
+        query_cache_size: int = 256,
+        backend: str = "torch",
+        num_threads: Optional[int] = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+        # The optimized backends are CPU-only; None auto-detects the GPU at load time
+        self.device = "cpu" if backend != "torch" else device
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        self._model = None
+        self._load_lock = threading.Lock()
+
+        self.cache_dir = cache_dir
+        self._disk_caches: Dict[bool, EmbeddingCache] = {}
+        self._disk_caches_lock = threading.Lock()
+        self.query_cache = LRUCache(max_size=query_cache_size)
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            self.load()
+        return self._model
+
+    def load(self):
+        """Imports the runtime and loads the model; safe to call from a warm-up thread."""
+        with self._load_lock:
+            if self._model is not None:
+                return
+            import torch
+
+            # Auto-detect GPU for "Deep Learning" know-how
+            if self.device is None:
+                self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            logger.info(f"Loading embedding model '{self.model_name}' ({self.backend}) on {self.device}")
+            self._model = self._load_model(self.model_name, self.backend, self.num_threads)
+
+    def _load_model(self, model_name: str, backend: str, num_threads: Optional[int]) -> Any:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if backend == "onnx":
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if num_threads:
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = options
+            return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+        model = SentenceTransformer(model_name, device=self.device)
+        if backend == "int8":
+            # Quantizes the transformer's Linear layers in place; pooling/normalize are unchanged
+            model[0].auto_model = torch.quantization.quantize_dynamic(
+                model[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return model
+
+    def disk_cache(self, normalize: bool = True) -> Optional[EmbeddingCache]:
+        """The on-disk cache for this model/backend; share this instance instead of opening the directory again."""
+        if self.cache_dir is None:
+            return None
+        with self._disk_caches_lock:
+            if normalize not in self._disk_caches:
+                self._disk_caches[normalize] = EmbeddingCache(
+                    self.cache_dir, cache_model_key(self.model_name, self.backend), normalize=normalize
+                )
+            return self._disk_caches[normalize]
 
     def embed_texts(
-        self, 
-        texts: List[str], 
+        self,
+        texts: List[str],
         batch_size: int = 32,
         normalize: bool = True
     ) -> np.ndarray:
         """
         Embeds texts with optimized batching and normalization.
-        
+
         Args:
             texts: List of strings to encode.
             batch_size: Number of texts to process at once (saves memory).
@@ -38,18 +125,77 @@ class Embedder:
         if not texts:
             return np.array([])
 
+        cache = self.disk_cache(normalize)
+        if cache is None:
+            return self._encode(texts, batch_size, normalize)
+
+        found, misses = cache.lookup(texts)
+        tracer.inc("embedding_cache_lookups_total", len(found), cache="disk", result="hit")
+        tracer.inc("embedding_cache_lookups_total", len(misses), cache="disk", result="miss")
+        if not misses:
+            logger.info(f"Embedding cache hit for all {len(texts)} texts")
+            return np.stack([found[i] for i in range(len(texts))])
+
+        miss_texts = [texts[i] for i in misses]
+        encoded = self._encode(miss_texts, batch_size, normalize)
+        cache.add(miss_texts, encoded)
+
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[misses] = encoded
+        for i, vec in found.items():
+            embeddings[i] = vec
+        return embeddings
+
+    def embed_queries(self, queries: List[str], normalize: bool = True) -> np.ndarray:
+        """
+        Embeds user questions through the in-memory LRU tier first,
+        falling back to embed_texts (and its disk cache) for the rest.
+        """
+        if not queries:
+            return np.array([])
+
+        vectors: Dict[int, np.ndarray] = {}
+        missing = []
+        for i, q in enumerate(queries):
+            vec = self.query_cache.get((normalize, q))
+            if vec is None:
+                missing.append(i)
+            else:
+                vectors[i] = vec
+
+        tracer.inc("embedding_cache_lookups_total", len(vectors), cache="query_lru", result="hit")
+        tracer.inc("embedding_cache_lookups_total", len(missing), cache="query_lru", result="miss")
+        if missing:
+            encoded = self.embed_texts([queries[i] for i in missing], normalize=normalize)
+            for i, vec in zip(missing, encoded):
+                self.query_cache.put((normalize, queries[i]), vec)
+                vectors[i] = vec
+
+        return np.stack([vectors[i] for i in range(len(queries))])
+
+    def _encode(self, texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+        # SentenceTransformer.encode sorts texts by length before batching, so each
+        # batch is padded only to its own longest text (length bucketing)
         logger.info(f"Encoding {len(texts)} texts...")
-        
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=len(texts) > 100, # Only show for large jobs
-            convert_to_numpy=True,
-            normalize_embeddings=normalize 
-        )
-        
+
+        with tracer.span("encode", texts=len(texts), backend=self.backend):
+            embeddings = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=len(texts) > 100, # Only show for large jobs
+                convert_to_numpy=True,
+                normalize_embeddings=normalize
+            )
+
         return embeddings
 
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counters for the query LRU and each disk cache namespace."""
+        stats = {"query_lru": self.query_cache.stats()}
+        for normalize, cache in self._disk_caches.items():
+            stats[f"disk_normalize_{normalize}"] = cache.stats()
+        return stats
+
     def get_embedding_dimension(self) -> int:
         """Helper for initializing vector databases correctly."""
-        return self.model.get_sentence_embedding_dimension()
\ No newline at end of file
+        return self.model.get_sentence_embedding_dimension()
@@ -0,0 +1,121 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+
+from src.embeddings.cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of a pool worker, set once by _init_worker
+_worker_embedder = None
+_worker_settings: dict = {}
+
+
+def _init_worker(model_name: str, backend: str, num_threads: Optional[int], batch_size: int, normalize: bool):
+    """Loads the model once when the worker process starts."""
+    global _worker_embedder
+    from src.embeddings.embedder import Embedder
+    _worker_embedder = Embedder(model_name, device="cpu", backend=backend, num_threads=num_threads)
+    _worker_embedder.load()
+    _worker_settings.update(batch_size=batch_size, normalize=normalize)
+
+
+def _embed_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(
+        _worker_embedder._encode(texts, _worker_settings["batch_size"], _worker_settings["normalize"]),
+        dtype=np.float32,
+    )
+
+
+class EmbeddingPool:
+    """
+    Spreads embedding batches over worker processes, each holding its own model.
+
+    imap() keeps at most max_in_flight batches submitted-but-unconsumed and yields
+    results in input order, so memory stays bounded by the window, not the corpus.
+    Workers are spawned (not forked) and pinned to threads_per_worker intra-op
+    threads so they do not oversubscribe the cores. With cache (the Embedder's own
+    EmbeddingCache, see Embedder.disk_cache), the parent process serves cached
+    vectors and appends new ones through that same instance.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        workers: Optional[int] = None,
+        backend: str = "torch",
+        threads_per_worker: Optional[int] = None,
+        batch_size: int = 32,
+        normalize: bool = True,
+        max_in_flight: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        cpus = os.cpu_count() or 1
+        self.workers = max(1, workers or cpus)
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.workers)
+        self.max_in_flight = max(1, max_in_flight or 2 * self.workers)
+        if cache is not None and cache.normalize != normalize:
+            raise ValueError("EmbeddingPool cache was opened with a different normalize flag")
+        self.cache = cache
+        logger.info(
+            f"Starting embedding pool: {self.workers} workers x {self.threads_per_worker} threads ({backend})"
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads_per_worker, batch_size, normalize),
+        )
+
+    def imap(self, items: Iterable[Tuple[Any, List[str]]]) -> Iterator[Tuple[Any, np.ndarray]]:
+        """
+        Embeds (key, texts) items and yields (key, embeddings) in input order.
+        key is passed through untouched (e.g. the chunk IDs and metadata of the batch).
+        """
+        window: deque = deque()
+        items = iter(items)
+        exhausted = False
+
+        while True:
+            while not exhausted and len(window) < self.max_in_flight:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                window.append(self._submit(*item))
+            if not window:
+                return
+            yield self._collect(*window.popleft())
+
+    def _submit(self, key: Any, texts: List[str]) -> Tuple[Any, List[str], dict, List[int], Optional[Future]]:
+        if self.cache is None:
+            return key, texts, {}, list(range(len(texts))), self._executor.submit(_embed_worker, texts)
+        found, misses = self.cache.lookup(texts)
+        future = self._executor.submit(_embed_worker, [texts[i] for i in misses]) if misses else None
+        return key, texts, found, misses, future
+
+    def _collect(self, key: Any, texts: List[str], found: dict, misses: List[int], future: Optional[Future]):
+        if future is None:
+            return key, np.stack([found[i] for i in range(len(texts))])
+        encoded = future.result()
+        if self.cache is None:
+            return key, encoded
+        self.cache.add([texts[i] for i in misses], encoded)
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[misses] = encoded
+        for i, vec in found.items():
+            embeddings[i] = vec
+        return key, embeddings
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
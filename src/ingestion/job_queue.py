@@ -0,0 +1,324 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.ingestion.pdf_loader import load_pdf_batch
+from src.retrieval.sharded import validate_corpus_name
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    corpus TEXT,                    -- target corpus (RAGPipeline.for_corpus)
+    status TEXT NOT NULL,           -- queued, running, done, failed
+    stage TEXT,                     -- extracting, chunking, indexing
+    progress REAL NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    embedded INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,                     -- host:pid:instance of the worker running it
+    heartbeat REAL,                 -- refreshed by the owner while running
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _owner_alive(owner: Optional[str]) -> Optional[bool]:
+    """Whether the process named by an owner id still runs; None when it is on another host."""
+    host, _, rest = (owner or "").partition(":")
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(int(rest.split(":")[0]), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    except ValueError:
+        return None
+    return True
+
+
+class IngestionJobQueue:
+    """
+    Persistent queue of PDF ingestion jobs with a pool of background worker threads.
+
+    Job state lives in a SQLite database (WAL mode), so status survives restarts and
+    can be polled from any thread or process. Several processes (the Streamlit app and the
+    API server) may share one database: a running job carries its owner and a
+    heartbeat, and is queued again only once the heartbeat is older than
+    stale_after_s or its owner process on this host has exited. submit() deduplicates by file content hash and
+    target corpus: a file that is already queued, running or indexed into that corpus
+    returns the existing job.
+
+    Workers extract and chunk in parallel, then index through the target corpus's
+    RAGPipeline.index_chunk_stream, which serializes writers on that corpus's index
+    lock; queries keep being answered while a job runs.
+    """
+    def __init__(
+        self,
+        db_path: str,
+        pipeline: Any,
+        chunker: Any,
+        workers: int = 1,
+        poll_interval_s: float = 0.5,
+        upsert_batch_size: int = 64,
+        heartbeat_interval_s: float = 10.0,
+        stale_after_s: float = 60.0,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.pipeline = pipeline
+        self.chunker = chunker
+        self.workers = max(1, workers)
+        self.poll_interval_s = poll_interval_s
+        self.upsert_batch_size = upsert_batch_size
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self.stale_after_s = max(stale_after_s, 2 * heartbeat_interval_s)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "corpus" not in columns:  # databases created before corpora existed
+                conn.execute("ALTER TABLE jobs ADD COLUMN corpus TEXT")
+            for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("UPDATE jobs SET corpus = ? WHERE corpus IS NULL", (pipeline.cfg.corpus,))
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_file_hash_corpus ON jobs (file_hash, corpus)")
+            self._requeue_abandoned(conn)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ---- client side -----------------------------------------------------
+
+    def submit(self, path: Path, corpus: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queues a PDF for ingestion into `corpus` (default: the pipeline's), or returns
+        the job already covering identical content there.
+        """
+        path = Path(path)
+        corpus = corpus or self.pipeline.cfg.corpus
+        validate_corpus_name(corpus)
+        file_hash = file_sha256(path)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE file_hash = ? AND corpus = ? AND status != 'failed' "
+                "ORDER BY created DESC LIMIT 1",
+                (file_hash, corpus),
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex[:12]
+                conn.execute(
+                    "INSERT INTO jobs (id, file_hash, path, file_name, corpus, status, created) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                    (job_id, file_hash, str(path), path.name, corpus, time.time()),
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                logger.info(f"Queued ingestion job {job_id} for {path.name} into corpus '{corpus}'")
+            conn.execute("COMMIT")
+        self._wakeup.set()
+        return dict(row)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        query, params = "SELECT * FROM jobs", []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    def active_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+
+    def forget_finished(self, corpus: Optional[str] = None):
+        """
+        Drops finished jobs (of one corpus, or all), e.g. after that index was cleared,
+        so the same files can be re-submitted.
+        """
+        query, params = "DELETE FROM jobs WHERE status IN ('done', 'failed')", []
+        if corpus is not None:
+            query += " AND corpus = ?"
+            params.append(corpus)
+        with self._connect() as conn:
+            conn.execute(query, params)
+
+    # ---- workers ---------------------------------------------------------
+
+    def start(self) -> "IngestionJobQueue":
+        if not self._threads:
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stops after the running jobs finish; queued jobs stay queued."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_abandoned(self, conn: sqlite3.Connection):
+        """Queues running jobs again whose owner stopped heartbeating or has exited."""
+        stale_before = time.time() - self.stale_after_s
+        abandoned = [
+            row["id"]
+            for row in conn.execute("SELECT id, owner, heartbeat FROM jobs WHERE status = 'running'")
+            if row["owner"] != self.owner and (
+                row["heartbeat"] is None  # claimed before heartbeats existed
+                or row["heartbeat"] < stale_before
+                or _owner_alive(row["owner"]) is False
+            )
+        ]
+        for job_id in abandoned:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0, owner = NULL, heartbeat = NULL "
+                "WHERE id = ?",
+                (job_id,),
+            )
+        if abandoned:
+            logger.info(f"Re-queued {len(abandoned)} interrupted ingestion jobs")
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically moves the oldest queued job to running (safe across processes)."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_abandoned(conn)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, error = NULL, owner = ?, heartbeat = ? "
+                    "WHERE id = ?",
+                    (now, self.owner, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        return dict(row) if row is not None else None
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval_s):
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), self.owner),
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Ingestion heartbeat failed: {e}")
+
+    def _update(self, job_id: str, **fields):
+        # Only while this instance still owns the job: a job re-queued as abandoned belongs to its new owner
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ? AND owner = ?", (*fields.values(), job_id, self.owner)
+            )
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval_s)
+                self._wakeup.clear()
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                logger.exception(f"Ingestion job {job['id']} ({job['file_name']}) failed")
+                self._update(job["id"], status="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+
+    def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        t0 = time.time()
+
+        self._update(job_id, stage="extracting", progress=0.0)
+        pages = load_pdf_batch(Path(job["path"]))
+
+        self._update(job_id, stage="chunking", progress=0.1, pages=len(pages))
+        chunks = self.chunker.chunk_batch(pages)
+        total = max(1, len(chunks))
+
+        self._update(job_id, stage="indexing", progress=0.2, chunks=len(chunks))
+
+        def _progress(stats: Dict[str, int]):
+            done = stats["embedded"] + stats["skipped"]
+            self._update(job_id, progress=0.2 + 0.8 * min(1.0, done / total), embedded=stats["embedded"])
+
+        stats = self.pipeline.for_corpus(job["corpus"]).index_chunk_stream(
+            [chunks], upsert_batch_size=self.upsert_batch_size, workers=0, progress=_progress
+        )
+        self._update(
+            job_id,
+            status="done",
+            stage=None,
+            progress=1.0,
+            embedded=stats["embedded"],
+            skipped=stats["skipped"],
+            deleted=stats["deleted"],
+            finished=time.time(),
+        )
+        logger.info(
+            f"Ingestion job {job_id} ({job['file_name']}) finished in {time.time() - t0:.1f}s: "
+            f"{len(pages)} pages, {len(chunks)} chunks ({stats['embedded']} embedded, {stats['skipped']} unchanged)"
+        )
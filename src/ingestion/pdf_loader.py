@@ -1,31 +1,213 @@
 from pathlib import Path
-from typing import List, Dict, Any
-import fitz  # PyMuPDF
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 import logging
+import os
+import time
+
+from src.preprocessing.records import ChunkBatch, ChunkBatchBuilder
+from src.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
-def load_pdf_pages(path: Path) -> List[Dict[str, Any]]:
-    pages_data = []
-    with fitz.open(path) as doc:
+def _extract_pages(path: Path) -> List[Tuple[int, str]]:
+    """(page_number, text) of every non-empty page."""
+    import fitz  # PyMuPDF; imported on first use to keep app startup fast
+
+    pages = []
+    with tracer.span("load_pdf", source=path.name) as span, fitz.open(path) as doc:
         for page_num, page in enumerate(doc, start=1):
             text = page.get_text("text").strip()
             if text:
-                pages_data.append({
-                    "text": text,
-                    "page": page_num,         # Must match UI key 'page'
-                    "source": path.name      # Must match UI key 'source'
-                })
-    return pages_data
+                pages.append((page_num, text))
+        span.set(pages=len(pages))
+    return pages
+
+
+def load_pdf_pages(path: Path) -> List[Dict[str, Any]]:
+    return [
+        {
+            "text": text,
+            "page": page_num,         # Must match UI key 'page'
+            "source": path.name      # Must match UI key 'source'
+        }
+        for page_num, text in _extract_pages(path)
+    ]
+
+
+def load_pdf_batch(path: Path) -> ChunkBatch:
+    """
+    Pages of one PDF as a ChunkBatch (one row per page, doc_id = file name), the
+    compact input of RecursiveChunker.chunk_batch.
+    """
+    builder = ChunkBatchBuilder()
+    for page_num, text in _extract_pages(path):
+        builder.add(f"{path.name}_p{page_num}", text, path.name, path.name, page_num, 1, 0, len(text))
+    return builder.build()
+
 
-def load_pdfs_from_dir(dir_path: Path) -> List[Dict[str, Any]]:
+@dataclass
+class IngestionStats:
+    """
+    Throughput report for a directory ingestion run.
+    Filled in place by iter_pdfs_from_dir, so it can be read while the generator runs
+    (elapsed_s is updated with every yielded file) and after it ends or is closed.
+    """
+    files_total: int = 0
+    files_ok: int = 0
+    pages: int = 0
+    elapsed_s: float = 0.0
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.pages} pages from {self.files_ok}/{self.files_total} PDFs "
+            f"in {self.elapsed_s:.2f}s ({self.pages_per_sec:.1f} pages/sec, "
+            f"{len(self.failed)} failed)"
+        )
+
+
+def _extract_pages_worker(path_str: str) -> Tuple[str, Optional[ChunkBatch], Optional[str]]:
+    """
+    Runs in a worker process. Errors are returned, not raised,
+    so one corrupt PDF never takes down the rest of the batch.
+    """
+    try:
+        return path_str, load_pdf_batch(Path(path_str)), None
+    except Exception as e:
+        return path_str, None, f"{type(e).__name__}: {e}"
+
+
+def iter_pdfs_from_dir(
+    dir_path: Path,
+    max_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    stats: Optional[IngestionStats] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streams page-level dictionaries from every PDF in a directory using a process pool.
+    Same arguments as iter_pdf_batches_from_dir.
+    """
+    for pages in iter_pdf_batches_from_dir(dir_path, max_workers, max_in_flight, stats):
+        for i in range(len(pages)):
+            yield {"text": pages.text(i), "page": int(pages.pages[i]), "source": pages.doc_id(i)}
+
+
+def iter_pdf_batches_from_dir(
+    dir_path: Path,
+    max_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    stats: Optional[IngestionStats] = None,
+) -> Iterator[ChunkBatch]:
+    """
+    Streams one ChunkBatch of pages per PDF in a directory using a process pool.
+    Workers send back the columnar batch, which pickles as one text buffer plus a few arrays.
+
+    Args:
+        dir_path: Directory to scan for *.pdf files.
+        max_workers: Worker processes (defaults to the CPU count).
+        max_in_flight: Upper bound on submitted-but-unconsumed files. Keeps peak
+            memory bounded when the consumer (chunking/embedding) is slower than extraction.
+        stats: Optional IngestionStats that is updated as pages are yielded.
+
+    Files arrive in completion order.
+    """
+    stats = stats if stats is not None else IngestionStats()
+    pdf_files = sorted(dir_path.glob("*.pdf"))
+    stats.files_total = len(pdf_files)
+
+    if not pdf_files:
+        logger.warning(f"No PDFs found in {dir_path}")
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max(1, max_in_flight or 2 * max_workers)
+    start_time = time.perf_counter()
+
+    pending_paths = iter(pdf_files)
+    in_flight: Dict[Any, str] = {}
+    # Files in flight when a worker process died (segfault, OOM). Each is re-run alone,
+    # so the one that kills its worker again is the culprit and the others still succeed.
+    suspects: List[str] = []
+    isolated: Optional[str] = None
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    def _refill():
+        nonlocal isolated
+        if suspects:
+            if not in_flight:
+                isolated = suspects.pop()
+                in_flight[executor.submit(_extract_pages_worker, isolated)] = isolated
+            return
+        for pdf_path in pending_paths:
+            in_flight[executor.submit(_extract_pages_worker, str(pdf_path))] = str(pdf_path)
+            if len(in_flight) >= max_in_flight:
+                break
+
+    try:
+        _refill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path_str = in_flight.pop(future)
+                name = Path(path_str).name
+                try:
+                    _, pages, error = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if path_str != isolated:
+                        suspects.append(path_str)
+                        continue
+                    pages, error = None, "worker process died (crash or out of memory)"
+                if error is not None:
+                    logger.error(f"Failed to extract {name}: {error}")
+                    stats.failed[name] = error
+                    continue
+
+                stats.files_ok += 1
+                stats.pages += len(pages)
+                stats.elapsed_s = time.perf_counter() - start_time
+                logger.info(f"Processed: {name} ({len(pages)} pages)")
+                yield pages
+
+            if broken:
+                suspects.extend(in_flight.values())
+                if suspects:
+                    logger.warning(f"PDF worker process died; re-running {len(suspects)} files one at a time")
+                in_flight.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+            _refill()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        stats.elapsed_s = time.perf_counter() - start_time
+        logger.info(f"Ingestion finished: {stats.summary()}")
+
+
+def load_pdfs_from_dir(
+    dir_path: Path,
+    parallel: bool = False,
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
     """
     Discovers PDFs and flattens them into a list of page-level dictionaries.
     This prepares the data for more granular 'Task and Use Case' level analysis.
+    With parallel=True extraction runs in a process pool (see iter_pdfs_from_dir);
+    prefer the generator itself for large corpora so pages are not all held at once.
     """
+    if parallel:
+        return list(iter_pdfs_from_dir(dir_path, max_workers=max_workers))
+
     all_pages = []
     pdf_files = list(dir_path.glob("*.pdf"))
-    
+
     if not pdf_files:
         logger.warning(f"No PDFs found in {dir_path}")
         return []
@@ -34,5 +216,5 @@ def load_pdfs_from_dir(dir_path: Path) -> List[Dict[str, Any]]:
         logger.info(f"Processing: {pdf_path.name}")
         pages = load_pdf_pages(pdf_path)
         all_pages.extend(pages)
-        
-    return all_pages
\ No newline at end of file
+
+    return all_pages
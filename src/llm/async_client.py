@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.llm.client import LLMSettings, error_response, usage_dict
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def _transient_errors() -> Tuple[type, ...]:
+    """Errors worth retrying: the server was unreachable, slow, overloaded or failed internally."""
+    import openai
+    return (
+        openai.APIConnectionError,  # includes APITimeoutError
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+
+class _LoopState:
+    """Client and in-flight map of one event loop (httpx pools and futures are loop-bound)."""
+    def __init__(self, client: Any):
+        self.client = client
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+
+class AsyncLLMClient:
+    """
+    asyncio client for an OpenAI-compatible endpoint (LM Studio, vLLM, llama.cpp server).
+
+    - one pooled httpx connection pool per event loop, so threads each running
+      their own loop (answer_many from several sessions) can share one client
+    - request slots bounding concurrent requests to settings.max_concurrency across
+      all loops; pass LLMClient.slots to share the bound with the synchronous client
+    - exponential backoff with jitter for transient errors
+    - in-flight coalescing: identical concurrent prompts share a single request
+    """
+    def __init__(self, settings: Optional[LLMSettings] = None, slots: Optional[threading.BoundedSemaphore] = None):
+        self.settings = settings or LLMSettings()
+        self.slots = slots or threading.BoundedSemaphore(max(1, self.settings.max_concurrency))
+        self._transient: Tuple[type, ...] = ()
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._loops_lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = 0
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is not None:
+            return state
+        # Imported here so constructing the pipeline does not pay for httpx/openai
+        import httpx
+        import openai
+
+        self._transient = _transient_errors()
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.settings.max_connections,
+                max_keepalive_connections=self.settings.max_connections,
+            ),
+            timeout=self.settings.timeout,
+        )
+        state = _LoopState(openai.AsyncOpenAI(
+            base_url=self.settings.base_url,
+            api_key=self.settings.api_key,
+            http_client=http_client,
+            max_retries=0,  # retries are handled here so a slot is not held while sleeping
+        ))
+        with self._loops_lock:
+            self._loops[loop] = state
+        return state
+
+    async def _acquire_slot(self):
+        """
+        Waits for a request slot without blocking the loop. The slots are a
+        threading semaphore shared across loops (and with LLMClient), so they are
+        polled instead of awaited; cancellation while waiting cannot leak a slot.
+        """
+        t0 = time.perf_counter()
+        delay = 0.002
+        while not self.slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        tracer.observe("llm_queue_wait_ms", (time.perf_counter() - t0) * 1000)
+
+    async def chat(
+        self,
+        system: str,
+        messages: List[Dict],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict:
+        """
+        Same contract as LLMClient.chat: always returns {"answer", "status"}.
+        """
+        state = self._state()
+        payload = {
+            "model": self.settings.model,
+            "messages": [{"role": "system", "content": system}] + messages,
+            "temperature": self.settings.temperature if temperature is None else temperature,
+            "max_tokens": self.settings.max_tokens if max_tokens is None else max_tokens,
+        }
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+        future = state.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self._chat_with_retries(state.client, payload))
+            state.inflight[key] = future
+            future.add_done_callback(lambda _: state.inflight.pop(key, None))
+        # shield: one caller being cancelled must not cancel the shared request
+        return await asyncio.shield(future)
+
+    async def _chat_with_retries(self, client: Any, payload: Dict) -> Dict:
+        attempt = 0
+        while True:
+            try:
+                await self._acquire_slot()
+                try:
+                    self.requests += 1
+                    response = await client.chat.completions.create(**payload)
+                finally:
+                    self.slots.release()
+                return {
+                    "answer": response.choices[0].message.content,
+                    "status": "success",
+                    "usage": usage_dict(response),
+                }
+            except self._transient as e:
+                if attempt >= self.settings.max_retries:
+                    return self._error(e)
+                delay = min(self.settings.backoff_max, self.settings.backoff_base * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2  # jitter avoids synchronized retry storms
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Transient LLM error ({type(e).__name__}); retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                return self._error(e)
+
+    def _error(self, e: Exception) -> Dict:
+        return error_response(self.settings.base_url, e)
+
+    async def aclose(self):
+        """Closes the connection pool of the running loop; other loops keep theirs."""
+        with self._loops_lock:
+            state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "retries": self.retries, "coalesced": self.coalesced}
@@ -1,36 +1,160 @@
-import openai
-from typing import List, Dict
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Iterator, List, Dict, Optional, Union
+import threading
+import time
+
+from src.utils.tracing import tracer
+
+@dataclass
+class LLMSettings:
+    """
+    Connection and generation settings shared by LLMClient and AsyncLLMClient.
+    Defaults match a local LM Studio server.
+    """
+    model: str = "meta-llama-3-8b-instruct"
+    base_url: str = "http://127.0.0.1:1234/v1"  # mandatory /v1 suffix for LM Studio
+    api_key: str = "lm-studio"
+    temperature: float = 0.1  # Critical for 'Trustworthy AI' faithfulness
+    max_tokens: int = 900
+    timeout: float = 120.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    max_concurrency: int = 4
+    max_connections: int = 16
+
+    # config/model.yaml key -> field name
+    _YAML_KEYS = {
+        "llm_model": "model",
+        "llm_base_url": "base_url",
+        "llm_api_key": "api_key",
+        "temperature": "temperature",
+        "llm_max_tokens": "max_tokens",
+        "llm_timeout": "timeout",
+        "llm_max_retries": "max_retries",
+        "llm_max_concurrency": "max_concurrency",
+        "llm_max_connections": "max_connections",
+    }
+
+    @classmethod
+    def from_yaml(cls, path: Union[str, Path]) -> "LLMSettings":
+        """Reads the llm_* keys from config/model.yaml; missing keys keep their defaults."""
+        import yaml
+
+        with open(path, "r", encoding="utf-8") as f:
+            raw = yaml.safe_load(f) or {}
+        valid = {f.name for f in fields(cls)}
+        kwargs = {
+            name: raw[key] for key, name in cls._YAML_KEYS.items()
+            if key in raw and name in valid
+        }
+        return cls(**kwargs)
+
+
+def error_response(base_url: str, e: Exception) -> Dict:
+    """Uniform failure payload; a dict instead of a raw string keeps the UI subscriptable."""
+    return {
+        "answer": f"❌ Connection Error: Ensure the LLM server is reachable at {base_url}. Detail: {str(e)}",
+        "status": "error"
+    }
+
+
+def usage_dict(response: Any) -> Optional[Dict[str, int]]:
+    """Token usage reported by the server, if any (LM Studio and vLLM both report it)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+    }
+
 
 class LLMClient:
-    def __init__(self, model_name: str = "local-model"):
-        # mandatory /v1 suffix for LM Studio
-        self.api_base = "http://127.0.0.1:1234/v1"
-        self.api_key = "lm-studio" 
-        
-        self.client = openai.OpenAI(
-            base_url=self.api_base, 
-            api_key=self.api_key,
-            timeout=120.0 
-        )
-
-    def chat(self, system: str, messages: List[Dict]) -> Dict:
+    """
+    Thread-safe synchronous client shared by every UI session. At most
+    settings.max_concurrency requests are in flight (callers beyond that wait for a
+    slot) over a pooled, keep-alive HTTP connection pool of max_connections.
+    """
+    def __init__(self, model_name: str = "meta-llama-3-8b-instruct", settings: Optional[LLMSettings] = None):
+        self.settings = settings or LLMSettings(model=model_name)
+        self.api_base = self.settings.base_url
+        self.api_key = self.settings.api_key
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Shared with the pipeline's AsyncLLMClient so max_concurrency bounds both paths
+        self.slots = threading.BoundedSemaphore(max(1, self.settings.max_concurrency))
+
+    @property
+    def client(self) -> Any:
+        """openai.OpenAI, imported and created on first use to keep startup fast."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    import openai
+                    self._client = openai.OpenAI(
+                        base_url=self.api_base,
+                        api_key=self.api_key,
+                        timeout=self.settings.timeout,
+                        max_retries=self.settings.max_retries,
+                        http_client=openai.DefaultHttpxClient(limits=httpx.Limits(
+                            max_connections=self.settings.max_connections,
+                            max_keepalive_connections=self.settings.max_connections,
+                        )),
+                    )
+        return self._client
+
+    @contextmanager
+    def _slot(self) -> Iterator[None]:
+        """Waits for one of the max_concurrency request slots."""
+        t0 = time.perf_counter()
+        with self.slots:
+            tracer.observe("llm_queue_wait_ms", (time.perf_counter() - t0) * 1000)
+            yield
+
+    def chat(self, system: str, messages: List[Dict], temperature: Optional[float] = None) -> Dict:
         """
-        Sends RAG context to Llama 3. 
+        Sends RAG context to Llama 3.
         Always returns a dictionary to prevent 'NoneType' errors in UI.
         """
         formatted_messages = [{"role": "system", "content": system}] + messages
-        
+
         try:
-            response = self.client.chat.completions.create(
-                model="meta-llama-3-8b-instruct", 
+            with self._slot():
+                response = self.client.chat.completions.create(
+                    model=self.settings.model,
+                    messages=formatted_messages,
+                    temperature=self.settings.temperature if temperature is None else temperature,
+                    max_tokens=self.settings.max_tokens
+                )
+            return {
+                "answer": response.choices[0].message.content,
+                "status": "success",
+                "usage": usage_dict(response),
+            }
+        except Exception as e:
+            return error_response(self.api_base, e)
+
+    def chat_stream(self, system: str, messages: List[Dict], temperature: Optional[float] = None) -> Iterator[str]:
+        """
+        Streams the completion as text deltas.
+        Unlike chat(), errors are raised so the caller can report them after partial output.
+        """
+        formatted_messages = [{"role": "system", "content": system}] + messages
+
+        # The slot is held until the stream is consumed or closed
+        with self._slot():
+            stream = self.client.chat.completions.create(
+                model=self.settings.model,
                 messages=formatted_messages,
-                temperature=0.1, # Critical for 'Trustworthy AI' faithfulness
-                max_tokens=900
+                temperature=self.settings.temperature if temperature is None else temperature,
+                max_tokens=self.settings.max_tokens,
+                stream=True,
             )
-            return {"answer": response.choices[0].message.content, "status": "success"}
-        except Exception as e:
-            # Return a dict instead of a raw string to keep UI subscriptable
-            return {
-                "answer": f"❌ Connection Error: Ensure LM Studio server is started on port 1234. Detail: {str(e)}",
-                "status": "error"
-            }
\ No newline at end of file
+            with stream:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
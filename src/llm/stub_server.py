@@ -0,0 +1,153 @@
+"""
+Minimal OpenAI-compatible chat completions server for offline tests and benchmarks.
+
+    python -m src.llm.stub_server --port 1234 --latency-ms 200 --fail-rate 0.1
+
+Supports "stream": true (SSE chunks). Answers echo the tail of the question so results are deterministic.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+    latency_ms: float = 0.0
+    token_delay_ms: float = 0.0
+    fail_rate: float = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        self.server.request_count += 1
+        if self.fail_rate and random.random() < self.fail_rate:
+            self._send_json(503, {"error": {"message": "stub overloaded", "type": "server_error"}})
+            return
+
+        time.sleep(self.latency_ms / 1000.0)
+        last = request.get("messages", [{}])[-1].get("content", "")
+        answer = f"Stub answer based on the provided context. ({last[-80:].strip()})"
+        if request.get("stream"):
+            self._stream(request, answer)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(last.split()), "completion_tokens": len(answer.split())},
+        })
+
+    def _stream(self, request: dict, answer: str):
+        """Server-sent events in OpenAI's chat.completion.chunk format, one word per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            self._write_event({
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub-model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            })
+            time.sleep(self.token_delay_ms / 1000.0)
+        self._write_event({
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub-model"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, body: dict):
+        self._write_chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 0.0,
+    fail_rate: float = 0.0,
+    token_delay_ms: float = 0.0,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Starts the stub in a daemon thread. Returns (server, base_url); port=0 picks a free port.
+    Call server.shutdown() when done.
+    """
+    handler = type("StubHandler", (_StubHandler,), {
+        "latency_ms": latency_ms,
+        "fail_rate": fail_rate,
+        "token_delay_ms": token_delay_ms,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed words")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency_ms, args.fail_rate, args.token_delay_ms)
+    print(f"Stub LLM server listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
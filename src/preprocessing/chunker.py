@@ -1,24 +1,41 @@
-from typing import List, Dict
+from bisect import bisect_left
+from typing import Any, Callable, List, Dict, Optional, Tuple, Union
+import hashlib
 import logging
-import uuid
+import re
+
+from src.preprocessing.records import ChunkBatch, ChunkBatchBuilder
+from src.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 
 class RecursiveChunker:
     """
-    Industry-standard chunker that splits text based on a hierarchy 
+    Industry-standard chunker that splits text based on a hierarchy
     to preserve semantic meaning and metadata for citations.
+
+    Each chunk ends at the strongest separator ("\\n\\n" > "\\n" > ". " > " " > hard cut)
+    found in the second half of its window, so the whole page is split in a single
+    left-to-right pass. Sizes are in characters, or in tokens when a Hugging Face fast
+    tokenizer (instance or name) is given; tokens are computed once per page.
     """
     def __init__(
         self,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
         separators: List[str] = ["\n\n", "\n", ". ", " ", ""],
+        tokenizer: Optional[Union[str, Any]] = None,
     ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.separators = separators
+        if isinstance(tokenizer, str):
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+        self.tokenizer = tokenizer
 
     def chunk_text(
         self,
@@ -33,47 +50,135 @@ class RecursiveChunker:
         page_num = doc_metadata.get("page", 0)
         doc_id = doc_metadata.get("doc_id", file_name)
 
-        split_texts = self._recursive_split(text, self.separators)
+        return [
+            {
+                "chunk_id": chunk_id,
+                "text": text[start:end],
+                # flat metadata so RAGPipeline.index_chunks can read it
+                "doc_id": doc_id,
+                "file_name": file_name,
+                "page_number": page_num,
+                "line": line,
+                "start_char": start,
+                "end_char": end,
+            }
+            for start, end, chunk_id, line in self._page_chunks(text, doc_id, page_num)
+        ]
 
-        chunks = []
-        current_char = 0  # track position to estimate line
+    def chunk_batch(self, pages: ChunkBatch) -> ChunkBatch:
+        """
+        Columnar variant of chunk_text over a batch of pages (e.g. from load_pdf_batch).
+        Chunks are offsets into the pages' text buffer, so overlap copies no text.
+        """
+        builder = ChunkBatchBuilder(buffer=pages.buffer)
+        for i, (page_start, _) in enumerate(pages.bounds.tolist()):
+            doc_id, source = pages.doc_id(i), pages.names[pages.source_codes[i]]
+            page_num = int(pages.pages[i])
+            for start, end, chunk_id, line in self._page_chunks(pages.text(i), doc_id, page_num):
+                builder.add_span(chunk_id, page_start + start, page_start + end, doc_id, source, page_num, line, start, end)
+        return builder.build()
 
-        for chunk_content in split_texts:
-            # rough line estimate: count newlines up to this chunk
-            prefix = text[:current_char]
-            approx_line = prefix.count("\n") + 1
+    def _page_chunks(self, text: str, doc_id: str, page_num: int) -> List[Tuple[int, int, str, int]]:
+        """(start, end, chunk_id, line) of every non-blank chunk of one page."""
+        with tracer.span("chunk", chars=len(text)) as span:
+            # Newline offsets computed once; line lookup is a binary search per chunk
+            newline_offsets = [m.start() for m in re.finditer("\n", text)]
 
-            chunks.append(
-                {
-                    "chunk_id": f"{doc_id}_p{page_num}_{uuid.uuid4().hex[:8]}",
-                    "text": chunk_content,
-                    # flat metadata so RAGPipeline.index_chunks can read it
-                    "doc_id": doc_id,
-                    "file_name": file_name,
-                    "page_number": page_num,
-                    "line": approx_line,
-                }
-            )
+            chunks = []
+            seen_hashes: Dict[str, int] = {}
 
-            current_char += len(chunk_content)
+            for start, end in self._split_spans(text):
+                chunk_content = text[start:end]
+                if not chunk_content.strip():
+                    continue
+                chunks.append((
+                    start,
+                    end,
+                    self._chunk_id(doc_id, page_num, chunk_content, seen_hashes),
+                    bisect_left(newline_offsets, start) + 1,
+                ))
+            span.set(chunks=len(chunks))
 
         return chunks
 
-    def _recursive_split(self, text: str, separators: List[str]) -> List[str]:
+    @staticmethod
+    def _chunk_id(doc_id: str, page_num: int, content: str, seen_hashes: Dict[str, int]) -> str:
         """
-        Handles the sliding-window splitting logic.
+        Deterministic ID derived from doc, page and content, so re-ingesting
+        the same paper upserts instead of duplicating vectors.
+        Repeated identical text on one page gets an occurrence suffix in the hash.
         """
-        final_chunks = []
-        current_start = 0
+        digest = hashlib.sha1(f"{doc_id}\x00{page_num}\x00{content}".encode("utf-8")).hexdigest()
+        occurrence = seen_hashes.get(digest, 0)
+        seen_hashes[digest] = occurrence + 1
+        if occurrence:
+            digest = hashlib.sha1(f"{digest}\x00{occurrence}".encode("utf-8")).hexdigest()
+        return f"{doc_id}_p{page_num}_{digest[:16]}"
+
+    def _size_functions(self, text: str) -> Tuple[Callable[[int], int], Callable[[int, int], int]]:
+        """
+        Returns (window_end(start), overlap_start(start, end)) in character offsets,
+        measuring sizes in characters or tokens.
+        """
+        n = len(text)
+        if self.tokenizer is None:
+            def window_end(start: int) -> int:
+                return min(start + self.chunk_size, n)
+
+            def overlap_start(start: int, end: int) -> int:
+                return end - self.chunk_overlap
 
-        while current_start < len(text):
-            end = min(current_start + self.chunk_size, len(text))
-            chunk = text[current_start:end]
-            final_chunks.append(chunk)
+            return window_end, overlap_start
 
-            if end == len(text):
+        offsets = self.tokenizer(
+            text, return_offsets_mapping=True, add_special_tokens=False
+        )["offset_mapping"]
+        token_starts = [s for s, _ in offsets]
+
+        def window_end(start: int) -> int:
+            last = bisect_left(token_starts, start) + self.chunk_size
+            return n if last >= len(token_starts) else token_starts[last]
+
+        def overlap_start(start: int, end: int) -> int:
+            first = bisect_left(token_starts, end) - self.chunk_overlap
+            return token_starts[max(first, 0)] if token_starts else end
+
+        return window_end, overlap_start
+
+    def _split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Single pass over the text producing overlapping (start, end) spans.
+        Every separator search is bounded by the current window, so total work is
+        linear in the page length.
+        """
+        n = len(text)
+        window_end, overlap_start = self._size_functions(text)
+        spans = []
+        start = 0
+
+        while start < n:
+            limit = window_end(start)
+            if limit >= n:
+                spans.append((start, n))
                 break
 
-            current_start += (self.chunk_size - self.chunk_overlap)
+            end = limit
+            floor = start + max(1, (limit - start) // 2)  # never break in the first half
+            for sep in self.separators:
+                if not sep:
+                    break  # hard cut at the window limit
+                pos = text.rfind(sep, floor, limit)
+                if pos != -1:
+                    end = pos + len(sep)
+                    break
+            spans.append((start, end))
+
+            # Step back by the overlap, then forward to a word boundary if mid-word
+            next_start = max(overlap_start(start, end), start + 1)
+            if not text[next_start - 1].isspace():
+                boundary = text.find(" ", next_start, end)
+                if boundary != -1:
+                    next_start = boundary + 1
+            start = next_start
 
-        return final_chunks
+        return spans
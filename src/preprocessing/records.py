@@ -0,0 +1,251 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import sys
+
+import numpy as np
+
+
+class ChunkBatch:
+    """
+    Columnar batch of chunks (or pages) passed from the loader through the chunker
+    to RAGPipeline and the retrievers.
+
+    Texts are (start, end) offsets into one shared buffer, so overlapping chunks of
+    a page cost no extra memory and subsets made with take() never copy text.
+    Document and source names are interned once in a small table and referenced
+    by int32 codes; page, line and character offsets are int32 columns.
+    Rows read as the flat dicts RecursiveChunker.chunk_text returns (batch[i],
+    iteration), for code that still works per chunk.
+    """
+    __slots__ = ("buffer", "bounds", "chunk_ids", "names", "doc_codes", "source_codes", "pages", "lines", "char_spans")
+
+    def __init__(
+        self,
+        buffer: str,
+        bounds: np.ndarray,
+        chunk_ids: List[str],
+        names: List[str],
+        doc_codes: np.ndarray,
+        source_codes: np.ndarray,
+        pages: np.ndarray,
+        lines: np.ndarray,
+        char_spans: np.ndarray,
+    ):
+        self.buffer = buffer
+        self.bounds = bounds  # (n, 2) int64 offsets into buffer
+        self.chunk_ids = chunk_ids
+        self.names = names
+        self.doc_codes = doc_codes  # (n,) int32 into names
+        self.source_codes = source_codes  # (n,) int32 into names
+        self.pages = pages  # (n,) int32
+        self.lines = lines  # (n,) int32, 1-based line of the chunk start on its page
+        self.char_spans = char_spans  # (n, 2) int32 start/end character on the page
+
+    # ---- construction ----------------------------------------------------
+
+    @classmethod
+    def empty(cls) -> "ChunkBatch":
+        return cls(
+            "", np.zeros((0, 2), dtype=np.int64), [], [],
+            np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros((0, 2), dtype=np.int32),
+        )
+
+    @classmethod
+    def from_dicts(cls, chunks: Iterable[Dict[str, Any]]) -> "ChunkBatch":
+        """Packs chunk dicts in RecursiveChunker.chunk_text's flat shape."""
+        builder = ChunkBatchBuilder()
+        for c in chunks:
+            builder.add(
+                str(c["chunk_id"]),
+                c["text"],
+                str(c.get("doc_id")),
+                c.get("file_name", "Unknown"),
+                c.get("page_number") or 0,
+                c.get("line") or 1,
+                c.get("start_char") or 0,
+                c.get("end_char") or len(c["text"]),
+            )
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches: Sequence["ChunkBatch"]) -> "ChunkBatch":
+        """One batch holding the rows of all batches in order (buffers are joined once)."""
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        names: List[str] = []
+        codes: Dict[str, int] = {}
+        bounds, doc_codes, source_codes = [], [], []
+        offset = 0
+        for b in batches:
+            remap = np.array([codes.setdefault(n, len(codes)) for n in b.names], dtype=np.int32)
+            bounds.append(b.bounds + offset)
+            doc_codes.append(remap[b.doc_codes])
+            source_codes.append(remap[b.source_codes])
+            offset += len(b.buffer)
+        names = list(codes)
+        return cls(
+            "".join(b.buffer for b in batches),
+            np.concatenate(bounds),
+            [cid for b in batches for cid in b.chunk_ids],
+            names,
+            np.concatenate(doc_codes),
+            np.concatenate(source_codes),
+            np.concatenate([b.pages for b in batches]),
+            np.concatenate([b.lines for b in batches]),
+            np.concatenate([b.char_spans for b in batches]),
+        )
+
+    def take(self, indices: Sequence[int]) -> "ChunkBatch":
+        """Subset of rows sharing this batch's text buffer and name table."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return ChunkBatch(
+            self.buffer,
+            self.bounds[indices],
+            [self.chunk_ids[i] for i in indices],
+            self.names,
+            self.doc_codes[indices],
+            self.source_codes[indices],
+            self.pages[indices],
+            self.lines[indices],
+            self.char_spans[indices],
+        )
+
+    def compact(self) -> "ChunkBatch":
+        """Copy whose buffer holds only the text this batch references (e.g. before pickling a subset)."""
+        parts, bounds, offset = [], np.empty_like(self.bounds), 0
+        for i, (start, end) in enumerate(self.bounds.tolist()):
+            parts.append(self.buffer[start:end])
+            bounds[i] = (offset, offset + end - start)
+            offset += end - start
+        return ChunkBatch(
+            "".join(parts), bounds, list(self.chunk_ids), self.names,
+            self.doc_codes, self.source_codes, self.pages, self.lines, self.char_spans,
+        )
+
+    # ---- columns ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def text(self, i: int) -> str:
+        start, end = self.bounds[i]
+        return self.buffer[start:end]
+
+    def texts(self) -> List[str]:
+        """Materializes the row texts, e.g. for one embedding call."""
+        return [self.buffer[start:end] for start, end in self.bounds.tolist()]
+
+    def doc_id(self, i: int) -> str:
+        return self.names[self.doc_codes[i]]
+
+    def doc_ids(self) -> List[str]:
+        return [self.names[c] for c in self.doc_codes.tolist()]
+
+    def metadatas(self) -> List[Dict[str, Any]]:
+        """Per-chunk metadata in the shape the retrievers store (doc_id, page, source)."""
+        names = self.names
+        return [
+            {"doc_id": names[d], "page": page, "source": names[s]}
+            for d, s, page in zip(self.doc_codes.tolist(), self.source_codes.tolist(), self.pages.tolist())
+        ]
+
+    def group_by_doc(self) -> Iterator[Tuple[str, "ChunkBatch"]]:
+        """(doc_id, rows of that document), documents in order of first appearance."""
+        codes, first = np.unique(self.doc_codes, return_index=True)
+        for code in codes[np.argsort(first)]:
+            yield self.names[code], self.take(np.flatnonzero(self.doc_codes == code))
+
+    def split(self, size: int) -> Iterator["ChunkBatch"]:
+        for start in range(0, len(self), size):
+            yield self.take(range(start, min(start + size, len(self))))
+
+    # ---- row access ------------------------------------------------------
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += len(self)
+        start_char, end_char = self.char_spans[i].tolist()
+        return {
+            "chunk_id": self.chunk_ids[i],
+            "text": self.text(i),
+            "doc_id": self.doc_id(i),
+            "file_name": self.names[self.source_codes[i]],
+            "page_number": int(self.pages[i]),
+            "line": int(self.lines[i]),
+            "start_char": start_char,
+            "end_char": end_char,
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self) -> int:
+        """Approximate payload size: text buffer, ID strings and the numeric columns."""
+        arrays = (self.bounds, self.doc_codes, self.source_codes, self.pages, self.lines, self.char_spans)
+        return (
+            sys.getsizeof(self.buffer)
+            + sum(sys.getsizeof(cid) for cid in self.chunk_ids)
+            + sum(a.nbytes for a in arrays)
+        )
+
+
+class ChunkBatchBuilder:
+    """
+    Appends rows column by column and freezes them into a ChunkBatch.
+    With a shared buffer (e.g. the page text) rows are added by offset via
+    add_span(); add() appends the text to the buffer instead.
+    """
+    def __init__(self, buffer: Optional[str] = None):
+        self._parts: List[str] = []
+        self._buffer = buffer
+        self._size = len(buffer) if buffer is not None else 0
+        self._codes: Dict[str, int] = {}
+        self.chunk_ids: List[str] = []
+        self._bounds: List[int] = []
+        self._doc_codes: List[int] = []
+        self._source_codes: List[int] = []
+        self._pages: List[int] = []
+        self._lines: List[int] = []
+        self._char_spans: List[int] = []
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[sys.intern(name)] = len(self._codes)
+        return code
+
+    def add(self, chunk_id: str, text: str, doc_id: str, source: str, page: int, line: int,
+            start_char: int, end_char: int):
+        if self._buffer is not None:
+            raise ValueError("builder has a shared buffer; use add_span()")
+        self._parts.append(text)
+        self.add_span(chunk_id, self._size, self._size + len(text), doc_id, source, page, line, start_char, end_char)
+        self._size += len(text)
+
+    def add_span(self, chunk_id: str, start: int, end: int, doc_id: str, source: str, page: int, line: int,
+                 start_char: int, end_char: int):
+        self.chunk_ids.append(chunk_id)
+        self._bounds.extend((start, end))
+        self._doc_codes.append(self._code(doc_id))
+        self._source_codes.append(self._code(source))
+        self._pages.append(int(page))
+        self._lines.append(line)
+        self._char_spans.extend((start_char, end_char))
+
+    def build(self) -> ChunkBatch:
+        return ChunkBatch(
+            self._buffer if self._buffer is not None else "".join(self._parts),
+            np.array(self._bounds, dtype=np.int64).reshape(-1, 2),
+            self.chunk_ids,
+            list(self._codes),
+            np.array(self._doc_codes, dtype=np.int32),
+            np.array(self._source_codes, dtype=np.int32),
+            np.array(self._pages, dtype=np.int32),
+            np.array(self._lines, dtype=np.int32),
+            np.array(self._char_spans, dtype=np.int32).reshape(-1, 2),
+        )
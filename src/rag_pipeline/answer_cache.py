@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+import copy
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the question."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+@dataclass
+class _Entry:
+    filter_key: str
+    version: int
+    embedding: Optional[np.ndarray]
+    result: Dict[str, Any]
+    created: float
+
+
+class AnswerCache:
+    """
+    In-memory answer cache in front of RAGPipeline.answer.
+
+    Exact hits match on (normalized question, filter, index version). Near-duplicate
+    hits compare the question embedding against cached ones (a small dense matrix,
+    rebuilt lazily) and accept cosine similarity >= similarity_threshold with the
+    same filter and index version. Entries expire after ttl_s; the least recently
+    used entry is evicted beyond max_entries.
+    """
+    def __init__(self, max_entries: int = 256, ttl_s: float = 3600.0, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _filter_key(filter_dict: Optional[Dict]) -> str:
+        return json.dumps(filter_dict, sort_keys=True)
+
+    def _key(self, question: str, filter_dict: Optional[Dict], version: int) -> str:
+        return f"{version}|{self._filter_key(filter_dict)}|{normalize_question(question)}"
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_s > 0 and now - entry.created > self.ttl_s
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def get_exact(self, question: str, filter_dict: Optional[Dict], version: int) -> Optional[Dict[str, Any]]:
+        key = self._key(question, filter_dict, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return copy.deepcopy(entry.result)
+
+    def get_similar(
+        self,
+        embedding: np.ndarray,
+        filter_dict: Optional[Dict],
+        version: int,
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Best cached answer above the similarity threshold, as (result, similarity)."""
+        filter_key = self._filter_key(filter_dict)
+        now = time.time()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+                self._matrix = (
+                    np.stack([self._entries[k].embedding for k in self._matrix_keys])
+                    if self._matrix_keys else np.zeros((0, len(embedding)), dtype=np.float32)
+                )
+            if len(self._matrix_keys) == 0:
+                self.misses += 1
+                return None
+
+            q = np.asarray(embedding, dtype=np.float32)
+            sims = self._matrix @ (q / (np.linalg.norm(q) or 1.0))
+            for idx in np.argsort(-sims):
+                if sims[idx] < self.similarity_threshold:
+                    break
+                key = self._matrix_keys[idx]
+                entry = self._entries.get(key)
+                if entry is None or entry.version != version or entry.filter_key != filter_key:
+                    continue
+                if self._expired(entry, now):
+                    continue
+                self._entries.move_to_end(key)
+                self.semantic_hits += 1
+                return copy.deepcopy(entry.result), float(sims[idx])
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        question: str,
+        filter_dict: Optional[Dict],
+        version: int,
+        embedding: Optional[np.ndarray],
+        result: Dict[str, Any],
+    ):
+        if self.max_entries <= 0:
+            return
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        key = self._key(question, filter_dict, version)
+        with self._lock:
+            self._entries[key] = _Entry(
+                filter_key=self._filter_key(filter_dict),
+                version=version,
+                embedding=embedding,
+                result=copy.deepcopy(result),
+                created=time.time(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._matrix_keys = []
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import hashlib
+import logging
+import math
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SEPARATOR = "\n\n---\n\n"
+
+
+def format_block(text: str, meta: Dict[str, Any]) -> str:
+    """One traceable context block, as cited by the LLM."""
+    return f"[Source: {meta.get('source')}, Page: {meta.get('page')}]\n{text}"
+
+
+# Tokenizer of the Llama 3 8B Instruct model the app and API server generate with (gated on the Hub:
+# run `huggingface-cli login` once, or point context_tokenizer at a local copy)
+DEFAULT_CONTEXT_TOKENIZER = "meta-llama/Meta-Llama-3-8B-Instruct"
+
+
+class TokenCounter:
+    """
+    Counts tokens with the generation model's tokenizer (Hugging Face name or path),
+    caching counts per text. Without a tokenizer it falls back to ~4 chars/token,
+    which is close enough for budgeting English prose but not exact.
+    """
+    def __init__(self, tokenizer_name: Optional[str] = None, cache_size: int = 16384):
+        self.tokenizer_name = tokenizer_name
+        self.cache_size = cache_size
+        self._tokenizer = None
+        self._loaded = False
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._loaded = True
+        if not self.tokenizer_name:
+            logger.warning("No context_tokenizer configured; estimating context tokens as ~4 chars/token")
+            return
+        try:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+            logger.info(f"Counting context tokens with tokenizer '{self.tokenizer_name}'")
+        except Exception as e:
+            logger.warning(
+                f"Could not load tokenizer '{self.tokenizer_name}' ({e}); estimating tokens from length "
+                "(gated models need `huggingface-cli login`, or use a local path)"
+            )
+
+    def count(self, text: str) -> int:
+        if not self._loaded:
+            self._load()
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        if self._tokenizer is not None:
+            n = len(self._tokenizer.encode(text, add_special_tokens=False))
+        else:
+            n = math.ceil(len(text) / 4)
+
+        with self._lock:
+            self._cache[key] = n
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return n
+
+
+@dataclass
+class PackedContext:
+    context: str
+    docs: List[str] = field(default_factory=list)
+    metadatas: List[Dict] = field(default_factory=list)
+    tokens: int = 0
+    merged: int = 0
+    deduplicated: int = 0
+    dropped: int = 0
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _suffix_prefix_overlap(a: str, b: str, min_overlap: int, max_window: int) -> int:
+    """Length of the longest suffix of a that is a prefix of b (0 if < min_overlap)."""
+    if len(a) < min_overlap or len(b) < min_overlap:
+        return 0
+    probe = b[:min_overlap]
+    pos = a.find(probe, max(0, len(a) - max_window))
+    while pos != -1:
+        tail = len(a) - pos
+        if tail <= len(b) and b.startswith(a[pos:]):
+            return tail
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks (best first) into a token budget:
+    exact/contained duplicates are dropped, overlapping neighbours from the same
+    source page are merged into one block, and chunks that no longer fit are skipped.
+    """
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_tokens: int = 2048,
+        min_overlap: int = 20,
+        max_overlap_window: int = 1000,
+    ):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.min_overlap = min_overlap
+        self.max_overlap_window = max_overlap_window
+        self._separator_tokens: Optional[int] = None
+
+    def _block_tokens(self, text: str, meta: Dict[str, Any]) -> int:
+        return self.counter.count(format_block(text, meta))
+
+    def _try_merge(self, block_text: str, text: str) -> Optional[str]:
+        overlap = _suffix_prefix_overlap(block_text, text, self.min_overlap, self.max_overlap_window)
+        if overlap:
+            return block_text + text[overlap:]
+        overlap = _suffix_prefix_overlap(text, block_text, self.min_overlap, self.max_overlap_window)
+        if overlap:
+            return text + block_text[overlap:]
+        return None
+
+    def build(self, docs: List[str], metadatas: List[Dict]) -> PackedContext:
+        if self._separator_tokens is None:
+            self._separator_tokens = self.counter.count(BLOCK_SEPARATOR)
+
+        blocks: List[Dict[str, Any]] = []  # {"text", "meta", "tokens", "sep"} in rank order
+        seen = set()
+        packed = PackedContext(context="")
+        used = 0
+
+        for text, meta in zip(docs, metadatas):
+            norm = _normalize(text)
+            if not norm or norm in seen:
+                packed.deduplicated += 1
+                continue
+            seen.add(norm)
+
+            page_key = (meta.get("source"), meta.get("page"))
+            same_page = [b for b in blocks if (b["meta"].get("source"), b["meta"].get("page")) == page_key]
+            if any(norm in _normalize(b["text"]) for b in same_page):
+                packed.deduplicated += 1
+                continue
+
+            merged = False
+            for block in same_page:
+                combined = self._try_merge(block["text"], text)
+                if combined is None:
+                    continue
+                new_tokens = self._block_tokens(combined, block["meta"]) + block["sep"]
+                if used - block["tokens"] + new_tokens <= self.max_tokens:
+                    used += new_tokens - block["tokens"]
+                    block.update(text=combined, tokens=new_tokens)
+                    packed.merged += 1
+                else:
+                    packed.dropped += 1
+                merged = True
+                break
+            if merged:
+                continue
+
+            sep = self._separator_tokens if blocks else 0
+            tokens = self._block_tokens(text, meta) + sep
+            if used + tokens > self.max_tokens:
+                packed.dropped += 1
+                continue  # a later, shorter chunk may still fit
+            blocks.append({"text": text, "meta": meta, "tokens": tokens, "sep": sep})
+            used += tokens
+
+        packed.context = BLOCK_SEPARATOR.join(format_block(b["text"], b["meta"]) for b in blocks)
+        packed.docs = [b["text"] for b in blocks]
+        packed.metadatas = [b["meta"] for b in blocks]
+        packed.tokens = used
+        return packed
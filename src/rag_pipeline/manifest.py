@@ -0,0 +1,103 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_ids(chunk_ids: Iterable[str]) -> str:
+    """Order-independent content hash of a document's chunk set."""
+    h = hashlib.sha1()
+    for cid in sorted(chunk_ids):
+        h.update(cid.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class IndexManifest:
+    """
+    Persistent record of what is already in the vector store.
+    Maps doc_id -> {fingerprint, chunk_ids}. Because chunk IDs are content-derived,
+    a chunk ID present in the manifest means its embedding is already stored.
+
+    Streaming indexing records each written batch with checkpoint(), which appends
+    to a small journal next to the manifest instead of rewriting it. The journal is
+    replayed on load and folded into the manifest by save().
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(self.path.suffix + ".journal")
+        self.documents: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self):
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.documents = data.get("documents", {})
+            except (OSError, ValueError) as e:
+                # A broken manifest only costs a re-embed, never wrong results
+                logger.warning(f"Ignoring unreadable index manifest {self.path}: {e}")
+                self.documents = {}
+        self._replay_journal()
+
+    def _replay_journal(self):
+        if not self.journal_path.exists():
+            return
+        replayed = 0
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash mid-write
+                self._add_chunks(record["doc_id"], record["chunks"])
+                replayed += 1
+        logger.info(f"Replayed {replayed} index checkpoints from {self.journal_path.name}")
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"documents": self.documents}), encoding="utf-8")
+        os.replace(tmp, self.path)  # atomic, so a crash never leaves half a manifest
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+    def _add_chunks(self, doc_id: str, chunk_ids: List[str]):
+        entry = self.documents.setdefault(doc_id, {"fingerprint": None, "chunks": []})
+        # No fingerprint until the document is complete, so it is never skipped as unchanged
+        entry["fingerprint"] = None
+        entry["chunks"] = sorted(set(entry["chunks"]).union(chunk_ids))
+
+    def checkpoint(self, doc_id: str, chunk_ids: List[str]):
+        """Durably records chunks already written to the vector store for a partial document."""
+        self._add_chunks(doc_id, chunk_ids)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"doc_id": doc_id, "chunks": chunk_ids}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def fingerprint(self, doc_id: str) -> Optional[str]:
+        entry = self.documents.get(doc_id)
+        return entry["fingerprint"] if entry else None
+
+    def chunk_ids(self, doc_id: str) -> Set[str]:
+        entry = self.documents.get(doc_id)
+        return set(entry["chunks"]) if entry else set()
+
+    def set_document(self, doc_id: str, chunk_ids: List[str]):
+        self.documents[doc_id] = {
+            "fingerprint": fingerprint_ids(chunk_ids),
+            "chunks": sorted(chunk_ids),
+        }
+
+    def remove_document(self, doc_id: str):
+        self.documents.pop(doc_id, None)
+
+    def clear(self):
+        self.documents = {}
+        self.save()
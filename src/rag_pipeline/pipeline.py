@@ -1,104 +1,902 @@
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple, Union
+import asyncio
+import json
+import threading
 import time
 import logging
 
+import numpy as np
+
 from src.embeddings.embedder import Embedder
-from src.retrieval.retriever import ChromaRetriever
-from src.llm.client import LLMClient
+from src.embeddings.pool import EmbeddingPool
+from src.retrieval.base import BaseRetriever, create_retriever
+from src.llm.async_client import AsyncLLMClient
+from src.llm.client import LLMClient, LLMSettings, error_response
 from src.llm.prompts import SYSTEM_PROMPT, build_user_prompt
+from src.rag_pipeline.answer_cache import AnswerCache
+from src.rag_pipeline.context_builder import ContextBuilder, PackedContext, TokenCounter
+from src.preprocessing.records import ChunkBatch
+from src.rag_pipeline.manifest import IndexManifest, fingerprint_ids
+from src.retrieval.reranker import CrossEncoderReranker
+from src.retrieval.sharded import DEFAULT_CORPUS, CorpusCatalog, validate_corpus_name
+from src.utils.concurrency import MicroBatcher
+from src.utils.tracing import TOKEN_BUCKETS, Trace, tracer
 
 # Configure logging for "transparency" - a key appliedAI value
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("RAGPipeline")
 
+# Per-query lists in a retriever result ("scores" only from HybridRetriever)
+_RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "scores")
+
 @dataclass
 class RAGConfig:
     embedding_model: str
     llm_model: str
     persist_dir: str
     top_k: int = 5
-    llm_temperature: float = 0.0 
+    llm_temperature: float = 0.1  # low temperature for 'Trustworthy AI' faithfulness
+    embedding_cache_dir: Optional[str] = None
+    query_cache_size: int = 256
+    embedding_backend: str = "torch"  # "torch", "onnx" or "int8" (CPU inference paths)
+    embedding_threads: Optional[int] = None  # intra-op threads; None = runtime default
+    embedding_workers: int = 0  # index_chunk_stream: >0 embeds over this many worker processes
+    embedding_micro_batch: int = 32  # concurrent query embeddings merged into one encode call; <=1 disables
+    embedding_batch_wait_ms: float = 0.0  # extra time a micro-batch stays open for late queries
+    retrieval_micro_batch: int = 32  # concurrent retrievals merged into one query per filter; <=1 disables
+    retrieval_batch_wait_ms: float = 0.0
+    index_backend: str = "chroma"  # or "numpy" ("faiss" is accepted as an alias)
+    ann_nlist: int = 0  # numpy backend: >0 enables IVF approximate search
+    ann_nprobe: int = 8
+    vector_compression: Optional[str] = None  # numpy backend: e.g. "int8", "binary", "pca128,int8"
+    compression_rescore: int = 4  # shortlist of rescore * n_results rescored with exact float vectors
+    hybrid_retrieval: bool = False  # BM25 keyword search fused with dense results (RRF)
+    hybrid_fetch_k: int = 20  # candidates taken from each side before fusion
+    corpus: str = DEFAULT_CORPUS  # collection set this pipeline reads and writes
+    corpus_shards: int = 1  # shards of a newly created corpus; existing corpora keep theirs
+    llm_base_url: str = "http://127.0.0.1:1234/v1"
+    llm_api_key: str = "lm-studio"
+    llm_max_tokens: int = 900
+    llm_timeout: float = 120.0
+    llm_max_retries: int = 3
+    llm_max_concurrency: int = 4  # bounded pool: LLM requests in flight across all sessions
+    llm_max_connections: int = 16
+    answer_cache_size: int = 256  # 0 disables the answer cache
+    answer_cache_ttl_s: float = 3600.0
+    answer_cache_similarity: float = 0.95  # >1 disables near-duplicate hits
+    rerank_model: Optional[str] = None  # e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"; None disables
+    rerank_backend: str = "torch"  # "torch", "onnx" or "int8"
+    rerank_fetch_k: int = 20  # candidates fetched from the retriever before reranking to top_k
+    rerank_batch_size: int = 16
+    rerank_budget_ms: float = 250.0  # per query; unscored candidates keep vector order
+    max_context_tokens: int = 2048  # budget for the retrieved context blocks
+    context_tokenizer: Optional[str] = None  # HF tokenizer of the generation model; None estimates
+    tracing: bool = True  # per-stage trace in this pipeline's results/exports; RAG_TRACING=0 disables all instrumentation
+    trace_jsonl_path: Optional[str] = None  # append every finished trace here as JSON lines
+
+    def llm_settings(self) -> LLMSettings:
+        return LLMSettings(
+            model=self.llm_model,
+            base_url=self.llm_base_url,
+            api_key=self.llm_api_key,
+            temperature=self.llm_temperature,
+            max_tokens=self.llm_max_tokens,
+            timeout=self.llm_timeout,
+            max_retries=self.llm_max_retries,
+            max_concurrency=self.llm_max_concurrency,
+            max_connections=self.llm_max_connections,
+        )
+
+class _LazyComponent:
+    """
+    Pipeline attribute built by its _build_<name>() method on first access.
+    Construction is serialized by the pipeline's lock, so a warm-up thread and a
+    request thread never build it twice; assignment replaces it.
+    """
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if self.name not in obj.__dict__:
+            with obj._build_lock:
+                if self.name not in obj.__dict__:
+                    t0 = time.time()
+                    obj.__dict__[self.name] = getattr(obj, f"_build_{self.name}")()
+                    logger.info(f"Initialized {self.name} in {int((time.time() - t0) * 1000)}ms")
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
 
 class RAGPipeline:
-    def __init__(self, cfg: RAGConfig):
-        self.embedder = Embedder(cfg.embedding_model)
-        self.retriever = ChromaRetriever(persist_dir=cfg.persist_dir)
-        self.llm = LLMClient(cfg.llm_model)
+    """
+    Construction is cheap: the vector store, the reranker and every model are
+    loaded on first use, or ahead of time by warmup() (optionally in a background
+    thread while a UI renders).
+
+    One instance is shared by all sessions: concurrent question embeddings are
+    micro-batched, retrievers take a read/write lock (queries run in parallel and
+    wait only for the in-memory part of an upsert), index writers are serialized,
+    and LLM calls go through a bounded pool of max_concurrency slots.
+
+    Each pipeline reads and writes one corpus (RAGConfig.corpus); for_corpus() returns
+    a pipeline for another corpus that shares the models and the LLM pool.
+    """
+    retriever = _LazyComponent()
+    reranker = _LazyComponent()
+
+    def __init__(self, cfg: RAGConfig, shared_from: Optional["RAGPipeline"] = None):
+        self.cfg = cfg
+        validate_corpus_name(cfg.corpus)
+        self._shared_from = shared_from
+        self._corpora: Dict[str, "RAGPipeline"] = {}
+        self._build_lock = threading.RLock()
+        # Serializes index writers (UI uploads, ingestion jobs, clear); queries never take it
+        self._index_lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        if shared_from is not None:
+            # Sibling corpus: same models, query micro-batcher and LLM pool
+            self.catalog = shared_from.catalog
+            self.embedder = shared_from.embedder
+            self.query_batcher = shared_from.query_batcher
+            self.llm = shared_from.llm
+            self.async_llm = shared_from.async_llm
+        else:
+            # The tracer is process-wide: a second pipeline with tracing off must not switch it
+            # off for the first, so cfg.tracing only gates this pipeline's traces
+            if cfg.tracing and cfg.trace_jsonl_path:
+                tracer.add_jsonl_exporter(cfg.trace_jsonl_path)
+            self.catalog = CorpusCatalog(cfg.persist_dir)
+            self.embedder = Embedder(
+                cfg.embedding_model,
+                cache_dir=cfg.embedding_cache_dir,
+                query_cache_size=cfg.query_cache_size,
+                backend=cfg.embedding_backend,
+                num_threads=cfg.embedding_threads,
+            )
+            # Sessions embedding questions at the same time share one forward pass
+            self.query_batcher = MicroBatcher(
+                lambda questions: self.embedder.embed_queries(questions),
+                max_batch_size=cfg.embedding_micro_batch,
+                max_wait_ms=cfg.embedding_batch_wait_ms,
+                name="embed_query",
+            ) if cfg.embedding_micro_batch > 1 else None
+            self.llm = LLMClient(settings=cfg.llm_settings())
+            self.async_llm = AsyncLLMClient(cfg.llm_settings(), slots=self.llm.slots)
+        self.tracing = cfg.tracing
+        self.embedding_workers = cfg.embedding_workers
+        # Concurrent retrievals against this corpus share one multi-query retriever call
+        self.retrieve_batcher = MicroBatcher(
+            self._retrieve_batch,
+            max_batch_size=cfg.retrieval_micro_batch,
+            max_wait_ms=cfg.retrieval_batch_wait_ms,
+            name=f"retrieve:{cfg.corpus}",
+        ) if cfg.retrieval_micro_batch > 1 else None
+        # Each corpus has its own manifest; the default corpus keeps the original file name
+        manifest_name = "index_manifest.json" if cfg.corpus == DEFAULT_CORPUS else f"index_manifest.{cfg.corpus}.json"
+        self.manifest = IndexManifest(Path(cfg.persist_dir) / manifest_name)
         self.top_k = cfg.top_k
+        # Over-fetch only when a reranker narrows the candidates down again
+        self.fetch_k = max(cfg.rerank_fetch_k, cfg.top_k) if cfg.rerank_model else cfg.top_k
+        self.context_builder = ContextBuilder(
+            TokenCounter(cfg.context_tokenizer), max_tokens=cfg.max_context_tokens
+        )
         self.temperature = cfg.llm_temperature
+        self.llm_max_concurrency = cfg.llm_max_concurrency
+
+        # Bumped on every index change; cached answers are only valid for one version
+        self.index_version = 0
+        self.answer_cache = AnswerCache(
+            max_entries=cfg.answer_cache_size,
+            ttl_s=cfg.answer_cache_ttl_s,
+            similarity_threshold=cfg.answer_cache_similarity,
+        ) if cfg.answer_cache_size > 0 else None
+
+    def _build_retriever(self) -> BaseRetriever:
+        cfg = self.cfg
+        corpus = self.catalog.ensure(cfg.corpus, cfg.corpus_shards)
+        return create_retriever(
+            cfg.index_backend,
+            cfg.persist_dir,
+            collection_name=cfg.corpus,
+            nlist=cfg.ann_nlist,
+            nprobe=cfg.ann_nprobe,
+            hybrid=cfg.hybrid_retrieval,
+            hybrid_fetch_k=cfg.hybrid_fetch_k,
+            shards=corpus["shards"],
+            compression=cfg.vector_compression,
+            rescore_factor=cfg.compression_rescore,
+        )
+
+    def _build_reranker(self) -> Optional[CrossEncoderReranker]:
+        cfg = self.cfg
+        if self._shared_from is not None:
+            return self._shared_from.reranker
+        if not cfg.rerank_model:
+            return None
+        return CrossEncoderReranker(
+            cfg.rerank_model,
+            backend=cfg.rerank_backend,
+            batch_size=cfg.rerank_batch_size,
+            time_budget_ms=cfg.rerank_budget_ms,
+        )
+
+    def warmup(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Loads the vector store, embedding model, reranker, context tokenizer and
+        LLM client ahead of the first request. With background=True this runs in a
+        daemon thread (returned) so callers such as the Streamlit app can render first.
+        """
+        def _warm():
+            t0 = time.time()
+            try:
+                self.retriever
+                self.embedder.embed_queries(["warmup"])  # loads the model and runs one forward pass
+                self.reranker
+                self.context_builder.counter.count("warmup")
+                self.llm.client
+                logger.info(f"Pipeline warm-up finished in {int((time.time() - t0) * 1000)}ms")
+            except Exception as e:
+                # Warm-up is best effort; the first real request reports the error
+                logger.warning(f"Pipeline warm-up failed: {e}")
+
+        if not background:
+            _warm()
+            return None
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=_warm, name="rag-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
 
-    def index_chunks(self, chunks: List[Dict[str, Any]]):
+    def for_corpus(self, corpus: str, shards: Optional[int] = None) -> "RAGPipeline":
+        """
+        Pipeline for another corpus (created on first use with `shards` shards,
+        default RAGConfig.corpus_shards). Siblings are cached, share this pipeline's
+        models, micro-batcher and LLM pool, and have their own collections, manifest,
+        answer cache and index lock, so one corpus can be rebuilt or cleared while the
+        others keep serving.
+        """
+        root = self._shared_from or self
+        if corpus == root.cfg.corpus:
+            return root
+        with root._build_lock:
+            sibling = root._corpora.get(corpus)
+            if sibling is None:
+                cfg = replace(root.cfg, corpus=corpus, corpus_shards=shards or root.cfg.corpus_shards)
+                sibling = root._corpora[corpus] = RAGPipeline(cfg, shared_from=root)
+        return sibling
+
+    def corpora(self) -> List[str]:
+        """Corpora registered in the persist_dir, including this pipeline's."""
+        return sorted(set(self.catalog.names()) | {self.cfg.corpus})
+
+    @staticmethod
+    def metrics_text() -> str:
+        """Aggregated stage latency, token and cache histograms in Prometheus text format."""
+        return tracer.prometheus_text()
+
+    @property
+    def is_warm(self) -> bool:
+        """True once a background warm-up has finished (or none was started)."""
+        return self._warmup_thread is None or not self._warmup_thread.is_alive()
+
+    def index_chunks(self, chunks: Union[ChunkBatch, List[Dict[str, Any]]]) -> Dict[str, int]:
         """
         Processes and stores document chunks.
         Improved to capture full metadata for better 'trustworthy AI' citations.
+        Incremental: only chunks missing from the manifest are embedded and upserted,
+        and chunks that disappeared from a re-ingested document are deleted.
+        All chunks of a document must be passed in the same call.
+        Accepts a ChunkBatch (RecursiveChunker.chunk_batch) or chunk_text dicts.
         """
-        ids = [str(c["chunk_id"]) for c in chunks]
-        texts = [c["text"] for c in chunks]
-        
-        # Capture rich metadata (page numbers, titles) to avoid "reverse-engineered" feel
-        metadatas = [
-            {
-                "doc_id": c.get("doc_id"), 
-                "page": c.get("page_number", 0),
-                "source": c.get("file_name", "Unknown")
-            } for c in chunks
-        ]
-
-
-        logger.info(f"Indexing {len(texts)} chunks into vector store...")
-        embeddings = self.embedder.embed_texts(texts).tolist()
-        self.retriever.add_documents(ids, texts, metadatas, embeddings=embeddings)
-
-    def _format_context(self, docs: List[str], metadatas: List[Dict]) -> str:
-        """Helper to create traceable context blocks."""
-        context_blocks = []
-        for text, meta in zip(docs, metadatas):
-            source_info = f"[Source: {meta.get('source')}, Page: {meta.get('page')}]"
-            context_blocks.append(f"{source_info}\n{text}")
-        return "\n\n---\n\n".join(context_blocks)
+        if not isinstance(chunks, ChunkBatch):
+            chunks = ChunkBatch.from_dicts(chunks)
+        with self._index_lock, tracer.trace("index_chunks", enabled=self.tracing) as trace:
+            stats = self._index_chunks(chunks)
+        if trace is not None:
+            stats["trace"] = trace.to_list()
+        return stats
 
-    def answer(self, question: str, filter_dict: Optional[Dict] = None) -> Dict[str, Any]:
+    def _index_chunks(self, chunks: ChunkBatch) -> Dict[str, int]:
+        by_doc = list(chunks.group_by_doc())
+
+        new_parts = []
+        stale_ids = []
+        with tracer.span("plan", documents=len(by_doc), chunks=len(chunks)):
+            for doc_id, doc_chunks in by_doc:
+                doc_new, doc_stale = self._plan_document(doc_id, doc_chunks)
+                new_parts.append(doc_new)
+                stale_ids.extend(doc_stale)
+        new_chunks = ChunkBatch.concat(new_parts)
+
+        skipped = len(chunks) - len(new_chunks)
+        if new_chunks:
+            texts = new_chunks.texts()
+
+            logger.info(f"Indexing {len(texts)} chunks into vector store ({skipped} unchanged)...")
+            with tracer.span("embed", texts=len(texts)):
+                embeddings = self.embedder.embed_texts(texts)
+            with tracer.span("upsert", chunks=len(new_chunks)):
+                self.retriever.add_documents(
+                    new_chunks.chunk_ids, texts, new_chunks.metadatas(), embeddings=embeddings
+                )
+            del texts
+            logger.info(f"Embedding cache stats: {self.embedder.cache_stats()}")
+        else:
+            logger.info(f"All {len(chunks)} chunks already indexed; skipping embedding.")
+
+        if stale_ids:
+            logger.info(f"Deleting {len(stale_ids)} stale chunks from vector store.")
+            with tracer.span("delete", chunks=len(stale_ids)):
+                self.retriever.delete(stale_ids)
+
+        with tracer.span("save_manifest"):
+            for doc_id, doc_chunks in by_doc:
+                self.manifest.set_document(doc_id, doc_chunks.chunk_ids)
+            self.manifest.save()
+        if new_chunks or stale_ids:
+            self._bump_index_version()
+
+        return {"embedded": len(new_chunks), "skipped": skipped, "deleted": len(stale_ids)}
+
+    def index_chunk_stream(
+        self,
+        chunks: Iterable[Union[ChunkBatch, Dict[str, Any]]],
+        upsert_batch_size: int = 256,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
         """
-        Generates an answer with performance tracking and source verification.
+        Bulk variant of index_chunks for corpora that do not fit in memory.
+
+        chunks is an iterable of ChunkBatch (e.g. one per PDF from iter_pdf_batches_from_dir
+        + RecursiveChunker.chunk_batch) or of chunk dicts. It is consumed lazily and must
+        arrive grouped by document. New chunks are embedded in batches of
+        upsert_batch_size - over an EmbeddingPool of worker processes when workers > 0
+        (default RAGConfig.embedding_workers), in-process otherwise - and upserted as
+        results arrive, in order. Each written batch is checkpointed in the manifest
+        journal, so after a crash a rerun skips every chunk already stored. Stale chunks
+        of a re-ingested document are deleted once all its new chunks are written.
+        progress, if given, is called with the running stats after every written batch.
         """
+        with self._index_lock:
+            return self._index_chunk_stream(chunks, upsert_batch_size, workers, progress)
+
+    def _index_chunk_stream(
+        self,
+        chunks: Iterable[Union[ChunkBatch, Dict[str, Any]]],
+        upsert_batch_size: int,
+        workers: Optional[int],
+        progress: Optional[Callable[[Dict[str, int]], None]],
+    ) -> Dict[str, int]:
+        stats = {"embedded": 0, "skipped": 0, "deleted": 0, "batches": 0}
+        # doc_id -> {"ids": all chunk IDs, "remaining": new chunks not yet written, "stale": IDs}
+        open_docs: Dict[str, Dict[str, Any]] = {}
+
+        def _finish(doc_id: str):
+            doc = open_docs.pop(doc_id)
+            if doc["stale"]:
+                with tracer.span("delete", chunks=len(doc["stale"])):
+                    self.retriever.delete(doc["stale"])
+                stats["deleted"] += len(doc["stale"])
+            self.manifest.set_document(doc_id, doc["ids"])
+
+        def _documents() -> Iterator[Tuple[str, ChunkBatch]]:
+            pending: List[Dict[str, Any]] = []
+            for item in chunks:
+                if isinstance(item, ChunkBatch):
+                    if pending:
+                        yield from ChunkBatch.from_dicts(pending).group_by_doc()
+                        pending = []
+                    yield from item.group_by_doc()
+                elif pending and str(item.get("doc_id")) != str(pending[-1].get("doc_id")):
+                    yield from ChunkBatch.from_dicts(pending).group_by_doc()
+                    pending = [item]
+                else:
+                    pending.append(item)
+            if pending:
+                yield from ChunkBatch.from_dicts(pending).group_by_doc()
+
+        def _batches() -> Iterator[Tuple[ChunkBatch, List[str]]]:
+            parts: List[ChunkBatch] = []
+            size = 0
+            for doc_id, doc_chunks in _documents():
+                if doc_id in open_docs:
+                    raise ValueError(f"Chunks of document {doc_id} are not contiguous in the stream")
+                doc_new, doc_stale = self._plan_document(doc_id, doc_chunks)
+                stats["skipped"] += len(doc_chunks) - len(doc_new)
+                open_docs[doc_id] = {
+                    "ids": doc_chunks.chunk_ids,
+                    "remaining": len(doc_new),
+                    "stale": list(doc_stale),
+                }
+                if not doc_new:
+                    _finish(doc_id)
+                    continue
+                parts.append(doc_new)
+                size += len(doc_new)
+                if size >= upsert_batch_size:
+                    pending = ChunkBatch.concat(parts)
+                    full = len(pending) - len(pending) % upsert_batch_size
+                    for batch in pending.take(range(full)).split(upsert_batch_size):
+                        yield batch, batch.texts()
+                    parts = [pending.take(range(full, len(pending)))] if full < len(pending) else []
+                    size = len(pending) - full
+            if parts:
+                batch = ChunkBatch.concat(parts)
+                yield batch, batch.texts()
+
+        def _write(batch: ChunkBatch, embeddings: np.ndarray):
+            with tracer.span("upsert", chunks=len(batch)):
+                self.retriever.add_documents(
+                    batch.chunk_ids, batch.texts(), batch.metadatas(), embeddings=embeddings,
+                )
+            written: Dict[str, List[str]] = {}
+            for doc_id, chunk_id in zip(batch.doc_ids(), batch.chunk_ids):
+                written.setdefault(doc_id, []).append(chunk_id)
+            for doc_id, doc_ids in written.items():
+                self.manifest.checkpoint(doc_id, doc_ids)
+                open_docs[doc_id]["remaining"] -= len(doc_ids)
+                if open_docs[doc_id]["remaining"] == 0:
+                    _finish(doc_id)
+            stats["embedded"] += len(batch)
+            stats["batches"] += 1
+            if stats["batches"] % 10 == 0:
+                logger.info(f"Streaming index: {stats['embedded']} chunks embedded in {stats['batches']} batches")
+            if progress is not None:
+                progress(dict(stats))
+
+        workers = self.embedding_workers if workers is None else workers
         start_time = time.time()
+        try:
+            if workers > 0:
+                with EmbeddingPool(
+                    self.embedder.model_name,
+                    workers=workers,
+                    backend=self.embedder.backend,
+                    cache=self.embedder.disk_cache(),
+                ) as pool:
+                    for batch, embeddings in pool.imap(_batches()):
+                        _write(batch, embeddings)
+            else:
+                for batch, texts in _batches():
+                    with tracer.span("embed", texts=len(texts)):
+                        embeddings = self.embedder.embed_texts(texts)
+                    _write(batch, embeddings)
+        finally:
+            self.manifest.save()
+            if stats["embedded"] or stats["deleted"]:
+                self._bump_index_version()
 
-        # 1. Retrieval
-        q_emb = self.embedder.embed_texts([question]).tolist()
-        query_result = self.retriever.query(
-            q_emb, 
-            n_results=self.top_k, 
-            filter_dict=filter_dict
+        logger.info(
+            f"Streaming index finished in {time.time() - start_time:.1f}s: {stats['embedded']} embedded, "
+            f"{stats['skipped']} unchanged, {stats['deleted']} deleted ({stats['batches']} batches)."
         )
-        
-        docs = query_result["documents"][0]
-        metadatas = query_result["metadatas"][0]
-        
-        # 2. Context Preparation
-        context = self._format_context(docs, metadatas)
-
-        # 3. Generation
-        user_prompt = build_user_prompt(question, context)
-        
+        return stats
+
+    def _plan_document(self, doc_id: str, doc_chunks: ChunkBatch) -> Tuple[ChunkBatch, List[str]]:
+        """Chunks of one document that still need embedding, and stored IDs it no longer has."""
+        doc_ids = doc_chunks.chunk_ids
+        known = self.manifest.chunk_ids(doc_id)
+        if known and self.manifest.fingerprint(doc_id) == fingerprint_ids(doc_ids):
+            return doc_chunks.take([]), []  # unchanged document: nothing to embed
+        new_chunks = doc_chunks.take([i for i, cid in enumerate(doc_ids) if cid not in known])
+        return new_chunks, sorted(known - set(doc_ids))
+
+    def clear_index(self):
+        """
+        Wipes this corpus's collections and manifest together so they never disagree.
+        Other corpora in the same persist_dir are untouched.
+        """
+        with self._index_lock:
+            self.retriever.reset()
+            self.manifest.clear()
+            self._bump_index_version()
+
+    def _bump_index_version(self):
+        self.index_version += 1
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
+
+    def _embed_query(self, question: str) -> np.ndarray:
+        """(1, dim) question embedding, micro-batched with concurrent callers when enabled."""
+        if self.query_batcher is None:
+            return self.embedder.embed_queries([question])
+        return self.query_batcher.submit(question)[None, :]
+
+    def _retrieve(self, question: str, q_emb: np.ndarray, filter_dict: Optional[Dict]) -> Dict:
+        """fetch_k hits for one question, micro-batched with concurrent callers when enabled."""
+        if self.retrieve_batcher is None:
+            return self.retriever.query(
+                q_emb, n_results=self.fetch_k, filter_dict=filter_dict, query_text=question
+            )
+        return self.retrieve_batcher.submit((question, q_emb[0], filter_dict))
+
+    def _retrieve_batch(self, items: List[Tuple[str, np.ndarray, Optional[Dict]]]) -> List[Any]:
+        """
+        One retriever query per distinct filter; each item gets a single-query result.
+        A group whose query fails gets the exception instead, so a bad filter only
+        fails its own callers (MicroBatcher raises it in their submit()).
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, (_, _, filter_dict) in enumerate(items):
+            groups.setdefault(json.dumps(filter_dict, sort_keys=True, default=str), []).append(i)
+        results: List[Any] = [None] * len(items)
+        for idxs in groups.values():
+            try:
+                query_result = self.retriever.query(
+                    np.stack([items[i][1] for i in idxs]),
+                    n_results=self.fetch_k,
+                    filter_dict=items[idxs[0]][2],
+                    query_text=[items[i][0] for i in idxs],
+                )
+            except Exception as e:
+                for i in idxs:
+                    results[i] = e
+                continue
+            for pos, i in enumerate(idxs):
+                results[i] = {key: [query_result[key][pos]] for key in _RESULT_KEYS if query_result.get(key) is not None}
+        return results
+
+    def _cached_answer(
+        self,
+        question: str,
+        filter_dict: Optional[Dict],
+        q_emb: Optional[np.ndarray] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Exact lookup without an embedding, near-duplicate lookup with one."""
+        if self.answer_cache is None:
+            return None
+        if q_emb is None:
+            result = self.answer_cache.get_exact(question, filter_dict, self.index_version)
+            hit, similarity = "exact", 1.0
+        else:
+            found = self.answer_cache.get_similar(q_emb, filter_dict, self.index_version)
+            result, similarity = found if found else (None, 0.0)
+            hit = "semantic"
+        if result is None:
+            return None
+        tracer.inc("answer_cache_requests_total", result=hit)
+        result.update({"cached": True, "cache_hit": hit, "cache_similarity": round(similarity, 4)})
+        return result
+
+    def _remember(self, question: str, filter_dict: Optional[Dict], q_emb: np.ndarray, result: Dict[str, Any]):
+        # Errors are transient; never serve them from cache
+        if self.answer_cache is not None and result.get("status") == "success":
+            self.answer_cache.put(question, filter_dict, self.index_version, q_emb, result)
+
+    def _select(self, question: str, query_result: Dict, pos: int = 0) -> PackedContext:
+        """Reranks the over-fetched hits of one query (if enabled) and packs the best top_k."""
+        docs = query_result["documents"][pos]
+        metadatas = query_result["metadatas"][pos]
+        if self.reranker is not None and docs:
+            with tracer.span("rerank", candidates=len(docs)) as span:
+                ranked = self.reranker.rerank(question, docs, self.top_k, keys=query_result["ids"][pos])
+                span.set(scored=ranked.scored, cached=ranked.cached, timed_out=ranked.timed_out)
+            logger.info(
+                f"Reranked {len(docs)} candidates in {ranked.elapsed_ms:.0f}ms "
+                f"({ranked.scored} scored, {ranked.cached} cached, timed out: {ranked.timed_out})."
+            )
+            docs = [docs[i] for i in ranked.order]
+            metadatas = [metadatas[i] for i in ranked.order]
+        return self._pack_context(docs, metadatas)
+
+    def _pack_context(self, docs: List[str], metadatas: List[Dict]) -> PackedContext:
+        """Packs ranked chunks into the token budget as traceable context blocks."""
+        with tracer.span("pack_context", candidates=len(docs)) as span:
+            packed = self.context_builder.build(docs, metadatas)
+            span.set(tokens=packed.tokens, blocks=len(packed.docs), dropped=packed.dropped)
+        tracer.observe("context_tokens", packed.tokens, TOKEN_BUCKETS)
         # Demonstrates analytical habit: logging the prompt size/latency
-        logger.info(f"Generating answer for query. Context length: {len(context)} chars.")
-        
-        response = self.llm.chat(
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": user_prompt}],
-            # temperature=self.temperature # If your LLMClient supports it
+        logger.info(
+            f"Context: {packed.tokens}/{self.context_builder.max_tokens} tokens from {len(packed.docs)} blocks "
+            f"({packed.merged} merged, {packed.deduplicated} duplicates, {packed.dropped} over budget)."
         )
+        return packed
+
+    def _prepare(
+        self, question: str, filter_dict: Optional[Dict]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray], Optional[PackedContext]]:
+        """
+        Everything before generation: answer cache (exact, then near-duplicate),
+        question embedding, retrieval, optional rerank and context packing.
+        Returns (cached result, None, None) on a cache hit, else (None, q_emb, packed).
+        """
+        # 0. Answer cache: exact match first, then near-duplicate on the question embedding
+        with tracer.span("answer_cache", kind="exact"):
+            cached = self._cached_answer(question, filter_dict)
+        if cached is not None:
+            return cached, None, None
+        with tracer.span("embed_query"):
+            q_emb = self._embed_query(question)
+        with tracer.span("answer_cache", kind="semantic"):
+            cached = self._cached_answer(question, filter_dict, q_emb[0])
+        if cached is not None:
+            return cached, None, None
+        if self.answer_cache is not None:
+            tracer.inc("answer_cache_requests_total", result="miss")
+
+        # 1. Retrieval
+        with tracer.span("retrieve", n_results=self.fetch_k) as span:
+            query_result = self._retrieve(question, q_emb, filter_dict)
+            span.set(hits=len(query_result["ids"][0]))
+
+        # 2. Context Preparation (optional rerank of the over-fetched candidates)
+        return None, q_emb, self._select(question, query_result)
+
+    def retrieve(self, question: str, filter_dict: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Retrieval only: the reranked, packed context answer() would send to the LLM,
+        with the same source_docs/citations keys, but no generation and no answer cache.
+        """
+        start_time = time.time()
+        trace = tracer.start_trace("retrieve", enabled=self.tracing)
+        with tracer.activate(trace):
+            with tracer.span("embed_query"):
+                q_emb = self._embed_query(question)
+            with tracer.span("retrieve", n_results=self.fetch_k) as span:
+                query_result = self._retrieve(question, q_emb, filter_dict)
+                span.set(hits=len(query_result["ids"][0]))
+            packed = self._select(question, query_result)
+
+        result = {
+            "source_docs": packed.docs,
+            "citations": packed.metadatas,
+            "retrieval_count": len(packed.docs),
+            "context_tokens": packed.tokens,
+            "latency_ms": int((time.time() - start_time) * 1000),
+        }
+        if trace is not None:
+            result["trace"] = trace.to_list()
+            tracer.finish_trace(trace)
+        return result
+
+    def _finish_trace(self, trace: Optional[Trace], result: Dict[str, Any]):
+        """Attaches the collected spans to the result and feeds the latency/token histograms."""
+        tracer.observe("answer_latency_ms", result["latency_ms"], cached=str(bool(result.get("cached"))).lower())
+        usage = result.get("usage") or {}
+        for key in ("prompt_tokens", "completion_tokens"):
+            if usage.get(key) is not None:
+                tracer.observe(key, usage[key], TOKEN_BUCKETS)
+        if trace is None:
+            result.pop("trace", None)  # cache entries may carry the trace of the original answer
+            return
+        result["trace"] = trace.to_list()
+        tracer.finish_trace(trace)
+
+    def answer(self, question: str, filter_dict: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Generates an answer with performance tracking and source verification.
+        With tracing enabled, result["trace"] lists the timed stages (see src/utils/tracing.py).
+        """
+        start_time = time.time()
+        trace = tracer.start_trace("answer", enabled=self.tracing)
+
+        with tracer.activate(trace):
+            cached, q_emb, packed = self._prepare(question, filter_dict)
+            if cached is not None:
+                cached["latency_ms"] = int((time.time() - start_time) * 1000)
+                logger.info(f"Answer served from cache ({cached['cache_hit']}).")
+                self._finish_trace(trace, cached)
+                return cached
+
+            # 3. Generation
+            with tracer.span("generate") as span:
+                response = self._generate(question, packed)
+                span.set(status=response.get("status"), **(response.get("usage") or {}))
+
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        result = self._build_result(response, packed, latency_ms)
+        self._finish_trace(trace, result)
+        self._remember(question, filter_dict, q_emb[0], result)
+        return result
+
+    def answer_stream(self, question: str, filter_dict: Optional[Dict] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of answer(). Yields events in order:
+            {"type": "retrieval", "source_docs", "citations", "retrieval_count", "retrieval_ms"}
+            {"type": "token", "delta"}  (repeated)
+            {"type": "done", ...same keys as answer()..., "ttft_ms"}
+        ttft_ms is measured from the start of the call to the first answer token.
+        The trace is only active between yields, so spans never leak into the consumer.
+        """
+        start_time = time.time()
+        trace = tracer.start_trace("answer_stream", enabled=self.tracing)
+
+        with tracer.activate(trace):
+            cached, q_emb, packed = self._prepare(question, filter_dict)
+        if cached is not None:
+            latency_ms = int((time.time() - start_time) * 1000)
+            yield {
+                "type": "retrieval",
+                "source_docs": cached["source_docs"],
+                "citations": cached["citations"],
+                "retrieval_count": cached["retrieval_count"],
+                "retrieval_ms": latency_ms,
+            }
+            yield {"type": "token", "delta": cached["answer"]}
+            cached.update({"latency_ms": latency_ms, "ttft_ms": latency_ms})
+            self._finish_trace(trace, cached)
+            yield {"type": "done", **cached}
+            return
+
+        yield {
+            "type": "retrieval",
+            "source_docs": packed.docs,
+            "citations": packed.metadatas,
+            "retrieval_count": len(packed.docs),
+            "retrieval_ms": int((time.time() - start_time) * 1000),
+        }
+
+        parts: List[str] = []
+        ttft_ms = None
+        response = {"status": "success"}
+        generate_start = time.perf_counter()
+        try:
+            for delta in self.llm.chat_stream(
+                system=SYSTEM_PROMPT,
+                messages=[{"role": "user", "content": self._build_prompt(question, packed)}],
+            ):
+                if ttft_ms is None:
+                    ttft_ms = int((time.time() - start_time) * 1000)
+                parts.append(delta)
+                yield {"type": "token", "delta": delta}
+            response["answer"] = "".join(parts)
+        except Exception as e:
+            response = error_response(self.llm.api_base, e)
+            if parts:
+                response["answer"] = "".join(parts) + "\n\n" + response["answer"]
 
         latency_ms = int((time.time() - start_time) * 1000)
+        result = self._build_result(response, packed, latency_ms)
+        result["ttft_ms"] = ttft_ms if ttft_ms is not None else latency_ms
+        if trace is not None:
+            # Generation spans yields, so it is recorded after the fact; deltas approximate tokens
+            with tracer.activate(trace):
+                tracer.record_span(
+                    "generate", generate_start, status=response.get("status"), streamed_chunks=len(parts)
+                )
+        tracer.observe("ttft_ms", result["ttft_ms"])
+        self._finish_trace(trace, result)
+        logger.info(f"Streamed answer: TTFT {result['ttft_ms']}ms, total {latency_ms}ms.")
+        self._remember(question, filter_dict, q_emb[0], result)
+        yield {"type": "done", **result}
+
+    def answer_many(
+        self,
+        questions: List[str],
+        filters: Optional[Union[Dict, List[Optional[Dict]]]] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Answers a batch of questions: one embedding call for all of them, one
+        multi-embedding retriever query per distinct filter, and concurrent LLM calls
+        bounded by max_concurrency. Results keep input order and carry a per-question
+        "timings" breakdown (embed/retrieval are shared batch costs).
+
+        Args:
+            questions: Questions to answer.
+            filters: One filter dict for every question, or one entry per question.
+            max_concurrency: Parallel LLM requests (defaults to RAGConfig.llm_max_concurrency).
+        """
+        async def _run_batch():
+            try:
+                return await self.aanswer_many(questions, filters, max_concurrency)
+            finally:
+                # The connection pool belongs to this short-lived loop
+                await self.async_llm.aclose()
+
+        return asyncio.run(_run_batch())
+
+    async def aanswer_many(
+        self,
+        questions: List[str],
+        filters: Optional[Union[Dict, List[Optional[Dict]]]] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Coroutine version of answer_many for callers that already run an event loop."""
+        if not questions:
+            return []
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(questions)
+        if len(filters) != len(questions):
+            raise ValueError("filters must be a dict or have one entry per question")
+
+        start_time = time.time()
+        # One trace per question; shared batch stages are collected once and copied into each
+        traces = [tracer.start_trace("answer_many", enabled=self.tracing) for _ in questions]
+        batch_trace = tracer.start_trace("answer_many_batch", enabled=self.tracing)
+
+        # 1. One embedding batch for every question
+        with tracer.activate(batch_trace), tracer.span("embed_query", questions=len(questions)):
+            q_embs = self.embedder.embed_queries(questions)
+        embed_ms = (time.time() - start_time) * 1000
+
+        # 2. One retriever call per distinct filter
+        groups: Dict[str, List[int]] = {}
+        for i, f in enumerate(filters):
+            groups.setdefault(json.dumps(f, sort_keys=True), []).append(i)
+
+        retrieved: Dict[int, PackedContext] = {}
+        retrieval_ms: Dict[int, float] = {}
+        for key, idxs in groups.items():
+            t0 = time.time()
+            with tracer.activate(batch_trace), tracer.span("retrieve", queries=len(idxs), n_results=self.fetch_k):
+                query_result = self.retriever.query(
+                    q_embs[idxs],
+                    n_results=self.fetch_k,
+                    filter_dict=filters[idxs[0]],
+                    query_text=[questions[i] for i in idxs],
+                )
+            elapsed = (time.time() - t0) * 1000
+            for pos, i in enumerate(idxs):
+                t1 = time.time()
+                with tracer.activate(traces[i]):
+                    retrieved[i] = self._select(questions[i], query_result, pos)
+                retrieval_ms[i] = elapsed + (time.time() - t1) * 1000
+        if batch_trace is not None:
+            for trace in traces:
+                trace.spans.extend(batch_trace.spans)
+
+        # 3. Concurrent generation; the client pools connections and coalesces duplicates
+        workers = max(1, max_concurrency or self.llm_max_concurrency)
+        semaphore = asyncio.Semaphore(workers)
+
+        async def _run(i: int) -> Dict[str, Any]:
+            packed = retrieved[i]
+            async with semaphore:
+                t0 = time.time()
+                with tracer.activate(traces[i]), tracer.span("generate") as span:
+                    response = await self.async_llm.chat(
+                        system=SYSTEM_PROMPT,
+                        messages=[{"role": "user", "content": self._build_prompt(questions[i], packed)}],
+                    )
+                    span.set(status=response.get("status"), **(response.get("usage") or {}))
+                llm_ms = (time.time() - t0) * 1000
+            result = self._build_result(response, packed, int((time.time() - start_time) * 1000))
+            result["timings"] = {
+                "embed_ms": round(embed_ms, 2),
+                "retrieval_ms": round(retrieval_ms[i], 2),
+                "llm_ms": round(llm_ms, 2),
+            }
+            self._finish_trace(traces[i], result)
+            return result
+
+        results = await asyncio.gather(*(_run(i) for i in range(len(questions))))
+
+        logger.info(
+            f"Answered {len(questions)} questions in {int((time.time() - start_time) * 1000)}ms "
+            f"({len(groups)} retrieval batches, concurrency {workers})."
+        )
+        return list(results)
+
+    def _build_prompt(self, question: str, packed: PackedContext) -> str:
+        """Wraps the packed, traceable context into the user prompt."""
+        return build_user_prompt(question, packed.context)
+
+    def _generate(self, question: str, packed: PackedContext) -> Dict:
+        """Calls the LLM with the traceable context for one question."""
+        return self.llm.chat(
+            system=SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": self._build_prompt(question, packed)}],
+        )
 
-        # In pipeline.py
+    @staticmethod
+    def _build_result(response: Dict, packed: PackedContext, latency_ms: int) -> Dict[str, Any]:
         return {
-        "answer": response.get("answer", "No answer generated."),
-        "status": response.get("status", "unknown"),
-        "source_docs": docs,
-        "citations": metadatas,
-        "latency_ms": latency_ms,
-        "retrieval_count": len(docs),
-    }
-    
\ No newline at end of file
+            "answer": response.get("answer", "No answer generated."),
+            "status": response.get("status", "unknown"),
+            "source_docs": packed.docs,
+            "citations": packed.metadatas,
+            "latency_ms": latency_ms,
+            "retrieval_count": len(packed.docs),
+            "context_tokens": packed.tokens,
+            "usage": response.get("usage"),
+            "cached": False,
+        }
@@ -0,0 +1,133 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# float32 (n, dim) arrays are passed through without conversion; lists still work
+Embeddings = Union[np.ndarray, List[List[float]]]
+
+
+class BaseRetriever(ABC):
+    """
+    Common interface for vector store backends used by RAGPipeline.
+    query() returns Chroma's result shape: parallel lists of lists keyed by
+    "ids", "documents", "metadatas" and "distances" (cosine distance), one inner list per query.
+    """
+
+    @abstractmethod
+    def add_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+        embeddings: Optional[Embeddings] = None,
+    ):
+        """Upserts chunks; existing IDs are overwritten."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Removes chunks by ID; unknown IDs are ignored."""
+
+    @abstractmethod
+    def reset(self):
+        """Drops every stored chunk."""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: Embeddings,
+        n_results: int = 5,
+        filter_dict: Optional[Dict] = None,
+        query_text: Optional[Union[str, List[str]]] = None
+    ) -> Dict:
+        """
+        Top-k nearest chunks per query embedding.
+        query_text (one string per embedding) is only used by lexical/hybrid backends.
+        """
+
+    @abstractmethod
+    def get(self, ids: List[str]) -> Dict:
+        """Stored chunks by ID in Chroma's flat get() shape (missing IDs are skipped)."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+
+    def get_context_with_sources(self, results: Dict) -> str:
+        """
+        Formats results for the LLM.
+        Critical for the mission of 'transferring know-how' and documentation.
+        """
+        context_parts = []
+        for i in range(len(results['documents'][0])):
+            text = results['documents'][0][i]
+            meta = results['metadatas'][0][i]
+            # Engineering clean citations
+            source = meta.get('source', 'Unknown')
+            page = meta.get('page', 'N/A')
+            context_parts.append(f"[Source: {source}, Page: {page}]\n{text}")
+
+        return "\n\n---\n\n".join(context_parts)
+
+
+def create_retriever(
+    backend: str,
+    persist_dir: str,
+    collection_name: str = "papers",
+    nlist: int = 0,
+    nprobe: int = 8,
+    hybrid: bool = False,
+    hybrid_fetch_k: int = 20,
+    shards: int = 1,
+    compression: Optional[str] = None,
+    rescore_factor: int = 4,
+) -> BaseRetriever:
+    """
+    Builds the configured vector store backend.
+    "chroma" -> ChromaRetriever; "numpy" (alias "faiss") -> NumpyRetriever.
+    nlist/nprobe only apply to the numpy backend (IVF approximate search), as do
+    compression/rescore_factor (compact codes first pass + exact float rescoring).
+    shards > 1 splits the collection into "<collection_name>-shardNN" collections behind
+    a ShardedRetriever (parallel fan-out, filter routing).
+    hybrid wraps the backend in a HybridRetriever (BM25 + dense, reciprocal rank fusion);
+    the keyword index covers the whole collection, not one shard.
+    Imports are deferred so only the selected backend's dependencies are loaded.
+    """
+    backend = (backend or "chroma").lower()
+    if backend == "chroma":
+        from src.retrieval.retriever import ChromaRetriever
+        if compression:
+            logger.warning(f"Vector compression '{compression}' needs the numpy backend; ignored for chroma")
+
+        def _dense(name: str) -> BaseRetriever:
+            return ChromaRetriever(persist_dir=persist_dir, collection_name=name)
+    elif backend in ("numpy", "faiss"):
+        from src.retrieval.numpy_index import NumpyRetriever
+
+        def _dense(name: str) -> BaseRetriever:
+            return NumpyRetriever(
+                persist_dir=persist_dir, collection_name=name, nlist=nlist, nprobe=nprobe,
+                compression=compression, rescore_factor=rescore_factor,
+            )
+    else:
+        raise ValueError(f"Unknown index backend: {backend}")
+
+    if shards > 1:
+        from src.retrieval.sharded import ShardedRetriever, shard_collection_name
+        dense = ShardedRetriever(
+            [_dense(shard_collection_name(collection_name, i)) for i in range(shards)],
+            stats_path=str(Path(persist_dir) / "shards" / f"{collection_name}.json"),
+        )
+    else:
+        dense = _dense(collection_name)
+
+    if not hybrid:
+        return dense
+    from src.retrieval.bm25 import BM25Index
+    from src.retrieval.hybrid import HybridRetriever
+    lexical = BM25Index(str(Path(persist_dir) / "bm25" / collection_name))
+    return HybridRetriever(dense, lexical, fetch_k=hybrid_fetch_k)
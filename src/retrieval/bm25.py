@@ -0,0 +1,407 @@
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+
+import numpy as np
+
+from src.retrieval.filters import filter_mask
+from src.utils.concurrency import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as "2302.13971", "ResNet-50" or "Eq.3" intact as one token
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:[._\-:/][A-Za-z0-9]+)*")
+_PART_RE = re.compile(r"[A-Za-z0-9]+")
+_MAX_TF = 65535
+# Snapshot once the delta log holds this many records beyond twice the live chunk count
+_LOG_REWRITE_SLACK = 1024
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; compound identifiers also emit their parts."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+def reciprocal_rank_fusion(ranked_lists: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merges rankings by summing 1 / (k + rank); returns (id, score) best first."""
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, cid in enumerate(ranked, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class _Segment:
+    """Immutable postings: sorted vocab -> slice of contiguous doc/tf arrays."""
+    def __init__(self, vocab: Dict[str, Tuple[int, int]], docs: np.ndarray, tfs: np.ndarray):
+        self.vocab = vocab
+        self.docs = docs
+        self.tfs = tfs
+
+    @property
+    def size(self) -> int:
+        return len(self.docs)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        loc = self.vocab.get(term)
+        if loc is None:
+            return None
+        start, length = loc
+        return self.docs[start:start + length], self.tfs[start:start + length]
+
+    @classmethod
+    def build(cls, postings: Dict[str, Tuple[Any, Any]]) -> "_Segment":
+        vocab, doc_parts, tf_parts, offset = {}, [], [], 0
+        for term in sorted(postings):
+            docs, tfs = postings[term]
+            if len(docs) == 0:
+                continue
+            vocab[term] = (offset, len(docs))
+            doc_parts.append(np.asarray(docs, dtype=np.int32))
+            tf_parts.append(np.asarray(tfs, dtype=np.uint16))
+            offset += len(docs)
+        docs = np.concatenate(doc_parts) if doc_parts else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+        return cls(vocab, docs, tfs)
+
+    def write(self, directory: Path, name: str):
+        for suffix, arr in (("docs.i32", self.docs), ("tfs.u16", self.tfs)):
+            tmp = directory / f"{name}.{suffix}.tmp"
+            arr.tofile(tmp)
+            os.replace(tmp, directory / f"{name}.{suffix}")
+        tmp = directory / f"{name}.vocab.json.tmp"
+        tmp.write_text(json.dumps(self.vocab), encoding="utf-8")
+        os.replace(tmp, directory / f"{name}.vocab.json")
+
+    @staticmethod
+    def remove(directory: Path, name: str):
+        for suffix in ("docs.i32", "tfs.u16", "vocab.json"):
+            (directory / f"{name}.{suffix}").unlink(missing_ok=True)
+
+    @classmethod
+    def read(cls, directory: Path, name: str, mmap: bool) -> Optional["_Segment"]:
+        vocab_path = directory / f"{name}.vocab.json"
+        if not vocab_path.exists():
+            return None
+        vocab = {t: tuple(loc) for t, loc in json.loads(vocab_path.read_text(encoding="utf-8")).items()}
+        arrays = []
+        for suffix, dtype in (("docs.i32", np.int32), ("tfs.u16", np.uint16)):
+            path = directory / f"{name}.{suffix}"
+            if mmap and path.stat().st_size > 0:
+                arrays.append(np.memmap(path, dtype=dtype, mode="r"))
+            else:
+                arrays.append(np.fromfile(path, dtype=dtype))
+        return cls(vocab, arrays[0], arrays[1])
+
+
+class BM25Index:
+    """
+    On-disk inverted index with BM25 scoring, built incrementally next to the vector store.
+
+    Postings are array-backed: a large memory-mapped "base" segment plus a small
+    in-memory "delta" of documents added since the last merge (python arrays, appended
+    in place). Deletes and upserts tombstone the old document ordinal; tombstoned
+    postings are dropped when the delta is merged into the base.
+
+    Scoring accumulates into one dense float32 vector over document ordinals,
+    so a query costs O(total postings of its terms).
+
+    On disk, generation g is a snapshot (docs.json + base.g.* segment files) plus
+    delta.g.jsonl, an append-only log of the adds and deletes since that snapshot.
+    save() only appends the new records; a merge writes snapshot g+1 and drops the
+    old files, so persisting costs O(batch) rather than O(index) per write.
+    """
+    def __init__(
+        self,
+        index_dir: str,
+        k1: float = 1.2,
+        b: float = 0.75,
+        merge_ratio: float = 0.25,
+    ):
+        self.dir = Path(index_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.merge_ratio = merge_ratio
+        self._lock = ReadWriteLock()
+
+        self.ids: List[Optional[str]] = []
+        self.doc_len = array("I")
+        self.meta_columns: Dict[str, List[Any]] = {}
+        self._ord_of: Dict[str, int] = {}
+        self._base: Optional[_Segment] = None
+        self._delta: Dict[str, Tuple[array, array]] = {}
+        self._delta_size = 0
+        self._alive: Optional[np.ndarray] = None
+        self._column_arrays: Optional[Dict[str, np.ndarray]] = None
+        self._generation = 0
+        self._log_records = 0
+        self._pending: List[str] = []  # log lines of writes not saved yet
+        self._load()
+
+    # ---- persistence -------------------------------------------------
+
+    @property
+    def _log_path(self) -> Path:
+        return self.dir / f"delta.{self._generation}.jsonl"
+
+    def _load(self):
+        docs_path = self.dir / "docs.json"
+        if docs_path.exists():
+            data = json.loads(docs_path.read_text(encoding="utf-8"))
+            self.ids = data["ids"]
+            self.doc_len = array("I", data["doc_len"])
+            self.meta_columns = data["metadata"]
+            self._ord_of = {cid: i for i, cid in enumerate(self.ids) if cid is not None}
+            if "generation" not in data:
+                self._migrate_segments()
+                return
+            self._generation = data["generation"]
+            self._base = _Segment.read(self.dir, f"base.{self._generation}", mmap=True)
+        if self._log_path.exists():
+            self._replay_log()
+        logger.info(f"BM25 index loaded: {len(self._ord_of)} chunks, {len(self._base.vocab) if self._base else 0} base terms")
+
+    def _migrate_segments(self):
+        """Converts the older layout (docs.json rewritten on every save + base/delta segments) to a snapshot."""
+        self._base = _Segment.read(self.dir, "base", mmap=True)
+        delta = _Segment.read(self.dir, "delta", mmap=False)
+        if delta is not None:
+            for term, (start, length) in delta.vocab.items():
+                self._delta[term] = (
+                    array("i", delta.docs[start:start + length].tolist()),
+                    array("H", delta.tfs[start:start + length].tolist()),
+                )
+            self._delta_size = delta.size
+        logger.info(f"Converting BM25 index {self.dir} to the delta log layout")
+        self._merge()
+        for name in ("base", "delta"):
+            _Segment.remove(self.dir, name)
+
+    def _replay_log(self):
+        """Re-applies the adds and deletes logged since the snapshot."""
+        good_end = 0
+        with open(self._log_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail of an interrupted append
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                good_end += len(line)
+                self._log_records += 1
+                if "delete" in record:
+                    self._remove(record["delete"])
+                else:
+                    self._remove([doc[0] for doc in record["add"]])
+                    for cid, counts, meta in record["add"]:
+                        self._append(cid, counts, meta)
+        if good_end < self._log_path.stat().st_size:
+            logger.warning(f"Dropping a torn record at the end of {self._log_path}")
+            with open(self._log_path, "r+b") as f:
+                f.truncate(good_end)
+
+    def save(self):
+        """Appends the unsaved writes to the delta log; merges into a new snapshot when the delta grows large."""
+        with self._lock.write():
+            base_size = self._base.size if self._base is not None else 0
+            if (
+                self._delta_size > self.merge_ratio * max(base_size, 1)
+                or self._log_records > 2 * len(self._ord_of) + _LOG_REWRITE_SLACK
+            ):
+                self._merge()  # the snapshot already holds the pending writes
+            elif self._pending:
+                with open(self._log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(self._pending))
+                self._log_records += len(self._pending)
+            self._pending = []
+
+    def _merge(self):
+        """Rewrites base + delta as one base, dropping tombstones and renumbering ordinals."""
+        alive = self._alive_mask()
+        new_ord = np.full(len(self.ids), -1, dtype=np.int64)
+        new_ord[alive] = np.arange(int(alive.sum()))
+
+        merged: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        terms = set(self._delta) | (set(self._base.vocab) if self._base is not None else set())
+        for term in terms:
+            doc_parts, tf_parts = [], []
+            base = self._base.postings(term) if self._base is not None else None
+            if base is not None:
+                doc_parts.append(np.asarray(base[0]))
+                tf_parts.append(np.asarray(base[1]))
+            if term in self._delta:
+                doc_parts.append(np.frombuffer(self._delta[term][0], dtype=np.int32))
+                tf_parts.append(np.frombuffer(self._delta[term][1], dtype=np.uint16))
+            docs = np.concatenate(doc_parts)
+            tfs = np.concatenate(tf_parts)
+            keep = alive[docs]
+            if keep.any():
+                merged[term] = (new_ord[docs[keep]].astype(np.int32), tfs[keep])
+
+        old_generation = self._generation
+        self._generation += 1
+        _Segment.build(merged).write(self.dir, f"base.{self._generation}")
+
+        keep_rows = np.flatnonzero(alive)
+        self.ids = [self.ids[i] for i in keep_rows]
+        self.doc_len = array("I", [self.doc_len[i] for i in keep_rows])
+        self.meta_columns = {k: [col[i] for i in keep_rows] for k, col in self.meta_columns.items()}
+        self._ord_of = {cid: i for i, cid in enumerate(self.ids)}
+
+        # Replacing docs.json commits the new generation; the old files are garbage after that
+        tmp = self.dir / "docs.json.tmp"
+        tmp.write_text(json.dumps({
+            "ids": self.ids,
+            "doc_len": self.doc_len.tolist(),
+            "metadata": self.meta_columns,
+            "generation": self._generation,
+        }), encoding="utf-8")
+        os.replace(tmp, self.dir / "docs.json")
+        self._base = _Segment.read(self.dir, f"base.{self._generation}", mmap=True)
+        _Segment.remove(self.dir, f"base.{old_generation}")
+        (self.dir / f"delta.{old_generation}.jsonl").unlink(missing_ok=True)
+
+        self._delta = {}
+        self._delta_size = 0
+        self._log_records = 0
+        self._pending = []
+        self._alive = None
+        self._column_arrays = None
+        logger.info(f"BM25 segments merged: {len(self.ids)} chunks, {self._base.size} postings")
+
+    # ---- writes --------------------------------------------------------
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        with self._lock.write():
+            self._remove(ids)
+            docs = []
+            for cid, text, meta in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                self._append(cid, counts, meta)
+                docs.append((cid, counts, meta))
+            self._pending.append(json.dumps({"add": docs}) + "\n")
+            self._alive = None
+            self._column_arrays = None
+
+    def _append(self, cid: str, counts: Dict[str, int], meta: Dict):
+        ordinal = len(self.ids)
+        self.ids.append(cid)
+        self.doc_len.append(sum(counts.values()))
+        self._ord_of[cid] = ordinal
+        for key in meta:
+            if key not in self.meta_columns:
+                self.meta_columns[key] = [None] * ordinal
+        for key, col in self.meta_columns.items():
+            col.append(meta.get(key))
+        for term, tf in counts.items():
+            postings = self._delta.get(term)
+            if postings is None:
+                postings = self._delta[term] = (array("i"), array("H"))
+            postings[0].append(ordinal)
+            postings[1].append(min(tf, _MAX_TF))
+        self._delta_size += len(counts)
+
+    def _remove(self, ids: List[str]):
+        for cid in ids:
+            ordinal = self._ord_of.pop(cid, None)
+            if ordinal is not None:
+                self.ids[ordinal] = None
+                for col in self.meta_columns.values():
+                    col[ordinal] = None
+
+    def delete(self, ids: List[str]):
+        with self._lock.write():
+            self._remove(ids)
+            self._pending.append(json.dumps({"delete": list(ids)}) + "\n")
+            self._alive = None
+            self._column_arrays = None
+
+    def reset(self):
+        with self._lock.write():
+            self._base = None
+            for path in self.dir.iterdir():
+                path.unlink()
+            self.ids, self.doc_len, self.meta_columns = [], array("I"), {}
+            self._ord_of, self._delta, self._delta_size = {}, {}, 0
+            self._generation, self._log_records, self._pending = 0, 0, []
+            self._alive = None
+            self._column_arrays = None
+
+    # ---- reads ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._ord_of)
+
+    def _alive_mask(self) -> np.ndarray:
+        if self._alive is None:
+            self._alive = np.array([cid is not None for cid in self.ids], dtype=bool)
+        return self._alive
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        if self._column_arrays is None:
+            arrays = {}
+            for key, col in self.meta_columns.items():
+                arr = np.empty(len(col), dtype=object)
+                arr[:] = col
+                arrays[key] = arr
+            self._column_arrays = arrays
+        return self._column_arrays
+
+    def query(self, query_text: str, n_results: int = 20, filter_dict: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        """Top chunks by BM25 score as (chunk_id, score), best first; zero-score chunks are omitted."""
+        terms = set(tokenize(query_text))
+        with self._lock.read():
+            n_docs = len(self.ids)
+            if not terms or not self._ord_of:
+                return []
+            alive = self._alive_mask()
+            doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+            n_alive = len(self._ord_of)
+            avgdl = float(doc_len[alive].mean()) or 1.0
+            norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term in terms:
+                parts = []
+                if self._base is not None:
+                    base = self._base.postings(term)
+                    if base is not None:
+                        parts.append(base)
+                if term in self._delta:
+                    d_docs, d_tfs = self._delta[term]
+                    parts.append((np.frombuffer(d_docs, dtype=np.int32), np.frombuffer(d_tfs, dtype=np.uint16)))
+                # One IDF per term over all segments, so scores do not depend on merge state
+                df = sum(int(alive[docs].sum()) for docs, _ in parts)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (n_alive - df + 0.5) / (df + 0.5))
+                for docs, tfs in parts:
+                    tf = tfs.astype(np.float32)
+                    # ordinals are unique within a posting list, so fancy-index += is safe
+                    scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+
+            mask = alive & (scores > 0)
+            if filter_dict:
+                mask &= filter_mask(filter_dict, self._columns(), n_docs)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            k = min(n_results, len(candidates))
+            cand_scores = scores[candidates]
+            top = np.argpartition(-cand_scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+            top = top[np.argsort(-cand_scores[top], kind="stable")]
+            return [(self.ids[candidates[i]], float(cand_scores[i])) for i in top]
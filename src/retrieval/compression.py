@@ -0,0 +1,179 @@
+from pathlib import Path
+from typing import Optional, Tuple
+import re
+
+import numpy as np
+
+_BLOCK_ROWS = 65536
+# Set bits per byte value, for Hamming distance on packed binary codes (numpy < 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_SPEC = re.compile(r"^(?:(?P<reduce>pca|trunc)(?P<dim>\d+))?,?(?P<quant>int8|binary)?$")
+
+
+def _hamming(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Bit differences between each packed code row and one packed query."""
+    if hasattr(np, "bitwise_count") and codes.shape[1] % 8 == 0:
+        # 64 bits per XOR/popcount instead of 8
+        diff = np.bitwise_xor(np.ascontiguousarray(codes).view(np.uint64), query.view(np.uint64))
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[np.bitwise_xor(codes, query)].sum(axis=1, dtype=np.int32)
+
+
+def parse_spec(spec: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    "pca128,int8" -> ("pca", 128, "int8"); "binary" -> (None, None, "binary").
+    Reduction is pca<D> (fitted projection) or trunc<D> (Matryoshka-style prefix);
+    quantization is int8 (per-dimension scale) or binary (sign bits); either part may be omitted.
+    """
+    match = _SPEC.match((spec or "").replace(" ", "").lower())
+    if not match or not (match["reduce"] or match["quant"]):
+        raise ValueError(f"Invalid compression spec {spec!r}; expected e.g. 'int8', 'binary', 'pca128,int8'")
+    dim = int(match["dim"]) if match["dim"] else None
+    if dim is not None and dim < 1:
+        raise ValueError(f"Invalid compression dim in {spec!r}")
+    return match["reduce"], dim, match["quant"]
+
+
+class VectorCompressor:
+    """
+    Compact codes for normalized embeddings, used for a fast first search pass
+    whose shortlist is rescored against the exact float32 vectors.
+
+    fit() learns the transform on a sample of the corpus: the mean and the top
+    principal components for pca<D>, per-dimension int8 scales (99.9th percentile
+    of |value|, so outliers clip instead of wasting range). Scores are asymmetric
+    where possible: queries stay float and are projected/scaled, only the stored
+    side is quantized. Binary codes are compared with Hamming distance on packed
+    bits (popcount lookup), the cheapest first pass.
+    """
+    def __init__(self, spec: str):
+        self.reduce, self.dim, self.quantization = parse_spec(spec)
+        self.spec = spec
+        self.input_dim: Optional[int] = None
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None  # (input_dim, dim) for pca
+        self.scale: Optional[np.ndarray] = None  # (dim,) for int8
+        self.trained_size = 0
+
+    # ---- training ------------------------------------------------------
+
+    @property
+    def trained(self) -> bool:
+        return self.input_dim is not None
+
+    @property
+    def out_dim(self) -> int:
+        return self.dim or self.input_dim
+
+    def fit(self, sample: np.ndarray, corpus_size: Optional[int] = None) -> "VectorCompressor":
+        sample = np.asarray(sample, dtype=np.float32)
+        self.input_dim = int(sample.shape[1])
+        if self.dim is not None and self.dim > self.input_dim:
+            raise ValueError(f"Compression dim {self.dim} exceeds embedding dim {self.input_dim}")
+        if self.dim == self.input_dim:
+            self.dim = None
+
+        # Matryoshka prefixes are used as they are; otherwise codes describe the centered vectors
+        self.mean = np.zeros(self.input_dim, dtype=np.float32)
+        if self.reduce != "trunc":
+            self.mean = sample.mean(axis=0)
+        if self.reduce == "pca" and self.dim is not None:
+            _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:self.dim].T, dtype=np.float32)
+
+        if self.quantization == "int8":
+            reduced = self.transform(sample)
+            self.scale = (np.percentile(np.abs(reduced), 99.9, axis=0) / 127.0).astype(np.float32)
+            self.scale[self.scale == 0] = 1e-6
+        self.trained_size = corpus_size or len(sample)
+        return self
+
+    # ---- codes -----------------------------------------------------------
+
+    @property
+    def code_dtype(self) -> np.dtype:
+        return np.dtype({"int8": np.int8, "binary": np.uint8}.get(self.quantization, np.float32))
+
+    @property
+    def code_width(self) -> int:
+        """Code elements per vector (bytes for int8/binary)."""
+        return (self.out_dim + 7) // 8 if self.quantization == "binary" else self.out_dim
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.code_width * self.code_dtype.itemsize
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Stored-side reduction (centered projection, or renormalized prefix)."""
+        if self.reduce == "trunc" and self.dim is not None:
+            prefix = vectors[:, :self.dim]
+            norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return prefix / norms
+        centered = vectors - self.mean
+        return centered @ self.components if self.components is not None else centered
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        reduced = self.transform(np.asarray(vectors, dtype=np.float32))
+        if self.quantization == "int8":
+            return np.clip(np.rint(reduced / self.scale), -127, 127).astype(np.int8)
+        if self.quantization == "binary":
+            return np.packbits(reduced > 0, axis=1)
+        return reduced.astype(np.float32)
+
+    def prepare_queries(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Query-side transform. For dot-product scores the mean is not subtracted:
+        q . mean is the same for every stored vector, so it cannot change the ranking.
+        Sign bits are only comparable after the same centering as the stored side
+        (otherwise every query looks like the mean direction).
+        """
+        if self.quantization == "binary":
+            return np.packbits(self.transform(np.asarray(queries, dtype=np.float32)) > 0, axis=1)
+        if self.reduce == "trunc" and self.dim is not None:
+            projected = queries[:, :self.dim]
+        elif self.components is not None:
+            projected = queries @ self.components
+        else:
+            projected = queries
+        if self.quantization == "int8":
+            return (projected * self.scale).astype(np.float32)
+        return projected.astype(np.float32)
+
+    def score(self, prepared: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """(n_queries, n_codes) approximate similarity, higher is closer."""
+        out = np.empty((len(prepared), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), _BLOCK_ROWS):
+            block = np.asarray(codes[start:start + _BLOCK_ROWS])
+            if self.quantization == "binary":
+                for qi, q in enumerate(prepared):
+                    out[qi, start:start + len(block)] = -_hamming(block, q)
+            else:
+                out[:, start:start + len(block)] = prepared @ block.astype(np.float32, copy=False).T
+        return out
+
+    # ---- persistence ---------------------------------------------------
+
+    def save(self, path: Path):
+        arrays = {"spec": np.array(self.spec), "input_dim": np.array(self.input_dim),
+                  "trained_size": np.array(self.trained_size), "mean": self.mean}
+        if self.components is not None:
+            arrays["components"] = self.components
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        tmp = Path(path).with_suffix(".tmp.npz")
+        np.savez(tmp, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "VectorCompressor":
+        data = np.load(path)
+        compressor = cls(str(data["spec"]))
+        compressor.input_dim = int(data["input_dim"])
+        compressor.trained_size = int(data["trained_size"])
+        compressor.mean = data["mean"]
+        compressor.components = data["components"] if "components" in data else None
+        compressor.scale = data["scale"] if "scale" in data else None
+        if compressor.dim == compressor.input_dim:
+            compressor.dim = None
+        return compressor
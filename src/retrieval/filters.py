@@ -0,0 +1,60 @@
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+# Chroma-compatible "where" operators, so filter_dict means the same thing on every backend
+_OPERATORS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "$eq": lambda col, v: col == v,
+    "$ne": lambda col, v: col != v,
+    "$gt": lambda col, v: _compare(col, v, np.greater),
+    "$gte": lambda col, v: _compare(col, v, np.greater_equal),
+    "$lt": lambda col, v: _compare(col, v, np.less),
+    "$lte": lambda col, v: _compare(col, v, np.less_equal),
+    "$in": lambda col, v: np.isin(col, list(v)),
+    "$nin": lambda col, v: ~np.isin(col, list(v)),
+}
+
+
+def _compare(col: np.ndarray, value: Any, op) -> np.ndarray:
+    # Object columns can hold None for records that lack the key
+    out = np.zeros(len(col), dtype=bool)
+    present = np.array([x is not None for x in col], dtype=bool) if col.dtype == object else np.ones(len(col), dtype=bool)
+    out[present] = op(col[present].astype(type(value)), value)
+    return out
+
+
+def filter_mask(
+    where: Optional[Dict],
+    columns: Dict[str, np.ndarray],
+    size: int,
+) -> np.ndarray:
+    """
+    Evaluates a Chroma-style where clause against columnar metadata.
+    Returns a boolean mask of length `size`. Unknown keys match nothing.
+    """
+    if not where:
+        return np.ones(size, dtype=bool)
+
+    mask = np.ones(size, dtype=bool)
+    for key, cond in where.items():
+        if key == "$and":
+            for sub in cond:
+                mask &= filter_mask(sub, columns, size)
+        elif key == "$or":
+            any_mask = np.zeros(size, dtype=bool)
+            for sub in cond:
+                any_mask |= filter_mask(sub, columns, size)
+            mask &= any_mask
+        else:
+            col = columns.get(key)
+            if col is None:
+                return np.zeros(size, dtype=bool)
+            if isinstance(cond, dict):
+                for op, value in cond.items():
+                    if op not in _OPERATORS:
+                        raise ValueError(f"Unsupported filter operator: {op}")
+                    mask &= _OPERATORS[op](col, value)
+            else:
+                mask &= col == cond
+    return mask
+
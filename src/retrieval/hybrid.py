@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional, Union
+import logging
+
+from src.retrieval.base import BaseRetriever, Embeddings
+from src.retrieval.bm25 import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense vector search plus BM25 keyword search, merged with reciprocal rank fusion.
+
+    Writes go to both indexes, so the inverted index is built incrementally
+    alongside RAGPipeline.index_chunks. Each side returns fetch_k candidates under
+    the same metadata filter; the fused top n_results are returned in Chroma's
+    shape with an extra "scores" list (RRF score). "distances" holds the dense
+    cosine distance, or None for chunks only the keyword side found.
+    """
+    def __init__(self, dense: BaseRetriever, lexical: BM25Index, fetch_k: int = 20, rrf_k: int = 60):
+        self.dense = dense
+        self.lexical = lexical
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        if self.dense.count() and not len(self.lexical):
+            logger.warning(
+                "Keyword index is empty but the vector store is not; "
+                "re-ingest or clear the index to enable hybrid retrieval for existing chunks."
+            )
+
+    def add_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+        embeddings: Optional[Embeddings] = None,
+    ):
+        self.dense.add_documents(ids, texts, metadatas, embeddings=embeddings)
+        self.lexical.add(ids, texts, metadatas)
+        self.lexical.save()
+
+    def delete(self, ids: List[str]):
+        self.dense.delete(ids)
+        self.lexical.delete(ids)
+        self.lexical.save()
+
+    def reset(self):
+        self.dense.reset()
+        self.lexical.reset()
+
+    def count(self) -> int:
+        return self.dense.count()
+
+    def get(self, ids: List[str]) -> Dict:
+        return self.dense.get(ids)
+
+    def query(
+        self,
+        query_embeddings: Embeddings,
+        n_results: int = 5,
+        filter_dict: Optional[Dict] = None,
+        query_text: Optional[Union[str, List[str]]] = None
+    ) -> Dict:
+        if query_text is None:
+            return self.dense.query(query_embeddings, n_results=n_results, filter_dict=filter_dict)
+        texts = [query_text] if isinstance(query_text, str) else list(query_text)
+        if len(texts) != len(query_embeddings):
+            raise ValueError("query_text must have one entry per query embedding")
+
+        fetch_k = max(self.fetch_k, n_results)
+        dense = self.dense.query(query_embeddings, n_results=fetch_k, filter_dict=filter_dict)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "scores": []}
+
+        for qi, text in enumerate(texts):
+            rows = {
+                cid: (doc, meta, dist)
+                for cid, doc, meta, dist in zip(
+                    dense["ids"][qi], dense["documents"][qi], dense["metadatas"][qi], dense["distances"][qi]
+                )
+            }
+            sparse_ids = [cid for cid, _ in self.lexical.query(text, n_results=fetch_k, filter_dict=filter_dict)]
+            fused = reciprocal_rank_fusion([dense["ids"][qi], sparse_ids], k=self.rrf_k)[:n_results]
+
+            # Keyword-only hits are not in the dense result: fetch their text in one call
+            missing = [cid for cid, _ in fused if cid not in rows]
+            if missing:
+                got = self.dense.get(missing)
+                for cid, doc, meta in zip(got["ids"], got["documents"], got["metadatas"]):
+                    rows[cid] = (doc, meta, None)
+
+            kept = [(cid, score) for cid, score in fused if cid in rows]
+            result["ids"].append([cid for cid, _ in kept])
+            result["documents"].append([rows[cid][0] for cid, _ in kept])
+            result["metadatas"].append([rows[cid][1] for cid, _ in kept])
+            result["distances"].append([rows[cid][2] for cid, _ in kept])
+            result["scores"].append([score for _, score in kept])
+        return result
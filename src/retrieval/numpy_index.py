@@ -0,0 +1,676 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from src.retrieval.base import BaseRetriever, Embeddings
+from src.retrieval.compression import VectorCompressor
+from src.retrieval.filters import filter_mask
+from src.utils.concurrency import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+_COPY_BLOCK_ROWS = 65536
+_MIN_COMPRESSION_ROWS = 1024  # fewer vectors: exact search is cheap and the fit would be noisy
+_COMPRESSION_SAMPLE_ROWS = 65536
+_LOG_REWRITE_SLACK = 1024  # superseded row records tolerated before the log is rewritten
+
+
+def _atomic_write_text(path: Path, text: str):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k best scores per row, best first (argpartition + small sort)."""
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class _IVFIndex:
+    """
+    Inverted-file approximate search: spherical k-means centroids plus one row list
+    per centroid. Queries only score rows in the nprobe closest lists.
+    """
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_size = len(assignments)
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "_IVFIndex":
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), nlist * 256)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize_rows(centroids)
+        return cls(centroids, cls.assign(centroids, vectors))
+
+    @staticmethod
+    def assign(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), _COPY_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + _COPY_BLOCK_ROWS])
+            out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return out
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        size = int(rows.max()) + 1 if len(rows) else 0
+        if size > len(self.assignments):
+            grown = np.zeros(size, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.assignments[rows] = self.assign(self.centroids, vectors)
+        self._rebuild_lists()
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class NumpyRetriever(BaseRetriever):
+    """
+    In-process vector store: normalized embeddings live in one contiguous float32
+    matrix that is memory-mapped from disk, metadata lives in columnar lists.
+    Exact search is a single batched matrix product plus argpartition; setting
+    nlist > 0 enables an IVF approximate mode for large collections.
+
+    compression (e.g. "int8", "binary", "pca128,int8", see compression.parse_spec)
+    adds compact codes next to the float matrix: queries scan the codes (IVF lists
+    first, if enabled), keep rescore_factor * k candidates and rescore only those
+    rows of the memory-mapped float32 matrix, so the float vectors stay on disk.
+    The compressor is fitted once the collection has _MIN_COMPRESSION_ROWS vectors
+    and refitted (all codes re-encoded) when it has doubled since.
+
+    Writes are incremental: chunk texts are appended to documents.bin and each
+    write appends one JSON record per touched row (id, text span, metadata) or a
+    tombstone to rows.jsonl, so an upsert costs O(batch), not O(collection). Cold
+    start replays the row log for ids and metadata and leaves the texts on disk;
+    query results read only their own rows' text. Compaction (mostly-deleted
+    collections) and a log dominated by superseded records rewrite the files.
+
+    Files under <persist_dir>/numpy_index/<collection_name>/:
+        embeddings.f32  (capacity x dim) float32, rows [0, size) in use
+        documents.bin   append-only UTF-8 chunk texts
+        rows.jsonl      [row, id, offset, length, metadata] or [row, null] per write (commit record)
+        meta.json       dim, capacity
+        ivf.npz         centroids and row assignments when IVF is enabled
+        codes.bin       (capacity x code width) compact codes when compression is enabled
+        compressor.npz  fitted compression parameters
+    """
+    def __init__(
+        self,
+        persist_dir: str,
+        collection_name: str = "papers",
+        nlist: int = 0,
+        nprobe: int = 8,
+        compact_ratio: float = 0.5,
+        compression: Optional[str] = None,
+        rescore_factor: int = 4,
+    ):
+        self.dir = Path(persist_dir) / "numpy_index" / collection_name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.collection_name = collection_name
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self.compression = compression
+        self.rescore_factor = max(1, rescore_factor)
+        if compression:
+            VectorCompressor(compression)  # validates the spec up front
+
+        self._matrix_path = self.dir / "embeddings.f32"
+        self._docs_path = self.dir / "documents.bin"
+        self._rows_path = self.dir / "rows.jsonl"
+        self._legacy_columns_path = self.dir / "columns.json"  # single-file format of older versions
+        self._meta_path = self.dir / "meta.json"
+        self._ivf_path = self.dir / "ivf.npz"
+        self._codes_path = self.dir / "codes.bin"
+        self._compressor_path = self.dir / "compressor.npz"
+        # Queries share the read lock; writers are serialized by _write_mutex and hold
+        # the write lock only while mutating memory, not while persisting to disk
+        self._lock = ReadWriteLock()
+        self._write_mutex = threading.Lock()
+
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self.ids: List[Optional[str]] = []
+        self.meta_columns: Dict[str, List[Any]] = {}
+        self._doc_spans = np.zeros((0, 2), dtype=np.int64)  # (offset, length) in documents.bin per row
+        self._docs_size = 0
+        self._docs_reader: Optional[Any] = None
+        self._docs_lock = threading.Lock()
+        self._pending_rows: List[int] = []  # rows touched since the last persist
+        self._log_records = 0
+        self._rewrite_log = False
+        self.alive = np.zeros(0, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._column_arrays: Optional[Dict[str, np.ndarray]] = None
+        self._ivf: Optional[_IVFIndex] = None
+        self._compressor: Optional[VectorCompressor] = None
+        self._codes: Optional[np.memmap] = None
+        self._compressor_dirty = False
+        self._load()
+
+    # ---- persistence -------------------------------------------------
+
+    def _load(self):
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self._docs_size = self._docs_path.stat().st_size if self._docs_path.exists() else 0
+        if self._rows_path.exists():
+            self._replay_log()
+        elif self._legacy_columns_path.exists():
+            self._migrate_columns()
+        self.alive = np.array([i is not None for i in self.ids], dtype=bool)
+        self._row_of = {cid: row for row, cid in enumerate(self.ids) if cid is not None}
+        self._open_matrix()
+
+        if self.nlist and self._ivf_path.exists():
+            data = np.load(self._ivf_path)
+            self._ivf = _IVFIndex(data["centroids"], data["assignments"])
+        if self.compression:
+            self._load_codes()
+        logger.info(f"NumpyRetriever '{self.collection_name}' mapped {self.count()} vectors (dim={self.dim})")
+
+    def _replay_log(self):
+        """Rebuilds ids, metadata columns and text spans from rows.jsonl (last record per row wins)."""
+        ids: List[Optional[str]] = []
+        spans: List[Any] = []
+        metas: List[Optional[Dict]] = []
+        good_end = 0
+        with open(self._rows_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail of an interrupted append
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                good_end += len(line)
+                self._log_records += 1
+                row = record[0]
+                if row >= len(ids):
+                    grow = row + 1 - len(ids)
+                    ids.extend([None] * grow)
+                    spans.extend([(0, 0)] * grow)
+                    metas.extend([None] * grow)
+                if record[1] is None:
+                    ids[row], metas[row] = None, None
+                else:
+                    ids[row], spans[row], metas[row] = record[1], (record[2], record[3]), record[4]
+        if good_end < self._rows_path.stat().st_size:
+            logger.warning(f"Dropping a torn record at the end of {self._rows_path}")
+            with open(self._rows_path, "r+b") as f:
+                f.truncate(good_end)
+
+        self.ids = ids
+        self._doc_spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+        keys = dict.fromkeys(k for m in metas if m for k in m)
+        self.meta_columns = {k: [m.get(k) if m else None for m in metas] for k in keys}
+
+    def _migrate_columns(self):
+        """Converts the older columns.json format to documents.bin + rows.jsonl."""
+        cols = json.loads(self._legacy_columns_path.read_text(encoding="utf-8"))
+        self.ids = cols["ids"]
+        self.meta_columns = cols["metadata"]
+        self._doc_spans = np.zeros((len(self.ids), 2), dtype=np.int64)
+        rows = [row for row, cid in enumerate(self.ids) if cid is not None]
+        self._append_documents(rows, [cols["documents"][row] for row in rows])
+        self._rewrite_log = True
+        self._persist_log()
+        self._legacy_columns_path.unlink()
+        logger.info(f"Migrated '{self.collection_name}' to the append-only row log ({len(rows)} rows)")
+
+    def _append_documents(self, rows: List[int], texts: List[Optional[str]]):
+        """Appends texts to documents.bin and points the rows at them; old texts become garbage."""
+        blobs = [(text or "").encode("utf-8") for text in texts]
+        with open(self._docs_path, "ab") as f:
+            f.write(b"".join(blobs))
+        offset = self._docs_size
+        for row, blob in zip(rows, blobs):
+            self._doc_spans[row] = (offset, len(blob))
+            offset += len(blob)
+        self._docs_size = offset
+
+    def _documents(self, rows: List[int]) -> List[str]:
+        with self._docs_lock:
+            if self._docs_reader is None:
+                self._docs_reader = open(self._docs_path, "rb", buffering=0)
+            texts = []
+            for row in rows:
+                offset, length = self._doc_spans[row]
+                self._docs_reader.seek(int(offset))
+                texts.append(self._docs_reader.read(int(length)).decode("utf-8"))
+            return texts
+
+    def _close_docs_reader(self):
+        with self._docs_lock:
+            if self._docs_reader is not None:
+                self._docs_reader.close()
+                self._docs_reader = None
+
+    def _row_record(self, row: int) -> str:
+        cid = self.ids[row]
+        if cid is None:
+            return json.dumps([row, None]) + "\n"
+        offset, length = self._doc_spans[row]
+        return json.dumps([row, cid, int(offset), int(length), self._row_metadata(row)]) + "\n"
+
+    def _persist_log(self):
+        """Appends the records of the rows touched by this write; rewrites the log once mostly superseded."""
+        if self._rewrite_log or self._log_records > 2 * len(self._row_of) + _LOG_REWRITE_SLACK:
+            records = [self._row_record(row) for row, cid in enumerate(self.ids) if cid is not None]
+            tmp = self._rows_path.with_suffix(".jsonl.tmp")
+            tmp.write_text("".join(records), encoding="utf-8")
+            os.replace(tmp, self._rows_path)
+            self._log_records = len(records)
+            self._rewrite_log = False
+        elif self._pending_rows:
+            with open(self._rows_path, "a", encoding="utf-8") as f:
+                f.write("".join(self._row_record(row) for row in self._pending_rows))
+            self._log_records += len(self._pending_rows)
+        self._pending_rows = []
+
+    def _open_matrix(self):
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _load_codes(self):
+        if self._compressor_path.exists() and self._codes_path.exists():
+            compressor = VectorCompressor.load(self._compressor_path)
+            if compressor.spec == self.compression and compressor.input_dim == self.dim:
+                self._compressor = compressor
+                self._open_codes()
+                return
+            logger.info(f"Compression changed to '{self.compression}'; refitting codes for '{self.collection_name}'")
+        # Codes missing, stale or from another spec: fit them from the stored vectors
+        self._fit_compressor()
+
+    def _open_codes(self):
+        c = self._compressor
+        expected = self.capacity * c.bytes_per_vector
+        if not self._codes_path.exists() or self._codes_path.stat().st_size < expected:
+            with open(self._codes_path, "ab") as f:
+                f.truncate(expected)
+        self._codes = np.memmap(self._codes_path, dtype=c.code_dtype, mode="r+", shape=(self.capacity, c.code_width))
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self.capacity:
+            return
+        new_capacity = max(rows_needed, self.capacity * 2, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.capacity = new_capacity
+        self._open_matrix()
+        if self._codes is not None:
+            self._codes.flush()
+            self._codes = None
+            self._open_codes()
+
+    def _persist(self):
+        if self._matrix is not None:
+            self._matrix.flush()
+        if self._codes is not None:
+            self._codes.flush()
+        if self._compressor_dirty:
+            self._compressor.save(self._compressor_path)
+            self._compressor_dirty = False
+        _atomic_write_text(self._meta_path, json.dumps({"dim": self.dim, "capacity": self.capacity}))
+        self._persist_log()
+        if self._ivf is not None:
+            np.savez(self._ivf_path, centroids=self._ivf.centroids, assignments=self._ivf.assignments)
+        elif self._ivf_path.exists():
+            self._ivf_path.unlink()
+
+    # ---- writes --------------------------------------------------------
+
+    def add_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+        embeddings: Optional[Embeddings] = None,
+    ):
+        if embeddings is None:
+            raise ValueError("NumpyRetriever requires precomputed embeddings")
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+        with self._write_mutex:
+            with self._lock.write():
+                self._add_rows(ids, texts, metadatas, vectors)
+            self._persist()
+
+    def _add_rows(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} does not match index dim {self.dim}")
+
+        rows = np.empty(len(ids), dtype=np.int64)
+        next_row = len(self.ids)
+        for i, cid in enumerate(ids):
+            row = self._row_of.get(cid)
+            if row is None:
+                row = next_row
+                next_row += 1
+                self._row_of[cid] = row
+            rows[i] = row
+
+        self._ensure_capacity(next_row)
+        grow = next_row - len(self.ids)
+        if grow:
+            self.ids.extend([None] * grow)
+            for col in self.meta_columns.values():
+                col.extend([None] * grow)
+            self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+            self._doc_spans = np.concatenate([self._doc_spans, np.zeros((grow, 2), dtype=np.int64)])
+
+        for key in {k for m in metadatas for k in m}:
+            if key not in self.meta_columns:
+                self.meta_columns[key] = [None] * len(self.ids)
+
+        for row, cid, meta in zip(rows, ids, metadatas):
+            self.ids[row] = cid
+            for key, col in self.meta_columns.items():
+                col[row] = meta.get(key)
+        self._append_documents(rows, texts)
+        self._pending_rows.extend(rows.tolist())
+        self.alive[rows] = True
+        self._matrix[rows] = vectors
+
+        self._column_arrays = None
+        self._update_ivf(rows, vectors)
+        self._update_codes(rows, vectors)
+
+    def delete(self, ids: List[str]):
+        with self._write_mutex:
+            with self._lock.write():
+                rows = [self._row_of.pop(cid) for cid in ids if cid in self._row_of]
+                if not rows:
+                    return
+                for row in rows:
+                    self.ids[row] = None
+                    for col in self.meta_columns.values():
+                        col[row] = None
+                self.alive[rows] = False
+                self._pending_rows.extend(rows)
+                self._column_arrays = None
+
+                if len(self.ids) > 1024 and (1 - self.alive.mean()) > self.compact_ratio:
+                    self._compact()
+            self._persist()
+
+    def reset(self):
+        with self._write_mutex, self._lock.write():
+            self._matrix = None
+            self._codes = None
+            self._compressor = None
+            self._compressor_dirty = False
+            self._close_docs_reader()
+            for path in (self._matrix_path, self._docs_path, self._rows_path, self._legacy_columns_path,
+                         self._meta_path, self._ivf_path, self._codes_path, self._compressor_path):
+                if path.exists():
+                    path.unlink()
+            self.dim = None
+            self.capacity = 0
+            self.ids, self.meta_columns = [], {}
+            self._doc_spans = np.zeros((0, 2), dtype=np.int64)
+            self._docs_size = 0
+            self._pending_rows = []
+            self._log_records = 0
+            self._rewrite_log = False
+            self.alive = np.zeros(0, dtype=bool)
+            self._row_of = {}
+            self._column_arrays = None
+            self._ivf = None
+
+    def _compact(self):
+        """Rewrites the matrix and texts without deleted rows, streaming in blocks to bound memory."""
+        keep = np.flatnonzero(self.alive)
+        logger.info(f"Compacting '{self.collection_name}': {len(self.ids)} -> {len(keep)} rows")
+        tmp_path = self._matrix_path.with_suffix(".tmp")
+        capacity = max(len(keep), 1024)
+        compacted = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        for start in range(0, len(keep), _COPY_BLOCK_ROWS):
+            block = keep[start:start + _COPY_BLOCK_ROWS]
+            compacted[start:start + len(block)] = self._matrix[block]
+        compacted.flush()
+        del compacted
+        self._matrix = None
+        os.replace(tmp_path, self._matrix_path)
+
+        tmp_docs = self._docs_path.with_suffix(".tmp")
+        spans = np.zeros((len(keep), 2), dtype=np.int64)
+        offset = 0
+        with open(self._docs_path, "rb") as src, open(tmp_docs, "wb") as dst:
+            for i, row in enumerate(keep):
+                start, length = self._doc_spans[row]
+                src.seek(int(start))
+                dst.write(src.read(int(length)))
+                spans[i] = (offset, length)
+                offset += int(length)
+        self._close_docs_reader()
+        os.replace(tmp_docs, self._docs_path)
+        self._doc_spans = spans
+        self._docs_size = offset
+        self._rewrite_log = True  # row numbers changed
+
+        self.capacity = capacity
+        self.ids = [self.ids[r] for r in keep]
+        self.meta_columns = {k: [col[r] for r in keep] for k, col in self.meta_columns.items()}
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._row_of = {cid: row for row, cid in enumerate(self.ids)}
+        self._open_matrix()
+        # Row numbers changed: retrain now, or queries fall back to exact search until the next write
+        self._ivf = None
+        if self.nlist:
+            self._train_ivf()
+        if self._compressor is not None:
+            # Same fitted parameters, codes rewritten in the new row order
+            self._codes = None
+            self._open_codes()
+            self._encode_rows(0, len(self.ids))
+
+    def _update_ivf(self, rows: np.ndarray, vectors: np.ndarray):
+        if not self.nlist:
+            return
+        size = len(self.ids)
+        if self._ivf is not None and size <= 2 * self._ivf.trained_size:
+            self._ivf.add(rows, vectors)
+        else:
+            self._train_ivf()
+
+    def _train_ivf(self):
+        size = len(self.ids)
+        if size >= self.nlist * 39:  # too few points per centroid below this
+            logger.info(f"Training IVF index with {self.nlist} lists on {size} vectors")
+            self._ivf = _IVFIndex.train(self._matrix[:size], self.nlist)
+
+    def _update_codes(self, rows: np.ndarray, vectors: np.ndarray):
+        if not self.compression:
+            return
+        size = len(self.ids)
+        if self._compressor is not None and size <= 2 * self._compressor.trained_size:
+            self._codes[rows] = self._compressor.encode(vectors)
+        elif size >= _MIN_COMPRESSION_ROWS:
+            self._fit_compressor()
+
+    def _fit_compressor(self):
+        """Fits the compressor on a sample of live vectors and re-encodes every row."""
+        size = len(self.ids)
+        live = np.flatnonzero(self.alive[:size])
+        if len(live) < _MIN_COMPRESSION_ROWS:
+            return
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(live, min(len(live), _COMPRESSION_SAMPLE_ROWS), replace=False))
+        logger.info(f"Fitting '{self.compression}' compression on {len(sample_rows)} of {len(live)} vectors")
+        self._compressor = VectorCompressor(self.compression).fit(self._matrix[sample_rows], corpus_size=size)
+        self._compressor_dirty = True
+        self._codes = None
+        if self._codes_path.exists():
+            self._codes_path.unlink()  # code width may have changed
+        self._open_codes()
+        self._encode_rows(0, size)
+
+    def _encode_rows(self, start: int, stop: int):
+        for block in range(start, stop, _COPY_BLOCK_ROWS):
+            end = min(block + _COPY_BLOCK_ROWS, stop)
+            self._codes[block:end] = self._compressor.encode(np.asarray(self._matrix[block:end]))
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Bytes of the float32 vectors vs. the compact codes the first pass scans."""
+        size = len(self.ids)
+        stats = {"vectors": size, "float_bytes": size * (self.dim or 0) * 4, "code_bytes": 0, "compression": None}
+        if self._compressor is not None:
+            stats.update(code_bytes=size * self._compressor.bytes_per_vector, compression=self.compression)
+        return stats
+
+    # ---- reads ---------------------------------------------------------
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        if self._column_arrays is None:
+            arrays = {}
+            for key, col in self.meta_columns.items():
+                arr = np.empty(len(col), dtype=object)
+                arr[:] = col
+                arrays[key] = arr
+            self._column_arrays = arrays
+        return self._column_arrays
+
+    def _row_metadata(self, row: int) -> Dict[str, Any]:
+        return {k: col[row] for k, col in self.meta_columns.items() if col[row] is not None}
+
+    def get(self, ids: List[str]) -> Dict:
+        """Fetches stored chunks by ID in Chroma's flat get() shape."""
+        with self._lock.read():
+            rows = [self._row_of[cid] for cid in ids if cid in self._row_of]
+            return {
+                "ids": [self.ids[r] for r in rows],
+                "documents": self._documents(rows),
+                "metadatas": [self._row_metadata(r) for r in rows],
+            }
+
+    def query(
+        self,
+        query_embeddings: Embeddings,
+        n_results: int = 5,
+        filter_dict: Optional[Dict] = None,
+        query_text: Optional[Union[str, List[str]]] = None
+    ) -> Dict:
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock.read():
+            size = len(self.ids)
+            mask = self.alive[:size] & filter_mask(filter_dict, self._columns(), size) if size else self.alive
+            candidates = np.flatnonzero(mask)
+            k = min(n_results, len(candidates))
+            if k == 0:
+                for _ in range(len(queries)):
+                    for key in result:
+                        result[key].append([])
+                return result
+
+            if self._compressor is not None:
+                top_rows, top_scores = self._query_compressed(queries, mask, candidates, size, k)
+            elif self._ivf is not None:
+                top_rows, top_scores = self._query_ivf(queries, mask, k)
+            else:
+                top_rows, top_scores = self._query_exact(queries, candidates, size, k)
+
+            for rows, scores in zip(top_rows, top_scores):
+                result["ids"].append([self.ids[r] for r in rows])
+                result["documents"].append(self._documents(rows))
+                result["metadatas"].append([self._row_metadata(r) for r in rows])
+                result["distances"].append([float(1.0 - s) for s in scores])
+        return result
+
+    def _query_exact(self, queries: np.ndarray, candidates: np.ndarray, size: int, k: int):
+        if len(candidates) == size:
+            scores = queries @ self._matrix[:size].T
+            idx = _top_k(scores, k)
+            return idx, np.take_along_axis(scores, idx, axis=1)
+        # Selective filter: only touch the matching rows
+        scores = queries @ self._matrix[candidates].T
+        idx = _top_k(scores, k)
+        return candidates[idx], np.take_along_axis(scores, idx, axis=1)
+
+    def _query_ivf(self, queries: np.ndarray, mask: np.ndarray, k: int):
+        all_rows, all_scores = [], []
+        for q in queries:
+            rows = self._ivf.candidates(q, self.nprobe)
+            rows = rows[rows < len(mask)]
+            rows = rows[mask[rows]]
+            if len(rows) < k:  # probed lists too small after filtering: fall back to exact
+                rows = np.flatnonzero(mask)
+            rows = np.sort(rows)  # sequential access into the memmap
+            scores = (self._matrix[rows] @ q)[None, :]
+            idx = _top_k(scores, k)[0]
+            all_rows.append(rows[idx])
+            all_scores.append(scores[0, idx])
+        return all_rows, all_scores
+
+    def _query_compressed(self, queries: np.ndarray, mask: np.ndarray, candidates: np.ndarray, size: int, k: int):
+        """First pass over the compact codes, then exact float32 rescoring of each shortlist."""
+        shortlist = k * self.rescore_factor
+        prepared = self._compressor.prepare_queries(queries)
+        if self._ivf is not None:
+            per_query = []
+            for q, p in zip(queries, prepared):
+                rows = self._ivf.candidates(q, self.nprobe)
+                rows = np.sort(rows[rows < len(mask)])
+                rows = rows[mask[rows]]
+                if len(rows) < k:
+                    rows = candidates
+                approx = self._compressor.score(p[None, :], self._codes[rows])
+                per_query.append(rows[_top_k(approx, min(shortlist, len(rows)))[0]])
+        else:
+            codes = self._codes[:size] if len(candidates) == size else self._codes[candidates]
+            approx = self._compressor.score(prepared, codes)
+            per_query = candidates[_top_k(approx, min(shortlist, len(candidates)))]
+
+        all_rows, all_scores = [], []
+        for q, rows in zip(queries, per_query):
+            rows = np.sort(rows)  # sequential access into the memmap
+            scores = (self._matrix[rows] @ q)[None, :]
+            idx = _top_k(scores, k)[0]
+            all_rows.append(rows[idx])
+            all_scores.append(scores[0, idx])
+        return all_rows, all_scores
@@ -0,0 +1,114 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import logging
+import time
+
+from src.embeddings.cache import LRUCache, text_hash
+
+logger = logging.getLogger(__name__)
+
+_BACKENDS = ("torch", "onnx", "int8")
+
+
+@dataclass
+class RerankResult:
+    order: List[int]  # indices into the candidate list, best first
+    scores: List[Optional[float]] = field(default_factory=list)  # None = not scored (budget)
+    scored: int = 0
+    cached: int = 0
+    timed_out: bool = False
+    elapsed_ms: float = 0.0
+
+
+class CrossEncoderReranker:
+    """
+    Second-stage ranking of over-fetched vector hits with a small cross-encoder on CPU.
+
+    Candidates are scored in batches in vector order. Once the per-query time budget
+    is spent, the remaining candidates are not scored: the scored prefix is reordered
+    by score and the rest keep their vector order behind it (so an exhausted budget
+    degrades to plain vector ranking, never to an error).
+    (query, chunk) scores are kept in an LRU, keyed by chunk ID when given.
+
+    backend:
+        "torch" - fp32 weights
+        "onnx"  - ONNX Runtime via sentence-transformers (needs optimum/onnxruntime)
+        "int8"  - torch dynamic int8 quantization of the Linear layers
+    """
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        backend: str = "torch",
+        batch_size: int = 16,
+        max_length: int = 512,
+        time_budget_ms: float = 250.0,
+        cache_size: int = 4096,
+    ):
+        if backend not in _BACKENDS:
+            raise ValueError(f"Unknown rerank backend '{backend}', expected one of {_BACKENDS}")
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading cross-encoder '{model_name}' ({backend}) on cpu")
+        kwargs = {"backend": "onnx"} if backend == "onnx" else {}
+        self.model = CrossEncoder(model_name, device="cpu", max_length=max_length, **kwargs)
+        if backend == "int8":
+            import torch
+            self.model.model = torch.quantization.quantize_dynamic(
+                self.model.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.time_budget_ms = time_budget_ms
+        self.score_cache = LRUCache(max_size=cache_size)
+        self.timeouts = 0
+
+    def rerank(
+        self,
+        query: str,
+        texts: List[str],
+        top_n: int,
+        keys: Optional[List[str]] = None,
+    ) -> RerankResult:
+        """Returns the best top_n candidate indices; keys (e.g. chunk IDs) identify texts in the cache."""
+        start = time.perf_counter()
+        keys = keys or [text_hash(t) for t in texts]
+        scores: List[Optional[float]] = [None] * len(texts)
+
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self.score_cache.get((query, key))
+            if cached is None:
+                pending.append(i)
+            else:
+                scores[i] = cached
+        result = RerankResult(order=[], cached=len(texts) - len(pending))
+
+        for b in range(0, len(pending), self.batch_size):
+            if (time.perf_counter() - start) * 1000 > self.time_budget_ms:
+                result.timed_out = True
+                break
+            batch = pending[b:b + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, texts[i]) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self.score_cache.put((query, keys[i]), scores[i])
+            result.scored += len(batch)
+
+        scored = sorted((i for i, s in enumerate(scores) if s is not None), key=lambda i: -scores[i])
+        unscored = [i for i, s in enumerate(scores) if s is None]
+        result.order = (scored + unscored)[:top_n]
+        result.scores = [scores[i] for i in result.order]
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        if result.timed_out:
+            self.timeouts += 1
+            logger.warning(
+                f"Rerank budget of {self.time_budget_ms:.0f}ms exhausted after {result.scored + result.cached}/"
+                f"{len(texts)} candidates; remaining ones keep vector order."
+            )
+        return result
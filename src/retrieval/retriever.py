@@ -1,8 +1,11 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
 import chromadb
 from chromadb.config import Settings
 
-class ChromaRetriever:
+from src.retrieval.base import BaseRetriever, Embeddings
+from src.utils.concurrency import ReadWriteLock
+
+class ChromaRetriever(BaseRetriever):
     """
     Enhanced Retriever for industrial LLM applications.
     Implements metadata filtering and structured retrieval for higher reliability.
@@ -15,6 +18,9 @@ class ChromaRetriever:
             name=collection_name,
             metadata={"hnsw:space": "cosine"} # Explicitly defining distance metric for transparency
         )
+        # Chroma serializes upserts against queries itself; this lock only keeps
+        # queries off the collection while reset() swaps it out
+        self._lock = ReadWriteLock()
 
    
     def add_documents(
@@ -22,7 +28,7 @@ class ChromaRetriever:
     ids: List[str],
     texts: List[str],
     metadatas: List[Dict],
-    embeddings: Optional[List[List[float]]] = None,):
+    embeddings: Optional[Embeddings] = None,):
         self.collection.upsert(
         ids=ids,
         documents=texts,
@@ -30,37 +36,47 @@ class ChromaRetriever:
         embeddings=embeddings,
     )
 
+    def delete(self, ids: List[str]):
+        """Removes chunks that no longer exist in their source document."""
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def reset(self):
+        """Drops and recreates the collection, keeping the client open."""
+        with self._lock.write():
+            name = self.collection.name
+            self.client.delete_collection(name)
+            self.collection = self.client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"}
+            )
+
+    def count(self) -> int:
+        with self._lock.read():
+            return self.collection.count()
+
+    def get(self, ids: List[str]) -> Dict:
+        """Fetches stored chunks by ID (used to hydrate keyword-only hybrid hits)."""
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        with self._lock.read():
+            return self.collection.get(ids=ids, include=["documents", "metadatas"])
+
     def query(
         self, 
-        query_embeddings: List[List[float]], 
+        query_embeddings: Embeddings, 
         n_results: int = 5,
         filter_dict: Optional[Dict] = None,
-        query_text: Optional[str] = None
+        query_text: Optional[Union[str, List[str]]] = None
     ) -> Dict:
         """
         Enhanced query with metadata filtering.
         AppliedAI values 'trustworthy' results; filtering by source/date helps.
+        query_text is ignored here; HybridRetriever adds the keyword side.
         """
-        # If query_text is provided, we can combine it with embeddings for 
-        # a more robust 'Hybrid-like' retrieval in the application layer.
-        return self.collection.query(
-            query_embeddings=query_embeddings,
-            n_results=n_results,
-            where=filter_dict, # Allows filtering by 'page_number' or 'document_type'
-        )
-
-    def get_context_with_sources(self, results: Dict) -> str:
-        """
-        Formats results for the LLM. 
-        Critical for the mission of 'transferring know-how' and documentation.
-        """
-        context_parts = []
-        for i in range(len(results['documents'][0])):
-            text = results['documents'][0][i]
-            meta = results['metadatas'][0][i]
-            # Engineering clean citations
-            source = meta.get('source', 'Unknown')
-            page = meta.get('page', 'N/A')
-            context_parts.append(f"[Source: {source}, Page: {page}]\n{text}")
-        
-        return "\n\n---\n\n".join(context_parts)
\ No newline at end of file
+        with self._lock.read():
+            return self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=filter_dict, # Allows filtering by 'page_number' or 'document_type'
+            )
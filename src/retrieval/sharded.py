@@ -0,0 +1,340 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from src.retrieval.base import BaseRetriever, Embeddings
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = "papers"
+# Metadata keys the shard router understands; filters on other keys search every shard
+ROUTING_KEYS = ("doc_id", "source", "page")
+# Valid as a Chroma collection name and as a directory name, with room for "-shardNN"
+_CORPUS_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,46}[A-Za-z0-9]$")
+
+
+def _atomic_write_json(path: Path, data: Dict):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def validate_corpus_name(name: str) -> str:
+    if not _CORPUS_NAME.match(name or ""):
+        raise ValueError(
+            f"Invalid corpus name {name!r}: use 3-48 letters, digits, '-' or '_', "
+            "starting and ending with a letter or digit"
+        )
+    return name
+
+
+def shard_collection_name(corpus: str, shard: int) -> str:
+    return f"{corpus}-shard{shard:02d}"
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """Stable shard of a document (crc32, so it is the same in every process)."""
+    return zlib.crc32(str(doc_id).encode("utf-8")) % shards
+
+
+class CorpusCatalog:
+    """
+    Persistent list of corpora in a persist_dir (corpora.json) and their shard counts.
+    The shard count is fixed when a corpus is created: documents are placed by hashing
+    their doc_id, so reopening with another count would look in the wrong shards.
+    """
+    def __init__(self, persist_dir: str):
+        self.path = Path(persist_dir) / "corpora.json"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8")).get("corpora", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable corpus catalog {self.path}: {e}")
+            return {}
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._read())
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read().get(name)
+
+    def ensure(self, name: str, shards: int = 1) -> Dict[str, Any]:
+        """Registers a corpus on first use; an existing entry keeps its shard count."""
+        validate_corpus_name(name)
+        with self._lock:
+            corpora = self._read()
+            entry = corpora.get(name)
+            if entry is None:
+                entry = corpora[name] = {"shards": max(1, int(shards)), "created": time.time()}
+                _atomic_write_json(self.path, {"corpora": corpora})
+                logger.info(f"Created corpus '{name}' with {entry['shards']} shard(s)")
+            elif shards > 1 and shards != entry["shards"]:
+                logger.warning(
+                    f"Corpus '{name}' already has {entry['shards']} shard(s); ignoring requested {shards}"
+                )
+            return entry
+
+    def drop(self, name: str):
+        """Forgets a corpus; its (already cleared) storage is recreated empty on next use."""
+        with self._lock:
+            corpora = self._read()
+            if corpora.pop(name, None) is not None:
+                _atomic_write_json(self.path, {"corpora": corpora})
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {"sources": set(), "page_min": None, "page_max": None}
+
+
+def _op_may_match(key: str, op: str, value: Any, stats: Dict[str, Any]) -> bool:
+    """False only if no row in a shard with these stats can satisfy key <op> value."""
+    if key == "source":
+        if op == "$eq":
+            return value in stats["sources"]
+        if op == "$in":
+            return any(v in stats["sources"] for v in value)
+        return True
+    if key == "page":
+        lo, hi = stats["page_min"], stats["page_max"]
+        if lo is None:
+            return False
+        try:
+            if op == "$eq":
+                return lo <= value <= hi
+            if op == "$in":
+                return any(lo <= v <= hi for v in value)
+            if op == "$gt":
+                return hi > value
+            if op == "$gte":
+                return hi >= value
+            if op == "$lt":
+                return lo < value
+            if op == "$lte":
+                return lo <= value
+        except TypeError:
+            return True  # e.g. a string compared with int pages: let the shard decide
+    return True
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    One corpus split over several shard retrievers (one collection each).
+
+    Chunks are placed by a stable hash of their doc_id, so a document lives in exactly
+    one shard. Queries fan out in parallel to the shards that can match the filter and
+    the per-shard top-k lists are merged by cosine distance:
+      - doc_id $eq/$in filters go straight to the owning shard(s),
+      - source and page filters are checked against per-shard routing stats (sources
+        seen, page range), persisted next to the index,
+      - anything else ($ne, $nin, other keys) searches every shard.
+    Routing stats only grow until reset(): deleted chunks can leave a shard listed
+    for a source it no longer holds, which costs a search but never loses a hit.
+    Deletes and get() go to every shard, since chunk IDs do not carry their doc_id.
+    """
+    def __init__(self, shards: Sequence[BaseRetriever], stats_path: str, max_workers: Optional[int] = None):
+        if not shards:
+            raise ValueError("ShardedRetriever needs at least one shard")
+        self.shards = list(shards)
+        self.stats_path = Path(stats_path)
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        self._stats_lock = threading.Lock()
+        self._stats = [_new_stats() for _ in self.shards]
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards), thread_name_prefix="shard"
+        )
+        self._load_stats()
+
+    # ---- routing stats -----------------------------------------------
+
+    def _load_stats(self):
+        if not self.stats_path.exists():
+            if any(shard.count() for shard in self.shards):
+                logger.warning(f"Shard stats {self.stats_path} missing; searching every shard until reset")
+                self._forget_stats()
+            return
+        try:
+            saved = json.loads(self.stats_path.read_text(encoding="utf-8"))["shards"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable shard stats {self.stats_path}: {e}")
+            self._forget_stats()
+            return
+        for stats, entry in zip(self._stats, saved):
+            sources = set(entry["sources"]) if entry["sources"] is not None else None
+            stats.update(sources=sources, page_min=entry["page_min"], page_max=entry["page_max"])
+
+    def _forget_stats(self):
+        # Unknown stats must never skip a shard: sources=None disables source/page routing
+        self._stats = [{"sources": None, "page_min": None, "page_max": None} for _ in self.shards]
+
+    def _save_stats(self):
+        with self._stats_lock:
+            data = {"shards": [
+                {"sources": sorted(s["sources"]) if s["sources"] is not None else None, "page_min": s["page_min"], "page_max": s["page_max"]}
+                for s in self._stats
+            ]}
+        _atomic_write_json(self.stats_path, data)
+
+    def _update_stats(self, shard: int, metadatas: List[Dict]):
+        pages = [m["page"] for m in metadatas if isinstance(m.get("page"), (int, float))]
+        with self._stats_lock:
+            stats = self._stats[shard]
+            if stats["sources"] is not None:
+                stats["sources"].update(m["source"] for m in metadatas if "source" in m)
+            if pages:
+                lo, hi = min(pages), max(pages)
+                stats["page_min"] = lo if stats["page_min"] is None else min(stats["page_min"], lo)
+                stats["page_max"] = hi if stats["page_max"] is None else max(stats["page_max"], hi)
+
+    def _may_match(self, where: Optional[Dict], shard: int) -> bool:
+        if not where:
+            return True
+        stats = self._stats[shard]
+        for key, cond in where.items():
+            if key == "$and":
+                if not all(self._may_match(sub, shard) for sub in cond):
+                    return False
+            elif key == "$or":
+                if not any(self._may_match(sub, shard) for sub in cond):
+                    return False
+            elif key == "doc_id":
+                ops = cond if isinstance(cond, dict) else {"$eq": cond}
+                if "$eq" in ops and shard_of(ops["$eq"], len(self.shards)) != shard:
+                    return False
+                if "$in" in ops and all(shard_of(v, len(self.shards)) != shard for v in ops["$in"]):
+                    return False
+            elif key in ROUTING_KEYS:
+                if stats["sources"] is None:  # stats lost: search everything
+                    continue
+                ops = cond if isinstance(cond, dict) else {"$eq": cond}
+                if not all(_op_may_match(key, op, value, stats) for op, value in ops.items()):
+                    return False
+        return True
+
+    def route(self, filter_dict: Optional[Dict] = None) -> List[int]:
+        """Indices of the shards a query with this filter has to search."""
+        return [i for i in range(len(self.shards)) if self._may_match(filter_dict, i)]
+
+    def sources(self) -> List[str]:
+        """Source names seen in this corpus (e.g. for a document picker)."""
+        with self._stats_lock:
+            return sorted({src for s in self._stats for src in (s["sources"] or ())})
+
+    # ---- writes --------------------------------------------------------
+
+    def _fan_out(self, shard_ids: Sequence[int], call) -> List[Any]:
+        if len(shard_ids) == 1:
+            return [call(shard_ids[0])]
+        return list(self._executor.map(call, shard_ids))
+
+    def add_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+        embeddings: Optional[Embeddings] = None,
+    ):
+        groups: Dict[int, List[int]] = {}
+        for row, meta in enumerate(metadatas):
+            groups.setdefault(shard_of(meta.get("doc_id", ids[row]), len(self.shards)), []).append(row)
+        vectors = np.asarray(embeddings, dtype=np.float32) if embeddings is not None else None
+
+        def _add(shard: int):
+            rows = groups[shard]
+            self.shards[shard].add_documents(
+                [ids[r] for r in rows],
+                [texts[r] for r in rows],
+                [metadatas[r] for r in rows],
+                embeddings=vectors[rows] if vectors is not None else None,
+            )
+
+        # Routing stats are widened and persisted before any shard is written: stats that
+        # are too wide only cost a search, stats missing a shard's rows would hide them
+        for shard, rows in groups.items():
+            self._update_stats(shard, [metadatas[r] for r in rows])
+        self._save_stats()
+        self._fan_out(sorted(groups), _add)
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self._fan_out(range(len(self.shards)), lambda i: self.shards[i].delete(ids))
+
+    def reset(self):
+        self._fan_out(range(len(self.shards)), lambda i: self.shards[i].reset())
+        with self._stats_lock:
+            self._stats = [_new_stats() for _ in self.shards]
+        self._save_stats()
+
+    # ---- reads ---------------------------------------------------------
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards)
+
+    def get(self, ids: List[str]) -> Dict:
+        out = {"ids": [], "documents": [], "metadatas": []}
+        if not ids:
+            return out
+        rows = {}
+        for got in self._fan_out(range(len(self.shards)), lambda i: self.shards[i].get(ids)):
+            for cid, doc, meta in zip(got["ids"], got["documents"], got["metadatas"]):
+                rows[cid] = (doc, meta)
+        for cid in ids:  # keep the requested order
+            if cid in rows:
+                out["ids"].append(cid)
+                out["documents"].append(rows[cid][0])
+                out["metadatas"].append(rows[cid][1])
+        return out
+
+    def query(
+        self,
+        query_embeddings: Embeddings,
+        n_results: int = 5,
+        filter_dict: Optional[Dict] = None,
+        query_text: Optional[Union[str, List[str]]] = None
+    ) -> Dict:
+        """Parallel top-k over the routed shards, merged by distance."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        selected = self.route(filter_dict)
+        tracer.observe("shards_searched", len(selected), (1, 2, 4, 8, 16, 32, 64))
+        if not selected:
+            for _ in range(len(queries)):
+                for key in result:
+                    result[key].append([])
+            return result
+
+        partials = self._fan_out(
+            selected,
+            lambda i: self.shards[i].query(queries, n_results=n_results, filter_dict=filter_dict),
+        )
+        for qi in range(len(queries)):
+            hits = [
+                (dist, cid, doc, meta)
+                for part in partials
+                for cid, doc, meta, dist in zip(
+                    part["ids"][qi], part["documents"][qi], part["metadatas"][qi], part["distances"][qi]
+                )
+            ]
+            hits.sort(key=lambda h: h[0])
+            hits = hits[:n_results]
+            result["ids"].append([h[1] for h in hits])
+            result["documents"].append([h[2] for h in hits])
+            result["metadatas"].append([h[3] for h in hits])
+            result["distances"].append([h[0] for h in hits])
+        return result
@@ -1,18 +1,19 @@
 import streamlit as st
 from pathlib import Path
 import time
-import shutil
 
 # Professionalized modules for document ingestion and processing
-from src.ingestion.pdf_loader import load_pdf_pages 
+from src.ingestion.job_queue import IngestionJobQueue
 from src.preprocessing.chunker import RecursiveChunker 
 from src.rag_pipeline.pipeline import RAGPipeline, RAGConfig
+from src.rag_pipeline.context_builder import DEFAULT_CONTEXT_TOKENIZER
 
 # --- 1. Configuration & Persistence ---
 st.set_page_config(page_title="AI Engineering Assistant", layout="wide")
 DATA_DIR = Path("data")
 RAW_DIR = DATA_DIR / "raw_papers"
 PERSIST_DIR = DATA_DIR / "vector_store"
+EMBED_CACHE_DIR = DATA_DIR / "embedding_cache"
 
 # Ensure directories exist for persistent storage
 RAW_DIR.mkdir(parents=True, exist_ok=True)
@@ -20,35 +21,82 @@ PERSIST_DIR.mkdir(parents=True, exist_ok=True)
 
 @st.cache_resource
 def get_pipeline():
-    """Initializes the RAG pipeline with optimized local model configurations."""
+    """
+    Initializes the RAG pipeline with optimized local model configurations.
+    Construction is cheap; models and the vector store load in a background
+    warm-up thread so the page renders immediately.
+    """
     cfg = RAGConfig(
         embedding_model="sentence-transformers/all-MiniLM-L6-v2",
         # Points to the Llama 3 8B Instruct model running in LM Studio
-        llm_model="llama-3-8b-local", 
+        llm_model="meta-llama-3-8b-instruct", 
+        # Context is packed with the same tokenizer, so max_context_tokens is exact
+        context_tokenizer=DEFAULT_CONTEXT_TOKENIZER,
         persist_dir=str(PERSIST_DIR),
+        embedding_cache_dir=str(EMBED_CACHE_DIR),
         top_k=4 
     )
-    return RAGPipeline(cfg)
+    pipeline = RAGPipeline(cfg)
+    pipeline.warmup(background=True)
+    return pipeline
+
+@st.cache_resource
+def get_job_queue():
+    """
+    Background ingestion shared by all sessions: uploads are queued in SQLite and
+    indexed by a worker thread, so no session blocks while a PDF is processed.
+    """
+    chunker = RecursiveChunker(chunk_size=800, chunk_overlap=150)
+    return IngestionJobQueue(str(DATA_DIR / "ingestion_jobs.sqlite"), get_pipeline(), chunker).start()
 
 # Initialize components
 pipeline = get_pipeline()
-chunker = RecursiveChunker(chunk_size=800, chunk_overlap=150)
+job_queue = get_job_queue()
 
 # --- 2. Sidebar - Status & Maintenance ---
 with st.sidebar:
+    st.header("Corpus")
+    # Each corpus has its own collections; questions and uploads go to the selected one
+    corpora = pipeline.corpora()
+    if "corpus" not in st.session_state:
+        st.session_state.corpus = pipeline.cfg.corpus
+    corpus = st.selectbox(
+        "Active corpus", corpora,
+        index=corpora.index(st.session_state.corpus) if st.session_state.corpus in corpora else 0,
+    )
+    st.session_state.corpus = corpus
+    new_corpus = st.text_input("New corpus name", placeholder="e.g. project-x")
+    if st.button("Create corpus") and new_corpus:
+        try:
+            pipeline.catalog.ensure(new_corpus, pipeline.cfg.corpus_shards)
+            st.session_state.corpus = new_corpus
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
+    active = pipeline.for_corpus(corpus)
+    st.markdown("---")
+
     st.header("System Status")
     st.info("LLM: Llama 3 8B (via Local Inference)")
     st.success("Vector Store: Persistent ChromaDB")
+    if pipeline.is_warm:
+        st.caption(f"Models loaded; corpus '{corpus}' holds {active.retriever.count()} chunks")
+    else:
+        st.caption("Loading models in the background; the first question may take longer.")
     st.markdown("---")
     
     # Feature to prevent stale data collisions
-    if st.button("Clear Vector Database"):
-        if PERSIST_DIR.exists():
-            shutil.rmtree(PERSIST_DIR)
-            PERSIST_DIR.mkdir(parents=True, exist_ok=True)
-            st.warning("Database cleared. Please re-upload your document.")
-            time.sleep(1)
-            st.rerun()
+    if st.button(f"Clear corpus '{corpus}'"):
+        # Resets only this corpus's collections and manifest; other corpora keep serving
+        active.clear_index()
+        job_queue.forget_finished(corpus)
+        # Forgotten jobs must not stop a re-upload of the same file from being resubmitted
+        st.session_state.ingest_jobs = {
+            key: job_id for key, job_id in st.session_state.get("ingest_jobs", {}).items() if key[0] != corpus
+        }
+        st.warning(f"Corpus '{corpus}' cleared. Please re-upload your document.")
+        time.sleep(1)
+        st.rerun()
 
 # --- 3. Main Interface & Ingestion ---
 st.title("📄 Paper Technical Document Assistant")
@@ -56,37 +104,63 @@ st.markdown("Extract verifiable insights from research documents with page-level
 
 uploaded_file = st.file_uploader("Upload a PDF paper", type=["pdf"])
 
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}  # (corpus, file name, size) -> job id
+
 if uploaded_file is not None:
-    dest = RAW_DIR / uploaded_file.name
-    dest.write_bytes(uploaded_file.getbuffer())
-    
-    with st.spinner("Processing document structure..."):
-        # Load text page-by-page to preserve citation metadata
-        pages = load_pdf_pages(dest) 
-        
-        all_chunks = []
-        # Corrected Indentation: Iterating through pages to create granular chunks
-        for page_data in pages:
-            # Passes page-specific metadata (source/page) into the chunker
-            chunks = chunker.chunk_text(page_data["text"], doc_metadata=page_data)
-            all_chunks.extend(chunks)
-            
-        # Index all newly created chunks into the vector store
-        pipeline.index_chunks(all_chunks)
-        
-    st.success(f"Successfully indexed {len(all_chunks)} granular chunks from {uploaded_file.name}")
+    upload_key = (corpus, uploaded_file.name, uploaded_file.size)
+    job_id = st.session_state.ingest_jobs.get(upload_key)
+    # Also resubmits when the job was forgotten meanwhile (corpus cleared in another session)
+    if job_id is None or job_queue.get(job_id) is None:
+        dest = RAW_DIR / uploaded_file.name
+        dest.write_bytes(uploaded_file.getbuffer())
+        # Queued for the background worker; identical files map to the existing job
+        job = job_queue.submit(dest, corpus=corpus)
+        st.session_state.ingest_jobs[upload_key] = job["id"]
+
+@st.fragment(run_every=1.0)
+def ingestion_status():
+    """Polls this session's ingestion jobs without re-running the rest of the page."""
+    for job_id in st.session_state.ingest_jobs.values():
+        job = job_queue.get(job_id)
+        if job is None:
+            continue
+        if job["status"] == "done":
+            st.success(
+                f"Indexed {job['chunks']} granular chunks from {job['file_name']} into '{job['corpus']}' "
+                f"({job['embedded']} embedded, {job['skipped']} unchanged, {job['deleted']} removed)"
+            )
+        elif job["status"] == "failed":
+            st.error(f"Ingestion of {job['file_name']} failed: {job['error']}")
+        else:
+            label = job["stage"] or "waiting in queue"
+            st.progress(job["progress"], text=f"{job['file_name']}: {label}... (questions can be asked meanwhile)")
+
+ingestion_status()
 
 # --- 4. Retrieval & Analysis ---
 question = st.text_input("Enter your research question:")
 
 if st.button("Generate Insight") and question:
-    with st.spinner("Analyzing knowledge base..."):
-        # Pipeline returns a unified result dictionary including answer and citations
-        result = pipeline.answer(question)
-        
     st.subheader("Analysis")
+    answer_box = st.empty()
+
+    # Streams retrieval first, then answer tokens, so text appears before generation ends
+    with st.spinner("Analyzing knowledge base..."):
+        events = active.answer_stream(question)
+        result = next(events)
+
+    streamed = ""
+    for event in events:
+        if event["type"] == "token":
+            streamed += event["delta"]
+            answer_box.markdown(streamed + "▌")
+        elif event["type"] == "done":
+            # Final event carries the same keys as pipeline.answer plus ttft_ms
+            result = event
+
     # Displays the generated synthesis from Llama 3
-    st.write(result.get("answer", "No answer generated."))
+    answer_box.markdown(result.get("answer", "No answer generated."))
     
     # --- 5. Source Transparency Section ---
     with st.expander("View Source Citations"):
@@ -106,4 +180,12 @@ if st.button("Generate Insight") and question:
                 if i < len(source_docs):
                     st.caption(source_docs[i][:300] + "...") 
     st.divider()
-    st.caption(f"Metrics: Latency {result.get('latency_ms', 0)}ms | Evidence Count: {result.get('retrieval_count', 0)}")
\ No newline at end of file
+    if result.get("cached"):
+        st.caption(f"Served from answer cache ({result.get('cache_hit')} match)")
+    st.caption(
+        f"Metrics: Latency {result.get('latency_ms', 0)}ms | "
+        f"Time to first token {result.get('ttft_ms', 0)}ms | "
+        f"Evidence Count: {result.get('retrieval_count', 0)}"
+    )
+    if result.get("trace"):
+        st.caption("Stages: " + " | ".join(f"{s['name']} {s['duration_ms']:.0f}ms" for s in result["trace"]))
\ No newline at end of file
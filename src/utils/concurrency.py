@@ -0,0 +1,135 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Sequence
+import queue
+import threading
+import time
+
+from src.utils.tracing import tracer
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. A waiting writer blocks new readers, so a
+    steady stream of queries cannot starve an upsert. Not reentrant: do not take
+    read() again while holding it.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class MicroBatcher:
+    """
+    Merges concurrent single-item calls into one batched call fn(items) -> results.
+
+    submit() blocks the calling thread until its result is ready. One background
+    thread runs fn: items that arrive while a batch is being computed form the next
+    batch (up to max_batch_size), so a lone caller pays no extra latency and N
+    concurrent callers share one call. max_wait_ms > 0 additionally holds a batch
+    open that long for stragglers.
+
+    fn may return an exception instance in place of a result to fail only that
+    item's caller; an exception raised by fn fails the whole batch.
+    """
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 0.0,
+        name: str = "micro-batcher",
+    ):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, item: Any) -> Any:
+        future: Future = Future()
+        self._queue.put((item, future))
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                    self._thread.start()
+        return future.result()
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            tracer.observe("micro_batch_size", len(batch), (1, 2, 4, 8, 16, 32, 64, 128), batcher=self.name)
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: {len(results)} results for a batch of {len(batch)}")
+            except BaseException as e:  # the loop must survive: every later submit() waits on it
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -1,4 +1,5 @@
-from typing import List, Dict
+from typing import Dict, List, Sequence, Set
+import math
 
 def simple_qa_log(question: str, answer: str, metadata: Dict) -> Dict:
     return {
@@ -15,3 +16,20 @@ def qualitative_feedback_template() -> List[str]:
         "Did the answer reference relevant parts of the paper?",
         "Were limitations of the method mentioned?",
     ]
+
+def percentiles(values: List[float], qs: Sequence[float] = (50, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles, e.g. {"p50": ..., "p95": ..., "p99": ...}."""
+    if not values:
+        return {f"p{q:g}": 0.0 for q in qs}
+    ordered = sorted(values)
+    return {
+        f"p{q:g}": float(ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))])
+        for q in qs
+    }
+
+def recall_at_k(retrieved: List[List[str]], relevant: List[Set[str]], k: int) -> float:
+    """Fraction of queries with at least one relevant ID among their first k results."""
+    if not retrieved:
+        return 0.0
+    found = sum(1 for ids, rel in zip(retrieved, relevant) if rel.intersection(ids[:k]))
+    return found / len(retrieved)
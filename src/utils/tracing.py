@@ -0,0 +1,274 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds of histogram buckets (+Inf is implicit)
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class Span:
+    """One timed stage. Use as a context manager; set() attaches attributes (counts, sizes)."""
+    __slots__ = ("name", "attrs", "parent", "start", "duration_ms", "_tracer", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent: Optional[str] = None
+        self.start = 0.0
+        self.duration_ms = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent = parent.name if parent is not None else None
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer._finish(self)
+        return False
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled: no clock reads, no allocation."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("rag_current_span", default=None)
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("rag_current_trace", default=None)
+
+
+class Trace:
+    """Spans finished while this trace was active, e.g. one RAGPipeline.answer call."""
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.wall_time = time.time()
+        self.spans: List[Span] = []
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Spans in start order, with start offsets relative to the trace start."""
+        return [
+            {
+                "name": s.name,
+                "parent": s.parent,
+                "start_ms": round((s.start - self.start) * 1000, 3),
+                "duration_ms": round(s.duration_ms, 3),
+                **s.attrs,
+            }
+            for s in sorted(self.spans, key=lambda s: s.start)
+        ]
+
+
+class Metrics:
+    """Thread-safe counters and fixed-bucket histograms, keyed by name + labels."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Dict[str, Any]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS_MS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {
+                    "buckets": tuple(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0
+                }
+            hist["counts"][bisect.bisect_left(hist["buckets"], value)] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """JSON-friendly copy: counters and histograms with per-bucket counts."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": list(h["buckets"]),
+                    "counts": list(h["counts"]),
+                    "sum": h["sum"],
+                    "count": h["count"],
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self, prefix: str = "rag_") -> str:
+        """Prometheus text exposition format (cumulative buckets)."""
+        snap = self.snapshot()
+        lines: List[str] = []
+        typed = set()
+
+        def _labels(labels: Dict[str, Any], **extra) -> str:
+            items = {**labels, **extra}
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+        for c in snap["counters"]:
+            name = prefix + c["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(c['labels'])} {c['value']:g}")
+
+        for h in snap["histograms"]:
+            name = prefix + h["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for upper, count in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(h['labels'], le=upper)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(h['labels'])} {h['sum']:g}")
+            lines.append(f"{name}_count{_labels(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonlExporter:
+    """Appends every finished trace as one JSON line (for offline latency analysis)."""
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        line = json.dumps({"ts": trace.wall_time, "trace": trace.name, "spans": trace.to_list()})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Tracer:
+    """
+    Process-wide tracing: spans time the pipeline stages, every finished span feeds
+    the stage_duration_ms histogram, and spans finished inside an active Trace are
+    also collected there (RAGPipeline returns them in result["trace"]).
+
+    The active trace and parent span live in contextvars, so concurrent threads and
+    asyncio tasks keep separate traces. When disabled, span() returns a shared
+    no-op object and metrics calls return immediately.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics = Metrics()
+        self.exporters: List[JsonlExporter] = []
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def record_span(self, name: str, start: float, **attrs):
+        """Records a stage timed by the caller (start is a time.perf_counter() value)."""
+        if not self.enabled:
+            return
+        span = Span(self, name, attrs)
+        parent = _current_span.get()
+        span.parent = parent.name if parent is not None else None
+        span.start = start
+        span.duration_ms = (time.perf_counter() - start) * 1000
+        self._finish(span)
+
+    def _finish(self, span: Span):
+        self.metrics.observe("stage_duration_ms", span.duration_ms, stage=span.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(span)
+
+    def start_trace(self, name: str, enabled: bool = True) -> Optional[Trace]:
+        """A new Trace, or None when tracing is off globally or for this caller (enabled=False)."""
+        return Trace(name) if self.enabled and enabled else None
+
+    @contextmanager
+    def activate(self, trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+        """Makes trace the collection target for spans in this block (re-entrable, e.g. between yields)."""
+        if trace is None:
+            yield None
+            return
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def finish_trace(self, trace: Optional[Trace]):
+        if trace is None:
+            return
+        for exporter in self.exporters:
+            exporter.export(trace)
+
+    @contextmanager
+    def trace(self, name: str, enabled: bool = True) -> Iterator[Optional[Trace]]:
+        """Starts, activates and finishes a trace around a block; yields None when disabled."""
+        trace = self.start_trace(name, enabled)
+        with self.activate(trace):
+            yield trace
+        self.finish_trace(trace)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if self.enabled:
+            self.metrics.inc(name, value, **labels)
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS_MS, **labels):
+        if self.enabled:
+            self.metrics.observe(name, value, buckets, **labels)
+
+    def add_jsonl_exporter(self, path: str):
+        if not any(e.path == Path(path) for e in self.exporters):
+            self.exporters.append(JsonlExporter(path))
+
+    def prometheus_text(self) -> str:
+        return self.metrics.to_prometheus()
+
+    def write_prometheus(self, path: str):
+        """Atomic write, e.g. for the node_exporter textfile collector."""
+        tmp = Path(path).with_suffix(".tmp")
+        tmp.write_text(self.prometheus_text(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+# Shared by every component; RAG_TRACING=0 switches it off process-wide, RAGConfig.tracing
+# only stops one pipeline from collecting traces
+tracer = Tracer(enabled=os.environ.get("RAG_TRACING", "1") != "0")